@@ -0,0 +1,74 @@
+"""gunicorn 配置（由 start.sh 加载）
+
+所有参数均可通过环境变量调整：
+
+- SERVER_MODE: wsgi（默认，gthread 线程 worker）或 asgi（uvicorn worker）
+- WEB_CONCURRENCY: worker 进程数，默认 2 * 可用 CPU + 1
+- GUNICORN_THREADS: 每个 gthread worker 的线程数，默认 4
+- GUNICORN_TIMEOUT / GUNICORN_GRACEFUL_TIMEOUT: 请求超时 / 优雅退出等待时间（秒）
+- GUNICORN_MAX_REQUESTS: worker 处理多少请求后重启，0 表示不重启
+"""
+import itertools
+import math
+import os
+
+
+def available_cpus():
+    """容器内可用 CPU 数：优先读取 cgroup 配额，os.cpu_count() 返回的是宿主机核数"""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:  # cgroup v2
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:  # cgroup v1
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, math.ceil(quota / period))
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '80')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', available_cpus() * 2 + 1))
+
+if SERVER_MODE == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '20'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# 定期重启 worker，防止内存缓慢增长；加抖动避免所有 worker 同时重启
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+# 云托管采集 stdout 日志
+accesslog = '-' if os.environ.get('GUNICORN_ACCESS_LOG') else None
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    """为新 worker 分配当前未被占用的最小槽位，用作订单号 worker id 的进程部分"""
+    used = {getattr(w, 'order_slot', None) for w in server.WORKERS.values()}
+    worker.order_slot = next(slot for slot in itertools.count() if slot not in used)
+
+
+def post_fork(server, worker):
+    os.environ['ORDER_WORKER_SLOT'] = str(worker.order_slot)
+
+
+def worker_exit(server, worker):
+    """worker 退出前把缓冲的浏览次数写入数据库"""
+    from wxcloudrun.view_counter import flush_on_shutdown
+    flush_on_shutdown()
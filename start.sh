@@ -0,0 +1,20 @@
+#!/bin/sh
+# 容器启动脚本，根据 SERVER_MODE 选择服务方式：
+#   wsgi（默认）: gunicorn + gthread 多进程多线程
+#   asgi        : gunicorn + uvicorn worker
+#   dev         : Django 开发服务器（单进程，自动重载，仅用于调试）
+set -e
+
+cd "$(dirname "$0")"
+
+case "${SERVER_MODE:-wsgi}" in
+    dev)
+        exec python3 manage.py runserver "0.0.0.0:${PORT:-80}"
+        ;;
+    asgi)
+        exec python3 -m gunicorn wxcloudrun.asgi:application -c gunicorn.conf.py
+        ;;
+    *)
+        exec python3 -m gunicorn wxcloudrun.wsgi:application -c gunicorn.conf.py
+        ;;
+esac
@@ -1,24 +1,63 @@
+import logging
 import requests
-from datetime import datetime
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import api_view, action, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
-from django.db.models import Q
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.expressions import RawSQL
+from django.utils.dateparse import parse_datetime
 
 from .models import (
     User, ProductCategory, Product, ProductImage, ProductVideo,
-    Order, ChatMessage, GeneTag, ProductGeneTag, Species
+    Order, ChatMessage, GeneTag, ProductGeneTag, Species, ConversationState
 )
+from . import fast_serializers, order_state
+from .chat import long_poll_timeout, mark_messages_read, notifier, wait_for_messages
+from .facets import facet_counts
+from .fast_serializers import FastListMixin
+from .fieldsets import FieldsetMixin
+from .media import MediaURLMixin
+from .neighbors import similar_ids
+from .order_state import OrderStateError
+from .ranking import hot_products
+from .response_cache import CachedResponseMixin
+from .search import search_products
+from .tag_index import filter_by_gene_tags
+from .user_cache import get_or_create_wechat_user, invalidate_user
+from .view_counter import get_view_counter
 from .serializers import (
     UserSerializer, ProductCategorySerializer, ProductListSerializer,
     ProductDetailSerializer, ProductCreateSerializer, OrderListSerializer,
     OrderDetailSerializer, OrderCreateSerializer, ChatMessageSerializer,
-    GeneTagSerializer, SpeciesSerializer
+    GeneTagSerializer, SpeciesSerializer, ConversationSerializer
 )
 
+logger = logging.getLogger('log')
+
+
+def union_ids(model, value, *field_names):
+    """构造 `id IN (SELECT id FROM (... UNION ...))` 子查询
+
+    用于替代 `Q(a=x) | Q(b=x)`：每个分支都能走 (字段, created_at) 复合索引，
+    外层派生表让 MySQL 先物化 UNION 结果，而不是对外表逐行执行依赖子查询。
+    """
+    table = model._meta.db_table
+    pk_column = model._meta.pk.column
+    branches = ' UNION '.join(
+        f'SELECT {pk_column} FROM {table} WHERE {model._meta.get_field(name).column} = %s'
+        for name in field_names
+    )
+    return RawSQL(
+        f'SELECT {pk_column} FROM ({branches}) AS {table}_union',
+        [value] * len(field_names)
+    )
+
 
 # WeChat Login
 @api_view(['POST'])
@@ -44,12 +83,12 @@ def wechat_login(request):
         return Response({'error': '缺少云托管环境信息 (X-WX-OPENID)'}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
-    print(f"云托管登录, openid: {openid}, unionid: {unionid}")
+    logger.info('wechat_login openid=%s unionid=%s', openid, unionid)
     
     try:
         # Get or create user
-        user, created = User.objects.get_or_create(
-            wechat_openid=openid,
+        user, created = get_or_create_wechat_user(
+            openid,
             defaults={
                 'username': f'wx_{openid[:10]}',
                 'nickname': nickname or f'用户{openid[:6]}',
@@ -65,6 +104,7 @@ def wechat_login(request):
             if avatar:
                 user.avatar = avatar
             user.save()
+            invalidate_user(user)
         
         # 云托管模式：不需要返回 token
         return Response({
@@ -95,24 +135,27 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            invalidate_user(user)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 # Product Category ViewSet
-class ProductCategoryViewSet(viewsets.ReadOnlyModelViewSet):
-    """产品分类视图集（只读）"""
+class ProductCategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """产品分类视图集（只读，响应缓存）"""
     queryset = ProductCategory.objects.filter(is_active=True)
     serializer_class = ProductCategorySerializer
     permission_classes = [AllowAny]
+    cache_group = 'catalog'
 
 
 # Species ViewSet
-class SpeciesViewSet(viewsets.ReadOnlyModelViewSet):
-    """物种视图集（只读）- 支持按分类筛选"""
+class SpeciesViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """物种视图集（只读，响应缓存）- 支持按分类筛选"""
     queryset = Species.objects.filter(is_active=True)
     serializer_class = SpeciesSerializer
     permission_classes = [AllowAny]
+    cache_group = 'catalog'
     
     def get_queryset(self):
         """支持按分类筛选物种"""
@@ -124,11 +167,13 @@ class SpeciesViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 # Gene Tag ViewSet
-class GeneTagViewSet(viewsets.ReadOnlyModelViewSet):
-    """基因标签视图集（只读）- 支持按物种筛选"""
-    queryset = GeneTag.objects.filter(is_active=True)
+class GeneTagViewSet(CachedResponseMixin, FastListMixin, viewsets.ReadOnlyModelViewSet):
+    """基因标签视图集（只读，响应缓存）- 支持按物种筛选"""
+    queryset = GeneTag.objects.filter(is_active=True).select_related('species')
     serializer_class = GeneTagSerializer
+    fast_serializer = fast_serializers.gene_tag_list
     permission_classes = [AllowAny]
+    cache_group = 'catalog'
     
     def get_queryset(self):
         """支持按物种ID筛选标签"""
@@ -140,17 +185,21 @@ class GeneTagViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 # Product ViewSet
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(MediaURLMixin, FieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     """产品视图集"""
     queryset = Product.objects.all()
+    fast_serializer = fast_serializers.product_list
+    fieldset_actions = ('list', 'retrieve', 'my_products', 'similar')
+    # 游标分页排序键（?pagination=cursor）
+    keyset_ordering = ('-created_at', '-id')
     
     def get_permissions(self):
         """
         根据不同的操作设置不同的权限
-        - list, retrieve: 允许匿名访问（浏览商品）
+        - list, retrieve, facets, similar: 允许匿名访问（浏览商品）
         - create, update, delete, my_products, toggle_status: 需要认证
         """
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'facets', 'similar']:
             return [AllowAny()]
         return [IsAuthenticated()]
     
@@ -169,10 +218,13 @@ class ProductViewSet(viewsets.ModelViewSet):
         if category_id:
             queryset = queryset.filter(category_id=category_id)
         
-        # Filter by species
+        # Filter by species (ID 或名称)
         species = self.request.query_params.get('species', None)
         if species:
-            queryset = queryset.filter(species__icontains=species)
+            if species.isdigit():
+                queryset = queryset.filter(species_id=species)
+            else:
+                queryset = queryset.filter(species__name__icontains=species)
         
         # Filter by morph
         morph = self.request.query_params.get('morph', None)
@@ -184,6 +236,9 @@ class ProductViewSet(viewsets.ModelViewSet):
         if sex:
             queryset = queryset.filter(sex=sex)
         
+        # Filter by gene tags（gene_tags 全部具备 / any_tags 任一具备，由倒排索引求出商品 id）
+        queryset = filter_by_gene_tags(queryset, self.request.query_params)
+        
         # Filter by price range
         min_price = self.request.query_params.get('min_price', None)
         max_price = self.request.query_params.get('max_price', None)
@@ -197,29 +252,31 @@ class ProductViewSet(viewsets.ModelViewSet):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
-        # Search
+        # Search（全文索引，按相关度排序）
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(species__icontains=search) |
-                Q(morph__icontains=search)
-            )
+            queryset = search_products(queryset, search)
+            # 按相关度排序的结果只能用页码分页
+            self.keyset_ordering = None
+        elif self.request.query_params.get('sort') == 'hot':
+            # 热度排序（得分来自后台任务批量计算的 product_rankings 表）
+            queryset = hot_products(queryset)
+            self.keyset_ordering = ('-hot_score', '-id')
         
-        return queryset.select_related('seller', 'category').prefetch_related('images', 'videos')
+        if self.action == 'list':
+            return self.project_queryset(queryset, ProductListSerializer)
+        return ProductDetailSerializer.setup_eager_loading(queryset, self.get_fieldset(ProductDetailSerializer))
     
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
     
     def create(self, request, *args, **kwargs):
-        """创建商品，添加详细日志"""
-        print(f"ProductViewSet.create: user={request.user}, is_authenticated={request.user.is_authenticated}")
-        print(f"ProductViewSet.create: request.data={request.data}")
+        """创建商品，校验失败时记录日志"""
+        logger.debug('product.create user=%s data=%s', request.user, request.data)
         
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
-            print(f"ProductViewSet.create: validation errors={serializer.errors}")
+            logger.info('product.create.invalid user=%s errors=%s', request.user, serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         self.perform_create(serializer)
@@ -228,7 +285,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     
     def perform_update(self, serializer):
         """更新商品时验证权限"""
-        product = self.get_object()
+        product = serializer.instance
         if product.seller != self.request.user:
             raise PermissionError('只能修改自己发布的商品')
         serializer.save()
@@ -240,10 +297,10 @@ class ProductViewSet(viewsets.ModelViewSet):
         instance.delete()
     
     def retrieve(self, request, *args, **kwargs):
-        """获取产品详情，增加浏览次数"""
+        """获取产品详情，增加浏览次数（缓冲后批量写入）"""
         instance = self.get_object()
-        instance.view_count += 1
-        instance.save(update_fields=['view_count'])
+        # 返回值包含尚未刷盘的浏览数
+        instance.view_count += get_view_counter().record(instance.pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
     
@@ -251,52 +308,80 @@ class ProductViewSet(viewsets.ModelViewSet):
     def my_products(self, request):
         """获取我发布的产品（包含所有状态）"""
         # 不使用 get_queryset()，直接查询所有状态的商品
-        products = Product.objects.filter(seller=request.user).select_related('seller', 'category', 'species').prefetch_related('images', 'videos')
+        products = self.project_queryset(Product.objects.filter(seller=request.user), ProductListSerializer)
+        fields = self.get_fieldset(ProductListSerializer)
         page = self.paginate_queryset(products)
         if page is not None:
-            serializer = ProductListSerializer(page, many=True)
+            serializer = ProductListSerializer(page, many=True, fields=fields)
             return self.get_paginated_response(serializer.data)
-        serializer = ProductListSerializer(products, many=True)
+        serializer = ProductListSerializer(products, many=True, fields=fields)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """浏览页分面计数：在售商品在当前筛选条件下各分类/物种/性别/基因标签/价格区间的数量"""
+        return Response(facet_counts(request.query_params))
+    
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """相似商品：同物种在售商品按基因标签、性别、价格区间的相似度排序（近邻表预先计算）"""
+        # 不使用 get_object()，已售出/下架商品的详情页同样展示相似商品
+        if not str(pk).isdigit() or not Product.objects.filter(pk=pk).exists():
+            return Response({'error': '商品不存在'}, status=status.HTTP_404_NOT_FOUND)
+        
+        limit = request.query_params.get('limit', '')
+        neighbor_ids = similar_ids(int(pk), int(limit) if limit.isdigit() else None)
+        rank = {neighbor_id: index for index, neighbor_id in enumerate(neighbor_ids)}
+        products = Product.objects.filter(id__in=neighbor_ids, status='available')
+        
+        if fast_serializers.enabled():
+            serializer = fast_serializers.product_list.subset(self.get_fieldset(ProductListSerializer))
+            rows = sorted(serializer.values(products, extra=['id']), key=lambda row: rank[row['id']])
+            return Response(serializer.serialize(rows))
+        products = sorted(self.project_queryset(products, ProductListSerializer), key=lambda item: rank[item.pk])
+        serializer = ProductListSerializer(products, many=True, fields=self.get_fieldset(ProductListSerializer))
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'], url_path='toggle_status')
     def toggle_status(self, request, pk=None):
         """切换商品上下架状态"""
-        # 不使用 get_object()，直接查询以避免 status 过滤
-        try:
-            product = Product.objects.get(pk=pk)
-        except Product.DoesNotExist:
-            return Response({'error': '商品不存在'}, status=status.HTTP_404_NOT_FOUND)
-        
-        # 验证权限
-        if product.seller != request.user:
-            return Response({'error': '只能操作自己发布的商品'}, status=status.HTTP_403_FORBIDDEN)
-        
-        # 切换状态
-        if product.status == 'available':
-            product.status = 'offline'
-        elif product.status == 'offline':
-            product.status = 'available'
-        else:
-            return Response({'error': '当前商品状态不允许上下架'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        product.save()
+        # 不使用 get_object()，直接查询以避免 status 过滤；加行锁避免覆盖并发支付写入的 reserved
+        with transaction.atomic():
+            try:
+                product = Product.objects.select_for_update().get(pk=pk)
+            except Product.DoesNotExist:
+                return Response({'error': '商品不存在'}, status=status.HTTP_404_NOT_FOUND)
+            
+            # 验证权限
+            if product.seller_id != request.user.pk:
+                return Response({'error': '只能操作自己发布的商品'}, status=status.HTTP_403_FORBIDDEN)
+            
+            # 切换状态
+            if product.status == 'available':
+                product.status = 'offline'
+            elif product.status == 'offline':
+                product.status = 'available'
+            else:
+                return Response({'error': '当前商品状态不允许上下架'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            product.save(update_fields=['status', 'updated_at'])
         serializer = ProductDetailSerializer(product)
         return Response(serializer.data)
 
 
 # Order ViewSet
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(MediaURLMixin, FieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     """订单视图集"""
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
+    fast_serializer = fast_serializers.order_list
+    keyset_ordering = ('-created_at', '-id')
+    fieldset_actions = ('list', 'retrieve', 'my_purchases', 'my_sales')
     
     def check_permissions(self, request):
         """重写权限检查以添加调试日志"""
-        print(f"OrderViewSet.check_permissions: user={request.user}, type={type(request.user).__name__}, is_authenticated={request.user.is_authenticated}")
-        print(f"OrderViewSet.check_permissions: has backend={hasattr(request.user, 'backend')}")
-        if hasattr(request.user, 'backend'):
-            print(f"OrderViewSet.check_permissions: backend={request.user.backend}")
+        logger.debug('order.check_permissions user=%s authenticated=%s backend=%s', request.user,
+                     request.user.is_authenticated, getattr(request.user, 'backend', None))
         super().check_permissions(request)
     
     def get_serializer_class(self):
@@ -309,9 +394,10 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         # Users can only see orders where they are buyer or seller
-        return Order.objects.filter(
-            Q(buyer=user) | Q(seller=user)
-        ).select_related('buyer', 'seller', 'product')
+        queryset = Order.objects.filter(id__in=union_ids(Order, user.pk, 'buyer', 'seller'))
+        if self.action == 'list':
+            return self.project_queryset(queryset, OrderListSerializer)
+        return OrderDetailSerializer.setup_eager_loading(queryset, self.get_fieldset(OrderDetailSerializer))
     
     def perform_create(self, serializer):
         serializer.save(buyer=self.request.user)
@@ -319,27 +405,29 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_purchases(self, request):
         """我的购买订单"""
-        print(f"my_purchases: user={request.user}, is_authenticated={request.user.is_authenticated}")
-        orders = self.get_queryset().filter(buyer=request.user)
-        print(f"my_purchases: found {orders.count()} orders")
+        orders = self.project_queryset(Order.objects.filter(buyer=request.user), OrderListSerializer)
+        if fast_serializers.enabled():
+            return self.fast_list_response(orders, fast_serializers.order_list)
+        fields = self.get_fieldset(OrderListSerializer)
         page = self.paginate_queryset(orders)
         if page is not None:
-            serializer = OrderListSerializer(page, many=True)
+            serializer = OrderListSerializer(page, many=True, fields=fields)
             return self.get_paginated_response(serializer.data)
-        serializer = OrderListSerializer(orders, many=True)
+        serializer = OrderListSerializer(orders, many=True, fields=fields)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_sales(self, request):
         """我的销售订单"""
-        print(f"my_sales: user={request.user}, is_authenticated={request.user.is_authenticated}")
-        orders = self.get_queryset().filter(seller=request.user)
-        print(f"my_sales: found {orders.count()} orders")
+        orders = self.project_queryset(Order.objects.filter(seller=request.user), OrderListSerializer)
+        if fast_serializers.enabled():
+            return self.fast_list_response(orders, fast_serializers.order_list)
+        fields = self.get_fieldset(OrderListSerializer)
         page = self.paginate_queryset(orders)
         if page is not None:
-            serializer = OrderListSerializer(page, many=True)
+            serializer = OrderListSerializer(page, many=True, fields=fields)
             return self.get_paginated_response(serializer.data)
-        serializer = OrderListSerializer(orders, many=True)
+        serializer = OrderListSerializer(orders, many=True, fields=fields)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
@@ -351,20 +439,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         if order.buyer != request.user:
             return Response({'error': '无权操作此订单'}, status=status.HTTP_403_FORBIDDEN)
         
-        if order.status != 'pending_payment':
-            return Response({'error': '订单状态不正确'}, status=status.HTTP_400_BAD_REQUEST)
-        
         # TODO: Integrate with WeChat Pay
         # For now, just update status
-        order.status = 'pending_shipment'
-        order.paid_at = datetime.now()
-        order.payment_method = 'wechat_pay'
-        order.save()
-        
-        # Update product status
-        if order.product:
-            order.product.status = 'reserved'
-            order.product.save()
+        try:
+            order_state.pay(order)
+        except OrderStateError as e:
+            return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(order)
         return Response(serializer.data)
@@ -378,20 +458,16 @@ class OrderViewSet(viewsets.ModelViewSet):
         if order.seller != request.user:
             return Response({'error': '无权操作此订单'}, status=status.HTTP_403_FORBIDDEN)
         
-        if order.status != 'pending_shipment':
-            return Response({'error': '订单状态不正确'}, status=status.HTTP_400_BAD_REQUEST)
-        
         shipping_company = request.data.get('shipping_company')
         shipping_no = request.data.get('shipping_no')
         
         if not shipping_company or not shipping_no:
             return Response({'error': '请提供物流信息'}, status=status.HTTP_400_BAD_REQUEST)
         
-        order.status = 'pending_receipt'
-        order.shipping_company = shipping_company
-        order.shipping_no = shipping_no
-        order.shipped_at = datetime.now()
-        order.save()
+        try:
+            order_state.ship(order, shipping_company, shipping_no)
+        except OrderStateError as e:
+            return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(order)
         return Response(serializer.data)
@@ -405,17 +481,10 @@ class OrderViewSet(viewsets.ModelViewSet):
         if order.buyer != request.user:
             return Response({'error': '无权操作此订单'}, status=status.HTTP_403_FORBIDDEN)
         
-        if order.status != 'pending_receipt':
-            return Response({'error': '订单状态不正确'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        order.status = 'completed'
-        order.completed_at = datetime.now()
-        order.save()
-        
-        # Update product status
-        if order.product:
-            order.product.status = 'sold'
-            order.product.save()
+        try:
+            order_state.confirm_receipt(order)
+        except OrderStateError as e:
+            return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(order)
         return Response(serializer.data)
@@ -429,50 +498,92 @@ class OrderViewSet(viewsets.ModelViewSet):
         if order.buyer != request.user:
             return Response({'error': '无权操作此订单'}, status=status.HTTP_403_FORBIDDEN)
         
-        if order.status not in ['pending_payment', 'pending_shipment']:
-            return Response({'error': '订单状态不允许取消'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        order.status = 'cancelled'
-        order.save()
-        
-        # Update product status back to available
-        if order.product:
-            order.product.status = 'available'
-            order.product.save()
+        try:
+            order_state.cancel(order)
+        except OrderStateError as e:
+            return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(order)
         return Response(serializer.data)
 
 
 # Chat Message ViewSet
-class ChatMessageViewSet(viewsets.ModelViewSet):
+class ChatMessageViewSet(MediaURLMixin, viewsets.ModelViewSet):
     """聊天消息视图集"""
     queryset = ChatMessage.objects.all()
     serializer_class = ChatMessageSerializer
     permission_classes = [IsAuthenticated]
+    # 聊天记录按时间正序，游标翻页期间新消息只会追加在末尾
+    keyset_ordering = ('created_at', 'id')
     
     def get_queryset(self):
         user = self.request.user
         order_id = self.request.query_params.get('order', None)
         
-        queryset = ChatMessage.objects.filter(
-            Q(sender=user) | Q(receiver=user)
-        )
-        
         if order_id:
-            queryset = queryset.filter(order_id=order_id)
+            # 先按订单定位（order, created_at 索引），再过滤参与者
+            queryset = ChatMessage.objects.filter(order_id=order_id).filter(
+                Q(sender=user) | Q(receiver=user)
+            )
+        else:
+            queryset = ChatMessage.objects.filter(id__in=union_ids(ChatMessage, user.pk, 'sender', 'receiver'))
+        
+        # 增量同步：只返回 since_id / since_ts 之后的新消息
+        since_id = self.request.query_params.get('since_id', None)
+        if since_id:
+            if not since_id.isdigit():
+                raise ValidationError({'since_id': '必须是整数'})
+            queryset = queryset.filter(id__gt=since_id)
+        since_ts = self.request.query_params.get('since_ts', None)
+        if since_ts:
+            since = parse_datetime(since_ts)
+            if since is None:
+                raise ValidationError({'since_ts': '时间格式不正确'})
+            queryset = queryset.filter(created_at__gt=since)
         
         return queryset.select_related('sender', 'receiver', 'order')
     
+    def list(self, request, *args, **kwargs):
+        # 长轮询：?order=&since_id=&wait=秒，没有新消息时等待到有新消息或超时。
+        # ASGI 模式下同步视图共用一个线程，在这里等待会阻塞本进程的其他同步请求，
+        # 因此忽略 wait 直接返回，长轮询改由 /api/async/messages/ 在事件循环中等待
+        order_id = request.query_params.get('order', None)
+        incremental = 'since_id' in request.query_params or 'since_ts' in request.query_params
+        wait = long_poll_timeout(request.query_params.get('wait'))
+        if isinstance(request._request, ASGIRequest):
+            wait = 0
+        if order_id and order_id.isdigit() and incremental and wait:
+            queryset = self.filter_queryset(self.get_queryset())
+            wait_for_messages(int(order_id), queryset.exists, wait)
+        return super().list(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
-        serializer.save(sender=self.request.user)
+        message = serializer.save(sender=self.request.user)
+        # 唤醒等待该订单新消息的长轮询请求
+        transaction.on_commit(lambda: notifier.notify(message.order_id))
+    
+    @action(detail=False, methods=['get'], keyset_ordering=('-last_message_id', '-id'))
+    def conversations(self, request):
+        """会话列表：每个订单会话的最后一条消息、未读数和对方信息"""
+        queryset = ConversationSerializer.setup_eager_loading(
+            ConversationState.objects.filter(user=request.user).order_by('-last_message_id', '-id')
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = ConversationSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = ConversationSerializer(queryset, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """未读消息总数（消息页角标）"""
+        total = ConversationState.objects.filter(user=request.user).aggregate(total=Sum('unread_count'))['total']
+        return Response({'unread_count': total or 0})
     
     @action(detail=False, methods=['post'])
     def mark_as_read(self, request):
         """标记消息为已读"""
         message_ids = request.data.get('message_ids', [])
-        ChatMessage.objects.filter(
-            id__in=message_ids,
-            receiver=request.user
-        ).update(is_read=True)
+        mark_messages_read(request.user, message_ids)
         return Response({'status': 'success'})
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppNameConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wxcloudrun'
+
+    def ready(self):
+        # 注册模型信号
+        from . import signals  # noqa: F401
@@ -3,6 +3,9 @@ ASGI config for wxcloudrun project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP 请求交给 Django 处理，WebSocket 连接（订单聊天实时推送）交给
+wxcloudrun.realtime.websocket_application。
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
@@ -13,4 +16,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wxcloudrun.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# 需在 Django 初始化之后导入
+from wxcloudrun.realtime import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,102 @@
+"""商品与目录只读接口、聊天消息长轮询的异步版本（/api/async/...，需以 SERVER_MODE=asgi 运行）
+
+ASGI 模式下 Django 会把同步视图放进同一个 thread_sensitive 线程依次执行，
+一个进程同一时刻只能处理一个同步请求。这里的异步视图把 DRF 视图集逻辑（查询、
+序列化、渲染）放到线程池中执行（thread_sensitive=False），多个请求的数据库查询可以并发；
+连接的读写和慢客户端由事件循环处理，不占用线程。
+
+Django 3.2 尚无异步 ORM，因此数据库访问仍在线程池中同步执行。返回内容与对应的同步接口
+完全相同，可用 `python manage.py benchmark_async` 对比两条路径的吞吐。
+
+消息长轮询（/api/async/messages/?order=&since_id=&wait=）在事件循环中等待 notifier，
+等待期间不占用线程；同步接口 /api/messages/ 在 ASGI 模式下忽略 wait 参数。
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed
+
+from .api_views import ChatMessageViewSet, ProductViewSet, ProductCategoryViewSet, SpeciesViewSet, GeneTagViewSet
+from .chat import long_poll_config, long_poll_timeout, notifier
+
+
+def _run_view(view, request, **kwargs):
+    """在线程池线程中执行同步视图并渲染响应"""
+    close_old_connections()
+    try:
+        response = view(request, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """把只读视图包装为异步视图
+
+    as_view 的 basename 与 urls.py 中路由注册的一致，响应缓存键与同步接口共用。
+    """
+    run = sync_to_async(_run_view, thread_sensitive=False)
+
+    async def wrapper(request, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return await run(view, request, **kwargs)
+    return wrapper
+
+
+product_list = async_view(ProductViewSet.as_view({'get': 'list'}, basename='product'))
+product_detail = async_view(ProductViewSet.as_view({'get': 'retrieve'}, basename='product'))
+category_list = async_view(ProductCategoryViewSet.as_view({'get': 'list'}, basename='category'))
+category_detail = async_view(ProductCategoryViewSet.as_view({'get': 'retrieve'}, basename='category'))
+species_list = async_view(SpeciesViewSet.as_view({'get': 'list'}, basename='species'))
+species_detail = async_view(SpeciesViewSet.as_view({'get': 'retrieve'}, basename='species'))
+gene_tag_list = async_view(GeneTagViewSet.as_view({'get': 'list'}, basename='gene-tag'))
+gene_tag_detail = async_view(GeneTagViewSet.as_view({'get': 'retrieve'}, basename='gene-tag'))
+
+_message_list = ChatMessageViewSet.as_view({'get': 'list'}, basename='message')
+_run_message_list = sync_to_async(_run_view, thread_sensitive=False)
+_async_waiters = 0  # 只在事件循环线程中读写
+
+
+def _has_results(response):
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict):
+        data = data.get('results')
+    return bool(data)
+
+
+async def message_list(request):
+    """聊天消息列表，带 wait 的增量请求在没有新消息时挂起等待
+
+    本进程写入的消息通过 notifier 立即唤醒；其他进程写入的消息每隔 RECHECK_INTERVAL 秒
+    重新查询一次发现。同时等待的请求数受 MAX_ASYNC_WAITERS 限制，超出时直接返回当前结果。
+    """
+    global _async_waiters
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    order_id = request.GET.get('order', '')
+    incremental = 'since_id' in request.GET or 'since_ts' in request.GET
+    wait = long_poll_timeout(request.GET.get('wait'))
+    config = long_poll_config()
+    if not (order_id.isdigit() and incremental and wait) or _async_waiters >= config.get('MAX_ASYNC_WAITERS', 1000):
+        return await _run_message_list(_message_list, request)
+
+    order_id = int(order_id)
+    recheck = config.get('RECHECK_INTERVAL', 2)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    _async_waiters += 1
+    try:
+        while True:
+            # 先取版本号再查询，避免查询与等待之间到达的通知丢失
+            version = notifier.version(order_id)
+            response = await _run_message_list(_message_list, request)
+            remaining = deadline - loop.time()
+            if response.status_code != 200 or _has_results(response) or remaining <= 0:
+                return response
+            await notifier.wait_async(order_id, version, min(remaining, recheck))
+    finally:
+        _async_waiters -= 1
@@ -0,0 +1,148 @@
+"""聊天消息的写操作（HTTP 接口和 WebSocket 共用）与长轮询等待"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import realtime
+from .models import ChatMessage, ConversationState
+
+
+def mark_messages_read(user, message_ids):
+    """把发给 user 的消息标记为已读，扣减会话未读数并向对应订单房间推送已读回执，返回标记数量"""
+    with transaction.atomic():
+        rows = list(
+            ChatMessage.objects.select_for_update()
+            .filter(id__in=message_ids, receiver=user, is_read=False)
+            .values_list('id', 'order_id')
+        )
+        if not rows:
+            return 0
+        ChatMessage.objects.filter(id__in=[message_id for message_id, _ in rows]).update(is_read=True)
+
+        by_order = defaultdict(list)
+        for message_id, order_id in rows:
+            by_order[order_id].append(message_id)
+        ConversationState.record_read(user.pk, {order_id: len(ids) for order_id, ids in by_order.items()})
+        transaction.on_commit(lambda: _publish_read_receipts(user.pk, by_order))
+    return len(rows)
+
+
+def _publish_read_receipts(reader_id, by_order):
+    for order_id, message_ids in by_order.items():
+        realtime.publish(realtime.order_room(order_id), {
+            'type': 'read',
+            'order': order_id,
+            'reader': reader_id,
+            'message_ids': message_ids,
+        })
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class MessageNotifier:
+    """进程内新消息通知，长轮询请求在此等待指定订单的新消息（线程等待 wait，协程等待 wait_async）"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions = defaultdict(int)
+        self._async_waiters = defaultdict(set)  # order_id -> {(事件循环, future)}
+
+    def version(self, order_id):
+        with self._condition:
+            return self._versions.get(order_id, 0)
+
+    def notify(self, order_id):
+        with self._condition:
+            self._versions[order_id] += 1
+            self._condition.notify_all()
+            waiters = self._async_waiters.pop(order_id, set())
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+    def wait(self, order_id, version, timeout):
+        """等待订单版本号变化，超时返回 False"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._versions.get(order_id, 0) != version, timeout)
+
+    async def wait_async(self, order_id, version, timeout):
+        """在事件循环中等待订单版本号变化，不占用线程，超时返回 False"""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._condition:
+            if self._versions.get(order_id, 0) != version:
+                return True
+            self._async_waiters[order_id].add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._condition:
+                waiters = self._async_waiters.get(order_id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._async_waiters[order_id]
+
+
+notifier = MessageNotifier()
+_waiter_slots = None
+_waiter_slots_lock = threading.Lock()
+
+
+def long_poll_config():
+    return getattr(settings, 'CHAT_LONG_POLL', {})
+
+
+def _acquire_waiter_slot():
+    global _waiter_slots
+    if _waiter_slots is None:
+        with _waiter_slots_lock:
+            if _waiter_slots is None:
+                _waiter_slots = threading.BoundedSemaphore(long_poll_config().get('MAX_WAITERS', 2))
+    return _waiter_slots.acquire(blocking=False)
+
+
+def long_poll_timeout(value):
+    """解析 wait 参数（秒），限制在 MAX_WAIT 以内，无效值返回 0"""
+    try:
+        wait = float(value or 0)
+    except ValueError:
+        return 0
+    return max(0.0, min(wait, long_poll_config().get('MAX_WAIT', 25)))
+
+
+def wait_for_messages(order_id, has_new, timeout):
+    """阻塞直到 has_new() 为真或超时
+
+    本进程写入的消息通过 notifier 立即唤醒；其他进程写入的消息每隔 RECHECK_INTERVAL 秒
+    重新查询一次发现。同时等待的请求数受 MAX_WAITERS 限制（每个等待占用一个 worker 线程），
+    超出时直接返回当前结果。
+    """
+    if not _acquire_waiter_slot():
+        return has_new()
+    try:
+        recheck = long_poll_config().get('RECHECK_INTERVAL', 2)
+        deadline = time.monotonic() + timeout
+        while True:
+            # 先取版本号再查询，避免查询与等待之间到达的通知丢失
+            version = notifier.version(order_id)
+            if has_new():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            notifier.wait(order_id, version, min(remaining, recheck))
+    finally:
+        _waiter_slots.release()
@@ -0,0 +1,68 @@
+"""MySQL 数据库后端：在 Django 自带后端基础上增加连接健康检查与可选连接池
+
+DATABASES 配置项（Django 3.2 本身不识别，由本后端读取）：
+
+- CONN_HEALTH_CHECKS: 复用持久连接（CONN_MAX_AGE > 0）前先 ping，每个请求最多检查一次
+- POOL: 连接池配置 {'MAX_SIZE', 'TIMEOUT', 'RECYCLE', 'PRE_PING'}，启用后应将
+  CONN_MAX_AGE 设为 0，让 Django 在请求结束时把连接归还连接池
+"""
+from django.db.backends.mysql import base as mysql_base
+
+from ..pool import get_pool
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    def get_pool(self):
+        config = self.settings_dict.get('POOL')
+        if not config:
+            return None
+        return get_pool(self.alias, self._connect_unpooled, config)
+
+    def _connect_unpooled(self):
+        return super().get_new_connection(self.get_connection_params())
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.acquire()
+
+    def connect(self):
+        super().connect()
+        # 新建（或刚从连接池取出）的连接无需再检查
+        self.health_check_done = True
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            discard = self.errors_occurred
+            if not discard and not self.autocommit:
+                try:
+                    self.connection.rollback()
+                except Exception:
+                    discard = True
+            pool.release(self.connection, discard=discard)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # 请求开始/结束时重置，下一次使用连接前重新检查
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and not self.in_atomic_block
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,140 @@
+"""数据库连接池
+
+同一进程内的所有线程共享一个有界连接池，每个数据库别名一个池。
+Django 在请求结束时"关闭"连接会归还到池中，而不是断开 TCP/TLS 连接。
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('log')
+
+
+class PoolTimeout(Exception):
+    """在超时时间内没有可用连接"""
+
+
+class ConnectionPool:
+    """有界连接池
+
+    - max_size: 最多同时存在的连接数（含使用中与空闲）
+    - timeout: 连接耗尽时的最长等待时间（秒）
+    - recycle: 连接创建后超过该秒数即丢弃重建，避免被服务端 wait_timeout 断开
+    - pre_ping: 取出空闲连接时先 ping，失败则丢弃重建
+    """
+
+    def __init__(self, connect, max_size=10, timeout=30, recycle=3600, pre_ping=True):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = deque()  # (connection, created_at)
+        self._created_at = {}  # id(connection) -> created_at
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'ping_failures': 0,
+            'in_use': 0,
+        }
+
+    def _incr(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _discard(self, connection):
+        self._created_at.pop(id(connection), None)
+        self._incr('closed')
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, connection):
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            self._incr('ping_failures')
+            return False
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            self._incr('waits')
+            if not self._slots.acquire(timeout=self.timeout):
+                self._incr('timeouts')
+                raise PoolTimeout(f'{self.timeout} 秒内未获取到数据库连接（max_size={self.max_size}）')
+        try:
+            connection = self._checkout_idle()
+            if connection is None:
+                connection = self._connect()
+                with self._lock:
+                    self._created_at[id(connection)] = time.monotonic()
+                    self._stats['created'] += 1
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+        return connection
+
+    def _checkout_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, created_at = self._idle.pop()
+            if time.monotonic() - created_at > self.recycle or (self.pre_ping and not self._is_alive(connection)):
+                self._discard(connection)
+                continue
+            return connection
+
+    def release(self, connection, discard=False):
+        try:
+            created_at = self._created_at.get(id(connection))
+            if discard or created_at is None:
+                self._discard(connection)
+            else:
+                with self._lock:
+                    self._idle.append((connection, created_at))
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle), max_size=self.max_size)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, connect, config):
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(
+                connect,
+                max_size=config.get('MAX_SIZE', 10),
+                timeout=config.get('TIMEOUT', 30),
+                recycle=config.get('RECYCLE', 3600),
+                pre_ping=config.get('PRE_PING', True),
+            )
+            logger.info('db.pool.created alias=%s max_size=%s', alias, pool.max_size)
+        return pool
+
+
+def pool_stats():
+    """各数据库别名的连接池指标"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
@@ -0,0 +1,349 @@
+"""商品浏览页的分面计数
+
+浏览页需要在当前筛选条件下给出分类、物种、性别、基因标签和价格区间各取值的商品数。
+FacetIndex 在进程内为在售（status=available）商品维护每个分面取值的位图
+（Python int，第 n 位表示商品 id=n），计数时按位与后统计 1 的个数，不访问数据库。
+
+- 同一分面内多选为“或”，不同分面之间为“且”；计算某个分面的计数时不应用该分面自身的
+  条件（多选时其他取值的数量仍然可见）。基因标签多选为“且”，计数时应用全部条件。
+- 索引由信号增量维护（商品保存/删除、基因标签关联变化、订单状态机对商品状态的条件更新），
+  多进程部署时其他进程的写入不可见，超过 FACETS['MAX_AGE'] 秒后在下一次查询时全量重建，
+  重建时与旧索引的差异会记录到日志。
+- check() 对比索引与数据库（逐个商品及各分面的 GROUP BY 计数），
+  `python manage.py rebuild_facet_index --check` 可在部署后核对。
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count
+from rest_framework.exceptions import ValidationError
+
+from . import search
+from .models import Product, ProductGeneTag, Species
+
+logger = logging.getLogger('log')
+
+FACETS = ('category', 'species', 'sex', 'gene_tags', 'price')
+
+if hasattr(int, 'bit_count'):
+    _popcount = int.bit_count
+else:  # Python < 3.10
+    def _popcount(bitmap):
+        return bin(bitmap).count('1')
+
+
+def _bitmap(ids):
+    """由 id 集合构造位图"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buf = bytearray(max(ids) // 8 + 1)
+    for product_id in ids:
+        buf[product_id >> 3] |= 1 << (product_id & 7)
+    return int.from_bytes(buf, 'little')
+
+
+class FacetIndex:
+    """在售商品分面位图"""
+
+    def __init__(self, max_age=None, price_buckets=None):
+        config = getattr(settings, 'FACETS', {})
+        self.max_age = max_age if max_age is not None else config.get('MAX_AGE', 300)
+        edges = price_buckets if price_buckets is not None else config.get('PRICE_BUCKETS', [100, 300, 500, 1000, 3000])
+        self.edges = [Decimal(str(edge)) for edge in edges]
+        self.price_labels = [f'{lower}-{upper}' for lower, upper in zip(['0', *edges], edges)] + [f'{edges[-1]}-']
+        self._lock = threading.RLock()
+        self._docs = {}  # product_id -> {分面: 取值}，gene_tags 为标签 id 元组
+        self._prices = {}  # product_id -> 价格（min_price / max_price 条件）
+        self._morphs = {}  # product_id -> 小写品系（morph 条件）
+        self._bitmaps = {facet: defaultdict(int) for facet in FACETS}
+        self._all = 0
+        self._built_at = None
+
+    def price_label(self, price):
+        for index, edge in enumerate(self.edges):
+            if price < edge:
+                return self.price_labels[index]
+        return self.price_labels[-1]
+
+    def _load(self, product_ids=None):
+        """从数据库读取在售商品的分面取值，返回 {product_id: (doc, price, morph)}"""
+        products = Product.objects.filter(status='available')
+        tags = ProductGeneTag.objects.filter(product__status='available')
+        if product_ids is not None:
+            products = products.filter(id__in=product_ids)
+            tags = tags.filter(product_id__in=product_ids)
+        gene_tags = defaultdict(list)
+        for product_id, gene_tag_id in tags.values_list('product_id', 'gene_tag_id'):
+            gene_tags[product_id].append(gene_tag_id)
+
+        loaded = {}
+        rows = products.values_list('id', 'category_id', 'species_id', 'sex', 'price', 'morph')
+        for product_id, category_id, species_id, sex, price, morph in rows.iterator():
+            doc = {
+                'category': category_id,
+                'species': species_id,
+                'sex': sex,
+                'gene_tags': tuple(sorted(gene_tags.get(product_id, ()))),
+                'price': self.price_label(price),
+            }
+            loaded[product_id] = (doc, price, (morph or '').lower())
+        return loaded
+
+    @staticmethod
+    def _values(facet, doc):
+        value = doc[facet]
+        if facet == 'gene_tags':
+            return value
+        return () if value is None else (value,)
+
+    def _add(self, product_id, doc, price, morph):
+        bit = 1 << product_id
+        for facet in FACETS:
+            for value in self._values(facet, doc):
+                self._bitmaps[facet][value] |= bit
+        self._docs[product_id] = doc
+        self._prices[product_id] = price
+        self._morphs[product_id] = morph
+        self._all |= bit
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        mask = ~(1 << product_id)
+        for facet in FACETS:
+            bitmaps = self._bitmaps[facet]
+            for value in self._values(facet, doc):
+                bitmaps[value] &= mask
+                if not bitmaps[value]:
+                    del bitmaps[value]
+        self._prices.pop(product_id, None)
+        self._morphs.pop(product_id, None)
+        self._all &= mask
+
+    def _ensure_built(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.rebuild()
+
+    def rebuild(self):
+        """全量重建，返回在售商品数"""
+        loaded = self._load()
+        members = {facet: defaultdict(list) for facet in FACETS}
+        for product_id, (doc, _, _) in loaded.items():
+            for facet in FACETS:
+                for value in self._values(facet, doc):
+                    members[facet][value].append(product_id)
+        with self._lock:
+            if self._built_at is not None:
+                drift = self._diff({product_id: doc for product_id, (doc, _, _) in loaded.items()})
+                if drift:
+                    logger.info('facets.rebuild drift=%s sample=%s', len(drift), drift[:5])
+            self._docs = {product_id: doc for product_id, (doc, _, _) in loaded.items()}
+            self._prices = {product_id: price for product_id, (_, price, _) in loaded.items()}
+            self._morphs = {product_id: morph for product_id, (_, _, morph) in loaded.items()}
+            self._bitmaps = {
+                facet: defaultdict(int, {value: _bitmap(ids) for value, ids in values.items()})
+                for facet, values in members.items()
+            }
+            self._all = _bitmap(loaded)
+            self._built_at = time.monotonic()
+            return len(loaded)
+
+    def update_products(self, product_ids):
+        """增量更新指定商品（不再在售或已删除时移出索引）"""
+        if self._built_at is None:
+            return  # 尚未加载，首次查询时会全量构建
+        product_ids = set(product_ids)
+        loaded = self._load(product_ids)
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+            for product_id, (doc, price, morph) in loaded.items():
+                self._add(product_id, doc, price, morph)
+
+    def remove_products(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+
+    def _match(self, facet, values):
+        if facet == 'gene_tags':
+            bitmaps = self._bitmaps[facet]
+            matched = self._all
+            for value in values:
+                matched &= bitmaps.get(value, 0)
+            return matched
+        return self.union(facet, values)
+
+    def union(self, facet, values):
+        """具备 values 中任一取值的商品位图"""
+        self._ensure_built()
+        with self._lock:
+            bitmaps = self._bitmaps[facet]
+            matched = 0
+            for value in values:
+                matched |= bitmaps.get(value, 0)
+            return matched
+
+    def restrict(self, min_price=None, max_price=None, morph=None):
+        """价格范围和品系条件对应的位图，没有条件时返回 None"""
+        if min_price is None and max_price is None and not morph:
+            return None
+        self._ensure_built()
+        morph = (morph or '').lower()
+        with self._lock:
+            return _bitmap(
+                product_id for product_id, price in self._prices.items()
+                if (min_price is None or price >= min_price) and (max_price is None or price <= max_price)
+                and (not morph or morph in self._morphs[product_id])
+            )
+
+    def count(self, filters, restrict=None):
+        """filters 为 {分面: [取值, ...]}，restrict 为额外的位图条件（如价格范围、搜索结果）
+
+        返回 {'total': 满足全部条件的商品数, 'facets': {分面: [{'value': 取值, 'count': 数量}, ...]}}，
+        计数为 0 的取值省略（已选中的取值除外）。
+        """
+        self._ensure_built()
+        with self._lock:
+            base = self._all if restrict is None else self._all & restrict
+            matched = {facet: self._match(facet, values) for facet, values in filters.items() if values}
+            total = base
+            for bitmap in matched.values():
+                total &= bitmap
+
+            result = {}
+            for facet in FACETS:
+                scope = base
+                for other, bitmap in matched.items():
+                    if other != facet or facet == 'gene_tags':
+                        scope &= bitmap
+                selected = set(filters.get(facet) or ())
+                counts = []
+                for value, bitmap in self._bitmaps[facet].items():
+                    count = _popcount(scope & bitmap)
+                    if count or value in selected:
+                        counts.append({'value': value, 'count': count})
+                counts.extend({'value': value, 'count': 0} for value in selected - set(self._bitmaps[facet]))
+                if facet == 'price':
+                    order = {label: index for index, label in enumerate(self.price_labels)}
+                    counts.sort(key=lambda item: order.get(item['value'], len(order)))
+                else:
+                    counts.sort(key=lambda item: (-item['count'], str(item['value'])))
+                result[facet] = counts
+            return {'total': _popcount(total), 'facets': result}
+
+    def _diff(self, docs):
+        """与给定文档逐个商品对比，返回 [(product_id, 索引中的取值, 数据库中的取值), ...]"""
+        diff = []
+        for product_id in sorted(set(self._docs) | set(docs)):
+            current, expected = self._docs.get(product_id), docs.get(product_id)
+            if current != expected:
+                diff.append((product_id, current, expected))
+        return diff
+
+    def check(self):
+        """核对索引与数据库，返回不一致项的描述列表（空列表表示一致）"""
+        self._ensure_built()
+        loaded = self._load()
+        problems = [f'商品 {product_id}: 索引 {current} / 数据库 {expected}'
+                    for product_id, current, expected in self._diff({pid: doc for pid, (doc, _, _) in loaded.items()})]
+
+        counts = self.count({})['facets']
+        available = Product.objects.filter(status='available')
+        expected = {
+            'category': available.exclude(category=None).values_list('category_id').annotate(n=Count('id')),
+            'species': available.exclude(species=None).values_list('species_id').annotate(n=Count('id')),
+            'sex': available.values_list('sex').annotate(n=Count('id')),
+            'gene_tags': (ProductGeneTag.objects.filter(product__status='available')
+                         .values_list('gene_tag_id').annotate(n=Count('id'))),
+        }
+        for facet, rows in expected.items():
+            actual = {item['value']: item['count'] for item in counts[facet]}
+            rows = dict(rows.order_by())
+            if actual != rows:
+                problems.append(f'{facet} 计数不一致: 索引 {actual} / 数据库 {rows}')
+        price_counts = defaultdict(int)
+        for price in available.values_list('price', flat=True):
+            price_counts[self.price_label(price)] += 1
+        actual = {item['value']: item['count'] for item in counts['price']}
+        if actual != dict(price_counts):
+            problems.append(f'price 计数不一致: 索引 {actual} / 数据库 {dict(price_counts)}')
+        return problems
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    return FacetIndex()
+
+
+def update_products(product_ids):
+    """商品变化后更新分面索引，失败只记录日志，不影响业务写入"""
+    try:
+        get_index().update_products(product_ids)
+    except Exception:
+        logger.exception('更新分面索引失败 product_ids=%s', list(product_ids))
+
+
+def remove_products(product_ids):
+    get_index().remove_products(product_ids)
+
+
+def _int_list(params, name):
+    values = [value.strip() for value in (params.get(name) or '').split(',') if value.strip()]
+    if not all(value.isdigit() for value in values):
+        raise ValidationError({name: '应为逗号分隔的 ID'})
+    return [int(value) for value in values]
+
+
+def _price(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: '价格格式不正确'})
+
+
+def facet_counts(params):
+    """按商品列表接口的查询参数计算分面计数
+
+    支持 category、species（ID 或名称）、sex、morph、min_price、max_price，以及
+    gene_tags（多个标签同时具备）、any_tags（具备任一标签）和 price（价格区间，如 100-300）；多选用逗号分隔。
+    带 search 参数时只统计全文搜索命中的商品。
+    """
+    index = get_index()
+    species = params.get('species') or ''
+    if species and not species.replace(',', '').isdigit():
+        species_ids = list(Species.objects.filter(name__icontains=species).values_list('id', flat=True)) or [0]
+    else:
+        species_ids = _int_list(params, 'species')
+    prices = [value for value in (params.get('price') or '').split(',') if value]
+    unknown = [value for value in prices if value not in index.price_labels]
+    if unknown:
+        raise ValidationError({'price': f'未知的价格区间: {unknown}，可选 {index.price_labels}'})
+
+    filters = {
+        'category': _int_list(params, 'category'),
+        'species': species_ids,
+        'sex': [value for value in (params.get('sex') or '').split(',') if value],
+        'gene_tags': _int_list(params, 'gene_tags'),
+        'price': prices,
+    }
+    restrict = index.restrict(_price(params, 'min_price'), _price(params, 'max_price'), params.get('morph'))
+    any_tags = _int_list(params, 'any_tags')
+    if any_tags:
+        tagged = index.union('gene_tags', any_tags)
+        restrict = tagged if restrict is None else restrict & tagged
+    if params.get('search'):
+        ranked = search.get_backend().search(params['search'])
+        searched = _bitmap(product_id for product_id, _ in ranked)
+        restrict = searched if restrict is None else restrict & searched
+    return index.count(filters, restrict)
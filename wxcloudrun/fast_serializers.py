@@ -0,0 +1,269 @@
+"""热点列表接口的快速序列化
+
+商品列表、订单列表和基因标签列表是只读的固定结构，逐条经过 DRF ModelSerializer 的
+字段机制开销与查询本身相当。这里改为：
+
+1. queryset.values(...) 一次取出所需列（含 JOIN 列），不实例化模型；
+2. 按声明的字段列表预先编译出每个输出键的取值函数，逐行生成 dict；
+3. 由 renderers.FastJSONRenderer（可用时使用 orjson）渲染。
+
+输出与对应的 DRF 序列化器完全一致（键顺序、Decimal 字符串格式、日期格式、外键为空时
+省略 `xxx_name` 键），对应关系见各类的 contract 属性。修改 DRF 序列化器字段时需同步修改。
+settings.FAST_SERIALIZERS = False 时各接口退回 DRF 序列化器。
+
+?fields= / ?expand= 选出的字段通过 subset() 得到只含这些字段的序列化器，
+.values() 只查询对应的列和 JOIN。
+"""
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from rest_framework import ISO_8601
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .models import GeneTag, Order, Product, User
+from .serializers import (
+    GeneTagSerializer, OrderListSerializer, ProductListSerializer, UserBriefSerializer
+)
+
+SKIP = object()
+
+
+def enabled():
+    return getattr(settings, 'FAST_SERIALIZERS', True)
+
+
+class Field:
+    """输出字段声明
+
+    column 为 .values() 的列名（默认与 name 相同）；kind 决定取值后的转换；
+    present_if 指定一个外键列，该列为 NULL 时省略此键（与 DRF 遇到空关联时跳过字段一致）。
+    """
+
+    def __init__(self, name, column=None, kind=None, present_if=None):
+        self.name = name
+        self.column = column or name
+        self.kind = kind
+        self.present_if = present_if
+
+    def columns(self, prefix=''):
+        return [prefix + self.column] + ([prefix + self.present_if] if self.present_if else [])
+
+    def compile(self, model, prefix=''):
+        return _compile(self, model, prefix)
+
+
+class Nested(Field):
+    """嵌套对象（对应 DRF 嵌套序列化器），外键为 NULL 时输出 None"""
+
+    def __init__(self, name, serializer_class, column=None):
+        super().__init__(name, column)
+        self.serializer_class = serializer_class
+
+    def _nested(self, prefix):
+        return self.serializer_class(prefix=f'{prefix}{self.column}__')
+
+    def columns(self, prefix=''):
+        return [prefix + self.column] + self._nested(prefix).columns
+
+    def compile(self, model, prefix=''):
+        key, nested = prefix + self.column, self._nested(prefix)
+        return lambda row: None if row[key] is None else nested.serialize_row(row)
+
+
+def _decimal_converter(model_field):
+    quantum = Decimal('.1') ** model_field.decimal_places
+
+    def convert(value):
+        if value is None:
+            return None
+        return '{:f}'.format(Decimal(value).quantize(quantum))
+    return convert
+
+
+def _datetime_converter():
+    if settings.USE_TZ or api_settings.DATETIME_FORMAT != ISO_8601:
+        return serializers.DateTimeField().to_representation
+
+    def convert(value):
+        if value is None:
+            return None
+        return value.isoformat()
+    return convert
+
+
+def _str_converter(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def _compile(field, model, prefix=''):
+    """生成 row -> 输出值（或 SKIP）的取值函数"""
+    column = prefix + field.column
+    present_if = prefix + field.present_if if field.present_if else None
+    if field.kind == 'decimal':
+        convert = _decimal_converter(model._meta.get_field(field.column))
+    elif field.kind == 'datetime':
+        convert = _datetime_converter()
+    elif field.kind == 'str':
+        convert = _str_converter
+    elif field.kind == 'or_none':
+        def convert(value):
+            return value or None
+    else:
+        convert = None
+
+    if present_if and convert:
+        return lambda row: SKIP if row[present_if] is None else convert(row[column])
+    if present_if:
+        return lambda row: SKIP if row[present_if] is None else row[column]
+    if convert:
+        return lambda row: convert(row[column])
+    return lambda row: row[column]
+
+
+class FastSerializer:
+    """基于 .values() 行的只读列表序列化器"""
+    model = None
+    contract = None  # 输出需保持一致的 DRF 序列化器
+    fields = []
+
+    def __init__(self, fields=None, prefix=''):
+        if fields is None:
+            # 默认输出不含需要 expand 的字段，与 DRF 序列化器一致
+            expandable = getattr(self.contract.Meta, 'expandable_fields', ())
+            fields = [field for field in type(self).fields if field.name not in expandable]
+        self.fields = fields
+        self.prefix = prefix
+        columns = []
+        for field in fields:
+            for column in field.columns(prefix):
+                if column not in columns:
+                    columns.append(column)
+        self.columns = columns
+        self.extractors = [(field.name, field.compile(self.model, prefix)) for field in fields]
+        self._subsets = {}
+        self._lock = threading.Lock()
+
+    def subset(self, names):
+        """只输出 names 中字段的序列化器（names 由 DRF 序列化器的 select_fields() 计算）"""
+        names = tuple(names)
+        if names == tuple(field.name for field in self.fields):
+            return self
+        with self._lock:
+            if names not in self._subsets:
+                fields = [field for field in type(self).fields if field.name in names]
+                self._subsets[names] = type(self)(fields, self.prefix)
+            return self._subsets[names]
+
+    def values(self, queryset, extra=()):
+        """把 queryset 转为只包含所需列的 values() 查询（保留过滤、排序和注解）
+
+        extra 为输出之外还需要读取的列，如游标分页的排序键。
+        """
+        columns = self.columns + [column for column in extra if column not in self.columns]
+        return queryset.prefetch_related(None).values(*columns)
+
+    def serialize_row(self, row):
+        item = {}
+        for name, extract in self.extractors:
+            value = extract(row)
+            if value is not SKIP:
+                item[name] = value
+        return item
+
+    def serialize(self, rows):
+        serialize_row = self.serialize_row
+        return [serialize_row(row) for row in rows]
+
+
+class UserBriefFastSerializer(FastSerializer):
+    model = User
+    contract = UserBriefSerializer
+    fields = [
+        Field('id'),
+        Field('nickname', kind='str'),
+        Field('avatar', kind='str'),
+    ]
+
+
+class ProductListFastSerializer(FastSerializer):
+    model = Product
+    contract = ProductListSerializer
+    fields = [
+        Field('id'),
+        Field('title', kind='str'),
+        Field('species'),
+        Field('species_name', 'species__name', kind='str', present_if='species'),
+        Field('morph', kind='str'),
+        Field('age', kind='str'),
+        Field('sex', kind='str'),
+        Field('price', kind='decimal'),
+        Field('status', kind='str'),
+        Field('seller_name', 'seller__nickname', kind='str'),
+        Field('category_name', 'category__name', kind='str', present_if='category'),
+        Field('first_image', 'cover_image', kind='or_none'),
+        Field('gene_tags', 'tag_summary'),
+        Field('view_count'),
+        Field('created_at', kind='datetime'),
+        Field('description', kind='str'),
+        Nested('seller', UserBriefFastSerializer),
+    ]
+
+
+class OrderListFastSerializer(FastSerializer):
+    model = Order
+    contract = OrderListSerializer
+    fields = [
+        Field('id'),
+        Field('order_no', kind='str'),
+        Field('buyer_name', 'buyer__nickname', kind='str'),
+        Field('seller_name', 'seller__nickname', kind='str'),
+        Field('product_title', 'product__title', kind='str', present_if='product'),
+        Field('product_image', 'product__cover_image', kind='or_none'),
+        Field('total_amount', kind='decimal'),
+        Field('status', kind='str'),
+        Field('created_at', kind='datetime'),
+        Nested('buyer', UserBriefFastSerializer),
+        Nested('seller', UserBriefFastSerializer),
+        Nested('product', ProductListFastSerializer),
+    ]
+
+
+class GeneTagFastSerializer(FastSerializer):
+    model = GeneTag
+    contract = GeneTagSerializer
+    fields = [
+        Field('id'),
+        Field('name', kind='str'),
+        Field('species', 'species_id'),
+        Field('species_name', 'species__name', kind='str'),
+        Field('description', kind='str'),
+        Field('color', kind='str'),
+        Field('sort_order'),
+    ]
+
+
+product_list = ProductListFastSerializer()
+order_list = OrderListFastSerializer()
+gene_tag_list = GeneTagFastSerializer()
+
+
+class FastListMixin:
+    """list 动作走快速序列化；fast_serializer 为空或关闭开关时使用 DRF 序列化器"""
+    fast_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        if self.fast_serializer is None or not enabled():
+            return super().list(request, *args, **kwargs)
+        return self.fast_list_response(self.filter_queryset(self.get_queryset()), self.fast_serializer)
+
+    def fast_list_response(self, queryset, fast_serializer):
+        # 游标分页需要从行中读取排序键
+        ordering = [term.lstrip('-') for term in getattr(self, 'keyset_ordering', None) or ()]
+        rows = fast_serializer.values(queryset, extra=ordering)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast_serializer.serialize(page))
+        return Response(fast_serializer.serialize(rows))
@@ -0,0 +1,44 @@
+"""稀疏字段集：?fields=id,title,price 只返回列出的字段，?expand=seller 额外返回默认不输出的字段
+
+字段选择同时下推到查询：DRF 路径使用 select_related + only()，快速序列化路径只 values()
+所需的列，响应体和数据库读取量一起减少。可选字段由各序列化器的 Meta 声明
+（见 serializers.SparseFieldsetMixin）。
+"""
+from .serializers import SparseFieldsetMixin
+
+
+def split_param(value):
+    """逗号分隔的查询参数，未提供时返回 None"""
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class FieldsetMixin:
+    """视图集按 ?fields= / ?expand= 裁剪只读动作的响应
+
+    fieldset_actions 之外的动作（写操作、状态流转）始终输出默认字段。
+    """
+    fieldset_actions = ('list', 'retrieve')
+
+    def get_fieldset(self, serializer_class):
+        """serializer_class 在当前请求下应输出的字段；参数含未知字段时抛出 ValidationError"""
+        if self.action not in self.fieldset_actions:
+            return serializer_class.select_fields()
+        params = self.request.query_params
+        return serializer_class.select_fields(split_param(params.get('fields')), split_param(params.get('expand')))
+
+    def project_queryset(self, queryset, serializer_class):
+        """只查询 serializer_class 输出字段需要的列"""
+        ordering = [term.lstrip('-') for term in getattr(self, 'keyset_ordering', None) or ()]
+        return serializer_class.project(queryset, self.get_fieldset(serializer_class), extra=ordering)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, SparseFieldsetMixin):
+            kwargs.setdefault('fields', self.get_fieldset(serializer_class))
+        return super().get_serializer(*args, **kwargs)
+
+    def fast_list_response(self, queryset, fast_serializer):
+        fast_serializer = fast_serializer.subset(self.get_fieldset(fast_serializer.contract))
+        return super().fast_list_response(queryset, fast_serializer)
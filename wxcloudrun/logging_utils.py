@@ -0,0 +1,50 @@
+"""日志工具：采样过滤器与非阻塞队列 Handler
+
+在 settings.LOGGING 中使用：
+
+- SamplingFilter：对不高于 max_level 的日志按比例采样，WARNING 及以上始终保留
+- QueueListenerHandler：请求线程只把日志记录放入队列，由后台 QueueListener 线程
+  写入文件/控制台，RotatingFileHandler 轮转时不会阻塞工作线程
+"""
+import atexit
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+
+class SamplingFilter(logging.Filter):
+    """按比例采样低级别日志"""
+
+    def __init__(self, rate=1.0, max_level='INFO'):
+        super().__init__()
+        self.rate = float(rate)
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class QueueListenerHandler(QueueHandler):
+    """把日志转发到后台线程处理的 QueueHandler
+
+    handlers 通过 'cfg://handlers.<name>' 引用 LOGGING 中已配置的 Handler，
+    dictConfig 按名称排序配置 Handler，因此本 Handler 的名称需排在被引用的 Handler 之后。
+    """
+
+    def __init__(self, handlers, respect_handler_level=True, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        # ConvertingList 在按下标访问时才解析 cfg:// 引用
+        handlers = [handlers[i] for i in range(len(handlers))]
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=respect_handler_level)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # 队列满时丢弃，不阻塞请求线程
+            pass
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from wxcloudrun.models import Product
+
+
+class Command(BaseCommand):
+    """回填商品卡片冗余字段（封面图片、基因标签摘要）"""
+    help = '根据商品图片和基因标签回填 cover_image / tag_summary'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批处理的商品数量')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        total = 0
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            total += Product.refresh_listing_cards(batch, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'已回填 {total} 个商品的卡片字段'))
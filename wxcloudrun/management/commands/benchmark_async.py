@@ -0,0 +1,89 @@
+import asyncio
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient
+
+
+class Command(BaseCommand):
+    """对比只读接口同步路径（/api/...）与异步路径（/api/async/...）在 ASGI 下的吞吐"""
+    help = '通过 ASGI 并发请求同一接口的同步和异步版本，输出吞吐和延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='products/', help='接口路径（/api/ 之后的部分），如 products/ 或 gene-tags/')
+        parser.add_argument('--requests', type=int, default=200, help='每条路径的请求总数')
+        parser.add_argument('--concurrency', type=int, default=20, help='并发请求数')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='为每条 SQL 增加的模拟网络延迟（毫秒），本地 SQLite 下模拟云数据库往返')
+
+    def handle(self, *args, **options):
+        path = options['path'].lstrip('/')
+        if options['db_latency']:
+            self.add_db_latency(options['db_latency'] / 1000)
+        targets = [('sync', f'/api/{path}'), ('async', f'/api/async/{path}')]
+        bodies = {}
+        for label, url in targets:
+            stats = asyncio.run(self.run(url, options['requests'], options['concurrency']))
+            bodies[label] = stats.pop('body')
+            self.stdout.write(
+                f"{label:<6} {url:<32} {stats['rps']:>8.1f} req/s  "
+                f"p50 {stats['p50']:.1f}ms  p95 {stats['p95']:.1f}ms  errors {stats['errors']}"
+            )
+        if self.comparable(bodies['sync']) != self.comparable(bodies['async']):
+            self.stdout.write(self.style.WARNING('同步与异步接口的响应内容不一致'))
+
+    @staticmethod
+    def add_db_latency(seconds):
+        def delay(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            # 同一线程的连接对象会被复用，重新建连时不要重复添加
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+        connection_created.connect(install, weak=False)
+
+    @staticmethod
+    def comparable(body):
+        """去掉分页链接（两条路径的 URL 前缀不同）后比较响应内容"""
+        data = json.loads(body) if body else None
+        if isinstance(data, dict):
+            data.pop('next', None)
+            data.pop('previous', None)
+        return data
+
+    async def run(self, url, total, concurrency):
+        client = AsyncClient()
+        latencies = []
+        errors = 0
+        body = None
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            nonlocal errors, body
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+                elif body is None:
+                    body = response.content
+
+        await one()  # 预热（建立连接、填充缓存）
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return {
+            'rps': total / elapsed,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'errors': errors,
+            'body': body,
+        }
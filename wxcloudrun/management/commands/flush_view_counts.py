@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from wxcloudrun.view_counter import get_view_counter
+
+
+class Command(BaseCommand):
+    """把缓冲的商品浏览次数写入数据库"""
+    help = '刷写缓冲的商品浏览次数（共享计数存储下可汇总所有进程的增量）'
+
+    def handle(self, *args, **options):
+        total = get_view_counter().flush()
+        self.stdout.write(self.style.SUCCESS(f'已写入 {total} 次浏览'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from wxcloudrun.models import ChatMessage, ConversationState
+
+
+class Command(BaseCommand):
+    """根据聊天记录重建会话状态（最后一条消息、未读数）"""
+    help = '根据 chat_messages 重建 conversation_states，用于首次上线回填或修复计数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='每批处理的订单数量')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        order_ids = list(ChatMessage.objects.order_by('order_id').values_list('order_id', flat=True).distinct())
+        total = 0
+        for start in range(0, len(order_ids), batch_size):
+            total += ConversationState.rebuild(order_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'已重建 {len(order_ids)} 个订单的 {total} 条会话状态'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from wxcloudrun.neighbors import rebuild
+
+
+class Command(BaseCommand):
+    """全量重算相似商品近邻表"""
+    help = '按物种分组批量计算在售商品的前 k 个相似商品并整表替换 product_neighbors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批写入的行数')
+
+    def handle(self, *args, **options):
+        total = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已写入 {total} 条相似商品记录'))
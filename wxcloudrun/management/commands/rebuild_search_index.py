@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from wxcloudrun.search import get_backend
+
+
+class Command(BaseCommand):
+    """全量重建商品搜索索引"""
+    help = '全量重建商品搜索索引（MySQL 环境重写 product_search_documents）'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        total = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{type(backend).__name__}: 已索引 {total} 个商品'))
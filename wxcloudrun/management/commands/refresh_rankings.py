@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from wxcloudrun.ranking import refresh_rankings
+
+
+class Command(BaseCommand):
+    """重算商品热度排名"""
+    help = '批量计算在售商品的热度得分并整表替换 product_rankings（可配置为定时任务）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批写入的行数')
+
+    def handle(self, *args, **options):
+        total = refresh_rankings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已计算 {total} 个商品的热度排名'))
@@ -0,0 +1,237 @@
+"""云存储文件 ID（cloud://）-> 临时下载地址
+
+商品图片、头像等字段保存的是云存储文件 ID，小程序端原本需要逐个调用 getTempFileURL 换取地址，
+一屏 20 张卡片就是 20 次解析。这里在响应返回前收集响应中全部 cloud:// ID，
+通过一次批量接口调用换取临时地址，结果缓存到临近过期（MAX_AGE - REFRESH_MARGIN 秒）：
+
+- WeChatCloudBackend：云托管开放接口 tcb/batchdownloadfile（生产，环境 ID 取自 CBR_ENV_ID）
+- LocalBackend：按文件路径拼接本地地址，不发起网络请求（开发、测试）
+
+视图集混入 MediaURLMixin 后，GET 请求的成功响应中 settings.MEDIA_RESOLVER['FIELDS'] 列出的字段
+会被替换为临时地址，快速序列化路径与 DRF 路径输出一致。未配置 BACKEND 时原样返回文件 ID；
+解析失败的 ID 同样原样返回，由客户端自行解析。
+
+解析接口变慢或不可用时不拖慢响应：
+
+- 每个响应的解析总耗时不超过 TIME_BUDGET 秒，超时后剩余的 ID 原样返回
+- 解析失败的 ID 在 NEGATIVE_TTL 秒内不再请求
+- 连续 FAILURE_THRESHOLD 次调用失败后熔断 COOLDOWN 秒，期间只使用缓存，之后放行一次调用试探
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+logger = logging.getLogger('log')
+
+FILE_ID_PREFIX = 'cloud://'
+
+
+def _config():
+    config = {
+        'BACKEND': '',
+        'OPTIONS': {},
+        'CACHE_ALIAS': 'default',
+        'MAX_AGE': 7200,
+        'REFRESH_MARGIN': 300,
+        'TIME_BUDGET': 2,
+        'NEGATIVE_TTL': 60,
+        'FAILURE_THRESHOLD': 3,
+        'COOLDOWN': 30,
+        'FIELDS': [],
+    }
+    config.update(getattr(settings, 'MEDIA_RESOLVER', {}))
+    return config
+
+
+def is_file_id(value):
+    return isinstance(value, str) and value.startswith(FILE_ID_PREFIX)
+
+
+class WeChatCloudBackend:
+    """微信云托管开放接口批量换取临时下载地址（需在云托管控制台开启开放接口服务，免 access_token）"""
+    url = 'http://api.weixin.qq.com/tcb/batchdownloadfile'
+
+    def __init__(self, env=None, batch_size=50, timeout=3):
+        self.env = env or os.environ.get('CBR_ENV_ID', '')
+        self.batch_size = batch_size  # 接口单次最多 50 个文件
+        self.timeout = timeout
+
+    def _env(self, file_id):
+        # cloud://<环境 ID>.<存储桶>/路径
+        return self.env or file_id[len(FILE_ID_PREFIX):].split('.', 1)[0]
+
+    def resolve(self, file_ids, max_age, deadline=None):
+        """返回 {文件 ID: 临时地址}，单个文件失败时地址为 None；到达 deadline（time.monotonic()）后
+        不再发起请求，剩余的 ID 不包含在结果中"""
+        urls = {}
+        for start in range(0, len(file_ids), self.batch_size):
+            timeout = self.timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    logger.warning('media.resolve.budget_exceeded skipped=%s', len(file_ids) - start)
+                    break
+            batch = file_ids[start:start + self.batch_size]
+            response = requests.post(self.url, json={
+                'env': self._env(batch[0]),
+                'file_list': [{'fileid': file_id, 'max_age': max_age} for file_id in batch],
+            }, timeout=timeout)
+            response.raise_for_status()
+            result = response.json()
+            if result.get('errcode'):
+                raise RuntimeError(f"batchdownloadfile errcode={result['errcode']} errmsg={result.get('errmsg')}")
+            for item in result.get('file_list', []):
+                if item.get('status') == 0 and item.get('download_url'):
+                    urls[item['fileid']] = item['download_url']
+                else:
+                    urls[item.get('fileid')] = None
+                    logger.warning('media.resolve.failed fileid=%s errmsg=%s', item.get('fileid'), item.get('errmsg'))
+        return urls
+
+
+class LocalBackend:
+    """把 cloud://<环境>.<存储桶>/路径 映射为 base_url + 路径，用于开发和测试"""
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url if base_url is not None else settings.MEDIA_URL
+        self.calls = 0  # 批量调用次数
+
+    def resolve(self, file_ids, max_age, deadline=None):
+        self.calls += 1
+        urls = {}
+        for file_id in file_ids:
+            _, _, path = file_id[len(FILE_ID_PREFIX):].partition('/')
+            urls[file_id] = f'{self.base_url.rstrip("/")}/{path}?max_age={max_age}' if path else None
+        return urls
+
+
+class MediaResolver:
+    """带缓存的批量解析：失败的 ID 短期缓存为“解析失败”，后端连续失败时熔断"""
+    key_prefix = 'media_url:'
+    # 解析失败的缓存值（地址缓存中不会出现空字符串）
+    FAILED = ''
+
+    def __init__(self, backend, cache_alias='default', max_age=7200, refresh_margin=300,
+                 time_budget=2, negative_ttl=60, failure_threshold=3, cooldown=30):
+        self.backend = backend
+        self.cache = caches[cache_alias]
+        self.max_age = max_age
+        # 地址在过期前 refresh_margin 秒内不再使用，避免客户端拿到即将失效的地址
+        self.cache_timeout = max(max_age - refresh_margin, 0)
+        self.time_budget = time_budget
+        self.negative_ttl = negative_ttl
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0
+        self._lock = threading.Lock()
+
+    def _key(self, file_id):
+        return self.key_prefix + hashlib.md5(file_id.encode('utf-8')).hexdigest()
+
+    def _allow(self):
+        """熔断期间不调用后端；熔断到期后只放行一个调用试探"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._open_until:
+                return False
+            if self._failures >= self.failure_threshold:
+                self._open_until = now + self.cooldown
+            return True
+
+    def _record(self, success):
+        with self._lock:
+            if success:
+                self._failures, self._open_until = 0, 0
+            else:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._open_until = time.monotonic() + self.cooldown
+                    logger.warning('media.resolve.circuit_open failures=%s cooldown=%s', self._failures, self.cooldown)
+
+    def resolve(self, file_ids):
+        """返回 {文件 ID: 临时地址}，未能解析的 ID 不包含在结果中"""
+        file_ids = list(dict.fromkeys(file_ids))
+        if not file_ids:
+            return {}
+        keys = {file_id: self._key(file_id) for file_id in file_ids}
+        cached = self.cache.get_many(list(keys.values()))
+        urls = {file_id: cached[key] for file_id, key in keys.items() if key in cached}
+        missing = [file_id for file_id in file_ids if file_id not in urls]
+        if missing and self._allow():
+            try:
+                resolved = self.backend.resolve(missing, self.max_age, time.monotonic() + self.time_budget)
+            except Exception:
+                logger.exception('media.resolve.error count=%s', len(missing))
+                self._record(success=False)
+                resolved = dict.fromkeys(missing)
+            else:
+                self._record(success=True)
+            # 后端返回的 fileid 可能与请求的写法不同（如大小写、参数），只采用请求过的 ID
+            found = {file_id: url for file_id, url in resolved.items() if url and file_id in keys}
+            if found and self.cache_timeout:
+                self.cache.set_many({keys[file_id]: url for file_id, url in found.items()}, self.cache_timeout)
+            failed = [file_id for file_id, url in resolved.items() if not url and file_id in keys]
+            if failed and self.negative_ttl:
+                self.cache.set_many({keys[file_id]: self.FAILED for file_id in failed}, self.negative_ttl)
+            urls.update(found)
+        return {file_id: url for file_id, url in urls.items() if url != self.FAILED}
+
+
+@lru_cache(maxsize=None)
+def get_resolver():
+    """未配置 BACKEND 时返回 None"""
+    config = _config()
+    if not config['BACKEND']:
+        return None
+    backend = import_string(config['BACKEND'])(**config['OPTIONS'])
+    return MediaResolver(backend, config['CACHE_ALIAS'], config['MAX_AGE'], config['REFRESH_MARGIN'],
+                         config['TIME_BUDGET'], config['NEGATIVE_TTL'], config['FAILURE_THRESHOLD'], config['COOLDOWN'])
+
+
+def _walk(data, fields, found):
+    """收集 data 中 fields 字段的文件 ID，返回 [(容器, 键)] 供原地替换"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key in fields and is_file_id(value):
+                found.append((data, key))
+            elif isinstance(value, (dict, list)):
+                _walk(value, fields, found)
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, (dict, list)):
+                _walk(item, fields, found)
+    return found
+
+
+def resolve_urls(data):
+    """把响应数据中的文件 ID 原地替换为临时地址（一次批量解析），返回 data"""
+    resolver = get_resolver()
+    if resolver is None:
+        return data
+    found = _walk(data, set(_config()['FIELDS']), [])
+    if not found:
+        return data
+    urls = resolver.resolve([container[key] for container, key in found])
+    for container, key in found:
+        container[key] = urls.get(container[key], container[key])
+    return data
+
+
+class MediaURLMixin:
+    """视图集 GET 请求的成功响应中，文件 ID 替换为临时地址"""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (request.method == 'GET' and isinstance(response, Response)
+                and response.status_code == 200 and response.data is not None):
+            resolve_urls(response.data)
+        return super().finalize_response(request, response, *args, **kwargs)
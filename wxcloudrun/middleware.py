@@ -1,8 +1,12 @@
 # wxcloudrun/middleware.py
+import logging
+
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth import login
-from .models import User
+from .user_cache import resolve_user
+
+logger = logging.getLogger('log')
 
 
 class CloudbaseAuthMiddleware(MiddlewareMixin):
@@ -25,33 +29,18 @@ class CloudbaseAuthMiddleware(MiddlewareMixin):
         # 从请求头获取 openid（云开发自动注入）
         openid = request.headers.get('X-WX-OPENID') or request.headers.get('X-Wx-Openid')
         
-        # 调试日志
-        print(f"CloudbaseAuthMiddleware.process_view: openid={openid}")
-        print(f"CloudbaseAuthMiddleware.process_view: path={request.path}")
-        print(f"CloudbaseAuthMiddleware.process_view: headers={dict(request.headers)}")
+        # 调试日志（仅 DEBUG 级别开启时才序列化请求头）
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('auth.request path=%s openid=%s headers=%s', request.path, openid, dict(request.headers))
         
         if openid:
-            try:
-                # 根据 openid 获取用户
-                user = User.objects.get(wechat_openid=openid)
-                print(f"CloudbaseAuthMiddleware.process_view: 找到已存在用户 user={user.username}")
-            except User.DoesNotExist:
-                # 用户不存在，自动创建新用户
-                print(f"CloudbaseAuthMiddleware.process_view: 用户不存在，自动创建 openid={openid}")
-                
-                # 获取 unionid（可能为空）
-                unionid = request.headers.get('X-WX-UNIONID') or request.headers.get('X-Wx-Unionid', '')
-                if not unionid:
-                    unionid = None  # 转换为 None 避免唯一约束冲突
-                
-                # 创建新用户
-                user = User.objects.create(
-                    username=f'wx_{openid[:10]}',  # 使用 openid 前10位作为用户名
-                    wechat_openid=openid,
-                    wechat_unionid=unionid,
-                    nickname=f'用户{openid[:6]}',  # 默认昵称
-                )
-                print(f"CloudbaseAuthMiddleware.process_view: 新用户创建成功 user={user.username}")
+            # 获取 unionid（可能为空）
+            unionid = request.headers.get('X-WX-UNIONID') or request.headers.get('X-Wx-Unionid', '')
+            if not unionid:
+                unionid = None  # 转换为 None 避免唯一约束冲突
+            
+            # 根据 openid 获取用户（优先读缓存），用户不存在时自动创建
+            user = resolve_user(openid, unionid)
             
             # 重要：必须设置 backend 属性才能被 Django 认为是已认证用户
             user.backend = 'django.contrib.auth.backends.ModelBackend'
@@ -59,9 +48,9 @@ class CloudbaseAuthMiddleware(MiddlewareMixin):
             # 覆盖 request.user
             request.user = user
             
-            print(f"CloudbaseAuthMiddleware.process_view: 用户认证成功 user={user.username}, is_authenticated={user.is_authenticated}")
+            logger.debug('auth.success path=%s user=%s', request.path, user.username)
         else:
             # 没有 openid
-            print(f"CloudbaseAuthMiddleware.process_view: 没有 openid，user={request.user}, is_authenticated={request.user.is_authenticated}")
+            logger.debug('auth.anonymous path=%s', request.path)
         
         return None  # 继续处理请求
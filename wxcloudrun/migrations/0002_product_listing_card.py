@@ -0,0 +1,59 @@
+# Generated by Django 3.2.8 on 2026-10-17 03:07
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def backfill_listing_cards(apps, schema_editor):
+    """为已有商品计算卡片字段，逻辑与 Product.build_listing_cards 相同（迁移中只能使用历史模型）"""
+    Product = apps.get_model('wxcloudrun', 'Product')
+    ProductImage = apps.get_model('wxcloudrun', 'ProductImage')
+    ProductGeneTag = apps.get_model('wxcloudrun', 'ProductGeneTag')
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        batch = product_ids[start:start + BATCH_SIZE]
+        covers = {}
+        images = ProductImage.objects.filter(product_id__in=batch).order_by('product_id', 'sort_order', 'id')
+        for product_id, image_url in images.values_list('product_id', 'image_url'):
+            covers.setdefault(product_id, image_url)
+        summaries = defaultdict(list)
+        links = ProductGeneTag.objects.filter(product_id__in=batch).select_related('gene_tag__species').order_by('id')
+        for link in links:
+            tag = link.gene_tag
+            summaries[link.product_id].append({
+                'id': tag.id,
+                'name': tag.name,
+                'species': tag.species_id,
+                'species_name': tag.species.name,
+                'description': tag.description,
+                'color': tag.color,
+                'sort_order': tag.sort_order,
+            })
+        Product.objects.bulk_update(
+            [Product(pk=pid, cover_image=covers.get(pid, ''), tag_summary=summaries.get(pid, [])) for pid in batch],
+            ['cover_image', 'tag_summary'], batch_size=BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxcloudrun', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='cover_image',
+            field=models.CharField(blank=True, default='', max_length=500, verbose_name='封面图片'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='tag_summary',
+            field=models.JSONField(blank=True, default=list, verbose_name='基因标签摘要'),
+        ),
+        migrations.RunPython(backfill_listing_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.8 on 2026-10-17 03:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_search_documents(apps, schema_editor):
+    """为已有商品生成搜索文档（只有 MySQL 后端读取该表），内容与 search.build_document 一致"""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    Product = apps.get_model('wxcloudrun', 'Product')
+    ProductSearchDocument = apps.get_model('wxcloudrun', 'ProductSearchDocument')
+    batch = []
+    for product in Product.objects.select_related('species').order_by('id').iterator(chunk_size=500):
+        species = product.species
+        content = '\n'.join([
+            product.title,
+            species.name if species else '',
+            (species.scientific_name or '') if species else '',
+            product.morph or '',
+            ' '.join(tag['name'] for tag in product.tag_summary or []),
+            product.description or '',
+        ])
+        batch.append(ProductSearchDocument(product_id=product.id, content=content))
+        if len(batch) >= 500:
+            ProductSearchDocument.objects.bulk_create(batch)
+            batch = []
+    ProductSearchDocument.objects.bulk_create(batch)
+
+
+def add_fulltext_index(apps, schema_editor):
+    # FULLTEXT + ngram 只在 MySQL 上可用，SQLite 开发环境使用进程内索引
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE product_search_documents '
+            'ADD FULLTEXT INDEX ft_product_search_content (content) WITH PARSER ngram'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE product_search_documents DROP INDEX ft_product_search_content')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxcloudrun', '0003_browse_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='wxcloudrun.product', verbose_name='产品')),
+                ('content', models.TextField(verbose_name='搜索文本')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '商品搜索文档',
+                'verbose_name_plural': '商品搜索文档',
+                'db_table': 'product_search_documents',
+            },
+        ),
+        # 先写入数据再建全文索引，比逐行维护索引快
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.8 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxcloudrun', '0004_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RealtimeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room', models.CharField(max_length=100, verbose_name='房间')),
+                ('origin', models.CharField(max_length=64, verbose_name='发布进程')),
+                ('payload', models.JSONField(verbose_name='事件内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '实时推送事件',
+                'verbose_name_plural': '实时推送事件',
+                'db_table': 'realtime_events',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.8 on 2026-10-17 03:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxcloudrun', '0005_realtime_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.IntegerField(default=0, verbose_name='未读数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wxcloudrun.chatmessage', verbose_name='最后一条消息')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_states', to='wxcloudrun.order', verbose_name='订单')),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='对方')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_states', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '会话状态',
+                'verbose_name_plural': '会话状态',
+                'db_table': 'conversation_states',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='conversationstate',
+            index=models.Index(fields=['user', 'last_message'], name='idx_conv_user_last'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conversationstate',
+            unique_together={('order', 'user')},
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.8 on 2026-10-17 03:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxcloudrun', '0006_conversation_states'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='wxcloudrun.product', verbose_name='产品')),
+                ('score', models.FloatField(verbose_name='综合得分')),
+                ('view_score', models.FloatField(default=0, verbose_name='浏览得分')),
+                ('recency_score', models.FloatField(default=0, verbose_name='新鲜度得分')),
+                ('chat_score', models.FloatField(default=0, verbose_name='咨询热度得分')),
+                ('seller_score', models.FloatField(default=0, verbose_name='卖家成交率得分')),
+                ('computed_at', models.DateTimeField(verbose_name='计算时间')),
+            ],
+            options={
+                'verbose_name': '商品热度排名',
+                'verbose_name_plural': '商品热度排名',
+                'db_table': 'product_rankings',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productranking',
+            index=models.Index(fields=['score'], name='idx_ranking_score'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.8 on 2026-10-17 03:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxcloudrun', '0007_product_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='排名')),
+                ('score', models.FloatField(verbose_name='相似度')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wxcloudrun.product', verbose_name='相似产品')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='wxcloudrun.product', verbose_name='产品')),
+            ],
+            options={
+                'verbose_name': '相似商品',
+                'verbose_name_plural': '相似商品',
+                'db_table': 'product_neighbors',
+                'unique_together': {('product', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.8 on 2026-10-17 04:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxcloudrun', '0009_user_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductNeighborState',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbor_state', serialize=False, to='wxcloudrun.product', verbose_name='产品')),
+                ('computed_at', models.DateTimeField(verbose_name='计算时间')),
+            ],
+            options={
+                'verbose_name': '相似商品计算状态',
+                'verbose_name_plural': '相似商品计算状态',
+                'db_table': 'product_neighbor_states',
+            },
+        ),
+    ]
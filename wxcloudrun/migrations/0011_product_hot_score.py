@@ -0,0 +1,37 @@
+# Generated by Django 3.2.8 on 2026-10-17 04:40
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_hot_scores(apps, schema_editor):
+    """把已有排名的综合得分写入 products.hot_score，上线后不必等下一次重算"""
+    Product = apps.get_model('wxcloudrun', 'Product')
+    ProductRanking = apps.get_model('wxcloudrun', 'ProductRanking')
+    products = [Product(pk=pid, hot_score=score) for pid, score in ProductRanking.objects.values_list('product_id', 'score')]
+    Product.objects.bulk_update(products, ['hot_score'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxcloudrun', '0010_product_neighbor_states'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='productranking',
+            name='idx_ranking_score',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='hot_score',
+            field=models.FloatField(default=-1, verbose_name='热度得分'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', '-hot_score', '-id'], name='idx_product_status_hot'),
+        ),
+        migrations.RunPython(backfill_hot_scores, migrations.RunPython.noop),
+    ]
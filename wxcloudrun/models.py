@@ -1,5 +1,9 @@
+from collections import defaultdict
 from datetime import datetime
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 
@@ -13,7 +17,7 @@ class User(AbstractUser):
     phone = models.CharField(max_length=20, null=True, blank=True, verbose_name='手机号')
     address = models.TextField(null=True, blank=True, verbose_name='地址')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
-    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='更新时间')
 
     class Meta:
         db_table = 'users'
@@ -90,6 +94,18 @@ class GeneTag(models.Model):
     def __str__(self):
         return f"{self.species.name} - {self.name}"
 
+    def to_summary(self):
+        """商品卡片中存储的标签摘要，字段与 GeneTagSerializer 输出一致"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'species': self.species_id,
+            'species_name': self.species.name,
+            'description': self.description,
+            'color': self.color,
+            'sort_order': self.sort_order,
+        }
+
 
 # Product Model
 class Product(models.Model):
@@ -121,6 +137,12 @@ class Product(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available', verbose_name='状态')
     view_count = models.IntegerField(default=0, verbose_name='浏览次数')
     
+    # 列表卡片冗余字段，由 refresh_listing_cards 维护
+    cover_image = models.CharField(max_length=500, blank=True, default='', verbose_name='封面图片')
+    tag_summary = models.JSONField(default=list, blank=True, verbose_name='基因标签摘要')
+    # 热度得分冗余字段，由 ranking.refresh_rankings 与 product_rankings 同步维护，未排名为 -1
+    hot_score = models.FloatField(default=-1, verbose_name='热度得分')
+    
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
 
@@ -129,10 +151,122 @@ class Product(models.Model):
         verbose_name = '产品'
         verbose_name_plural = '产品'
         ordering = ['-created_at']
+        indexes = [
+            # 商品浏览：status 固定过滤，按分类/性别筛选并按发布时间倒序
+            models.Index(fields=['status', '-created_at'], name='idx_product_status_created'),
+            models.Index(fields=['status', 'category', '-created_at'], name='idx_product_status_cat'),
+            models.Index(fields=['status', 'sex', '-created_at'], name='idx_product_status_sex'),
+            models.Index(fields=['status', 'price'], name='idx_product_status_price'),
+            # 热度排序 ?sort=hot（按索引顺序扫描，游标分页按 (-hot_score, -id)）
+            models.Index(fields=['status', '-hot_score', '-id'], name='idx_product_status_hot'),
+            # 我发布的商品
+            models.Index(fields=['seller', 'status'], name='idx_product_seller_status'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def build_listing_cards(cls, product_ids):
+        """根据图片和基因标签表计算卡片字段，返回 {product_id: (cover_image, tag_summary)}"""
+        product_ids = list(product_ids)
+        covers = {}
+        images = ProductImage.objects.filter(product_id__in=product_ids).order_by('product_id', 'sort_order', 'id')
+        for product_id, image_url in images.values_list('product_id', 'image_url'):
+            covers.setdefault(product_id, image_url)
+        summaries = defaultdict(list)
+        product_gene_tags = ProductGeneTag.objects.filter(
+            product_id__in=product_ids
+        ).select_related('gene_tag__species').order_by('id')
+        for pgt in product_gene_tags:
+            summaries[pgt.product_id].append(pgt.gene_tag.to_summary())
+        return {pid: (covers.get(pid, ''), summaries.get(pid, [])) for pid in product_ids}
+
+    @classmethod
+    def refresh_listing_cards(cls, product_ids, batch_size=500):
+        """重新计算并写回指定商品的卡片字段（不触发 updated_at 和 save 信号）"""
+        cards = cls.build_listing_cards(product_ids)
+        products = [
+            cls(pk=pid, cover_image=cover_image, tag_summary=tag_summary)
+            for pid, (cover_image, tag_summary) in cards.items()
+        ]
+        cls.objects.bulk_update(products, ['cover_image', 'tag_summary'], batch_size=batch_size)
+        return len(products)
+
+    def refresh_listing_card(self):
+        """刷新当前商品的卡片字段并同步到实例"""
+        self.cover_image, self.tag_summary = self.build_listing_cards([self.pk])[self.pk]
+        Product.objects.filter(pk=self.pk).update(cover_image=self.cover_image, tag_summary=self.tag_summary)
+
+
+# Product Search Document
+class ProductSearchDocument(models.Model):
+    """商品搜索文档表 - 生产环境在 content 上建立 FULLTEXT(ngram) 索引"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='search_document', verbose_name='产品')
+    content = models.TextField(verbose_name='搜索文本')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'product_search_documents'
+        verbose_name = '商品搜索文档'
+        verbose_name_plural = '商品搜索文档'
+
+    def __str__(self):
+        return f"{self.product_id}"
+
+
+class ProductRanking(models.Model):
+    """商品热度排名物化表 - 由 ranking.refresh_rankings() 定期批量重算，综合得分同步到 Product.hot_score"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='ranking', verbose_name='产品')
+    score = models.FloatField(verbose_name='综合得分')
+    view_score = models.FloatField(default=0, verbose_name='浏览得分')
+    recency_score = models.FloatField(default=0, verbose_name='新鲜度得分')
+    chat_score = models.FloatField(default=0, verbose_name='咨询热度得分')
+    seller_score = models.FloatField(default=0, verbose_name='卖家成交率得分')
+    computed_at = models.DateTimeField(verbose_name='计算时间')
+
+    class Meta:
+        db_table = 'product_rankings'
+        verbose_name = '商品热度排名'
+        verbose_name_plural = '商品热度排名'
+
+    def __str__(self):
+        return f"{self.product_id}: {self.score:.4f}"
+
+
+class ProductNeighbor(models.Model):
+    """相似商品近邻表 - 每个商品按相似度保存前 k 个在售商品，由 neighbors 模块批量/增量计算"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbors', verbose_name='产品')
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name='相似产品')
+    rank = models.PositiveSmallIntegerField(verbose_name='排名')
+    score = models.FloatField(verbose_name='相似度')
+
+    class Meta:
+        db_table = 'product_neighbors'
+        verbose_name = '相似商品'
+        verbose_name_plural = '相似商品'
+        unique_together = [['product', 'rank']]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.neighbor_id}: {self.score:.4f}"
+
+
+class ProductNeighborState(models.Model):
+    """相似商品计算状态表 - 记录商品的近邻已计算过（近邻可能为空，如物种内只有它一个在售商品）"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='neighbor_state', verbose_name='产品')
+    computed_at = models.DateTimeField(verbose_name='计算时间')
+
+    class Meta:
+        db_table = 'product_neighbor_states'
+        verbose_name = '相似商品计算状态'
+        verbose_name_plural = '相似商品计算状态'
+
+    def __str__(self):
+        return f"{self.product_id}: {self.computed_at}"
+
 
 # Product Images
 class ProductImage(models.Model):
@@ -238,6 +372,11 @@ class Order(models.Model):
         verbose_name = '订单'
         verbose_name_plural = '订单'
         ordering = ['-created_at']
+        indexes = [
+            # 我的购买 / 我的销售，以及两者 UNION 后的订单列表
+            models.Index(fields=['buyer', '-created_at'], name='idx_order_buyer_created'),
+            models.Index(fields=['seller', '-created_at'], name='idx_order_seller_created'),
+        ]
 
     def __str__(self):
         return self.order_no
@@ -267,6 +406,131 @@ class ChatMessage(models.Model):
         verbose_name = '聊天消息'
         verbose_name_plural = '聊天消息'
         ordering = ['created_at']
+        indexes = [
+            # 按订单加载聊天记录
+            models.Index(fields=['order', 'created_at'], name='idx_msg_order_created'),
+            # 未读消息统计
+            models.Index(fields=['receiver', 'is_read'], name='idx_msg_receiver_read'),
+        ]
 
     def __str__(self):
         return f"{self.sender.nickname} -> {self.receiver.nickname}"
+
+
+# Conversation State
+class ConversationState(models.Model):
+    """会话状态表 - 每个订单会话的每个参与者一行，在消息写入和标记已读时维护
+
+    消息页的会话列表和未读角标直接读取此表，不再聚合 chat_messages。
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='conversation_states', verbose_name='订单')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_states', verbose_name='用户')
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name='对方')
+    last_message = models.ForeignKey(ChatMessage, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='+', verbose_name='最后一条消息')
+    unread_count = models.IntegerField(default=0, verbose_name='未读数')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'conversation_states'
+        verbose_name = '会话状态'
+        verbose_name_plural = '会话状态'
+        unique_together = [['order', 'user']]
+        indexes = [
+            # 会话列表按最后一条消息倒序
+            models.Index(fields=['user', 'last_message'], name='idx_conv_user_last'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id}:{self.user_id}"
+
+    @classmethod
+    def record_message(cls, message):
+        """新消息写入后更新发送方和接收方的会话状态"""
+        now = timezone.now()
+        sides = [(message.sender_id, message.receiver_id, 0)]
+        if message.receiver_id != message.sender_id:
+            sides.append((message.receiver_id, message.sender_id, 1))
+        for user_id, peer_id, unread in sides:
+            rows = cls.objects.filter(order_id=message.order_id, user_id=user_id)
+            # 并发写入时只保留 ID 更大的消息作为最后一条
+            updated = rows.update(
+                peer_id=peer_id,
+                last_message_id=Greatest(Coalesce('last_message_id', 0), message.pk),
+                unread_count=F('unread_count') + unread,
+                updated_at=now,
+            )
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(order_id=message.order_id, user_id=user_id, peer_id=peer_id,
+                                       last_message_id=message.pk, unread_count=unread)
+            except IntegrityError:
+                rows.update(
+                    last_message_id=Greatest(Coalesce('last_message_id', 0), message.pk),
+                    unread_count=F('unread_count') + unread,
+                    updated_at=now,
+                )
+
+    @classmethod
+    def record_read(cls, user_id, read_counts):
+        """标记已读后扣减未读数，read_counts 为 {order_id: 本次标记的消息数}"""
+        now = timezone.now()
+        for order_id, n in read_counts.items():
+            cls.objects.filter(order_id=order_id, user_id=user_id).update(
+                unread_count=Greatest(F('unread_count') - n, 0), updated_at=now
+            )
+
+    @classmethod
+    def record_delete(cls, order_id, receiver_id, unread):
+        """消息删除后：last_message 被置空的会话改为指向剩余的最后一条消息（没有剩余消息时删除会话），
+        删除的是未读消息时扣减接收方的未读数"""
+        now = timezone.now()
+        if unread:
+            cls.objects.filter(order_id=order_id, user_id=receiver_id).update(
+                unread_count=Greatest(F('unread_count') - 1, 0), updated_at=now
+            )
+        orphaned = cls.objects.filter(order_id=order_id, last_message__isnull=True)
+        if not orphaned.exists():
+            return
+        last_id = ChatMessage.objects.filter(order_id=order_id).order_by('-id').values_list('id', flat=True).first()
+        if last_id is None:
+            orphaned.delete()
+        else:
+            orphaned.update(last_message_id=last_id, updated_at=now)
+
+    @classmethod
+    def rebuild(cls, order_ids):
+        """根据 chat_messages 重新计算指定订单的会话状态，返回写入的行数"""
+        states = {}
+        messages = (ChatMessage.objects.filter(order_id__in=order_ids).order_by('id')
+                    .values_list('id', 'order_id', 'sender_id', 'receiver_id', 'is_read'))
+        for message_id, order_id, sender_id, receiver_id, is_read in messages:
+            for user_id, peer_id in ((sender_id, receiver_id), (receiver_id, sender_id)):
+                state = states.setdefault((order_id, user_id), cls(order_id=order_id, user_id=user_id))
+                state.peer_id = peer_id
+                state.last_message_id = message_id
+            if not is_read and receiver_id != sender_id:
+                states[(order_id, receiver_id)].unread_count += 1
+        with transaction.atomic():
+            cls.objects.filter(order_id__in=order_ids).delete()
+            cls.objects.bulk_create(states.values())
+        return len(states)
+
+
+# Realtime Events
+class RealtimeEvent(models.Model):
+    """实时推送事件表 - 多副本部署时 DatabaseBroker 通过轮询此表在副本间转发事件"""
+    room = models.CharField(max_length=100, verbose_name='房间')
+    origin = models.CharField(max_length=64, verbose_name='发布进程')
+    payload = models.JSONField(verbose_name='事件内容')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间')
+
+    class Meta:
+        db_table = 'realtime_events'
+        verbose_name = '实时推送事件'
+        verbose_name_plural = '实时推送事件'
+
+    def __str__(self):
+        return f"{self.room}#{self.id}"
@@ -0,0 +1,250 @@
+"""相似商品（商品详情页的“相似宠物”，GET /api/products/<id>/similar/）
+
+每个商品表示为一个特征向量：基因标签（多热）、性别（独热）、价格区间（独热，相邻区间
+取一半权重以体现“价格相近”），各部分权重见 settings.NEIGHBORS['WEIGHTS']。只在同物种
+（含都未填物种）的商品之间比较，相似度为向量余弦；每个商品的前 TOP_K 个在售商品写入
+product_neighbors 表，请求时按排名读取。计算过的商品在 product_neighbor_states 表中记一行，
+近邻为空（如物种内只有它一个在售商品）时请求直接返回空列表，不会重复计算。
+
+计算在物种分组内用 numpy 分块做矩阵乘法（每块 BLOCK_SIZE 行对全组），不在请求中逐行比较：
+
+- rebuild()：全量重算，`python manage.py rebuild_neighbors`
+- refresh_products()：增量重算。商品变化后由信号登记，后台每 REFRESH_DELAY 秒批量处理：
+  重算变化商品自身的近邻，并重算与它的相似度达到原有第 k 名（或近邻不足 k 个）的同组商品，
+  以及原来把它列为近邻的商品（它下架、删除或更换物种时）
+- 尚未计算的商品（如刚发布、或已售出的商品详情页）在第一次请求时按需计算
+"""
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Count, Min, Q
+
+from .models import Product, ProductGeneTag, ProductNeighbor, ProductNeighborState
+from .tasks import PeriodicTask
+
+logger = logging.getLogger('log')
+
+SEXES = [value for value, _ in Product.SEX_CHOICES]
+
+
+def _config():
+    config = {
+        'TOP_K': 10,
+        'BLOCK_SIZE': 512,
+        'REFRESH_DELAY': 5,
+        'WEIGHTS': {'gene_tags': 1.0, 'sex': 0.5, 'price': 0.8},
+        'PRICE_BUCKETS': getattr(settings, 'FACETS', {}).get('PRICE_BUCKETS', [100, 300, 500, 1000, 3000]),
+    }
+    config.update(getattr(settings, 'NEIGHBORS', {}))
+    return config
+
+
+class Group:
+    """一个物种分组的商品特征矩阵（行已归一化）"""
+
+    def __init__(self, species_id, source_ids=()):
+        config = _config()
+        # 候选近邻为分组内的在售商品；source_ids 为需要计算近邻但可能已不在售的商品
+        scope = Q(species=species_id, status='available')
+        if source_ids:
+            scope |= Q(id__in=list(source_ids))
+        rows = list(Product.objects.filter(scope).order_by('id').values_list('id', 'status', 'sex', 'price'))
+        tags = list(ProductGeneTag.objects.filter(product__in=Product.objects.filter(scope))
+                    .values_list('product_id', 'gene_tag_id'))
+
+        self.species_id = species_id
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.available = np.array([row[1] == 'available' for row in rows], dtype=bool)
+        self.position = {product_id: index for index, product_id in enumerate(self.ids.tolist())}
+        self.matrix = self._vectors(rows, tags, config)
+
+    def _vectors(self, rows, tags, config):
+        weights, edges = config['WEIGHTS'], config['PRICE_BUCKETS']
+        tag_columns = {tag_id: column for column, tag_id in enumerate(sorted({tag_id for _, tag_id in tags}))}
+        sex_base = len(tag_columns)
+        price_base = sex_base + len(SEXES)
+        matrix = np.zeros((len(rows), price_base + len(edges) + 1))
+        if not rows:
+            return matrix
+        row_index = np.arange(len(rows))
+
+        if tags:
+            matrix[[self.position[product_id] for product_id, _ in tags],
+                   [tag_columns[tag_id] for _, tag_id in tags]] = weights['gene_tags']
+        sexes = np.array([SEXES.index(row[2]) if row[2] in SEXES else SEXES.index('unknown') for row in rows])
+        matrix[row_index, sex_base + sexes] = weights['sex']
+        buckets = np.searchsorted(np.array(edges, dtype=np.float64),
+                                  np.array([float(row[3]) for row in rows]), side='right')
+        for offset, weight in ((-1, 0.5), (1, 0.5), (0, 1.0)):
+            adjacent = buckets + offset
+            valid = (adjacent >= 0) & (adjacent <= len(edges))
+            matrix[row_index[valid], price_base + adjacent[valid]] = weights['price'] * weight
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1)
+
+    def similarity(self, product_ids):
+        """product_ids 与分组内全部在售商品的相似度矩阵（行对应 product_ids，列对应 candidate_ids）"""
+        candidates = np.flatnonzero(self.available)
+        rows = [self.position[product_id] for product_id in product_ids]
+        # 取整到 1e-9，使特征相同的候选得分完全相等（排名按 id 决出），不受矩阵分块方式的浮点误差影响
+        return np.round(self.matrix[rows] @ self.matrix[candidates].T, 9), self.ids[candidates]
+
+    def top_k(self, product_ids, k):
+        """分块计算 product_ids 各自的前 k 个近邻，返回 {product_id: [(neighbor_id, score), ...]}"""
+        block_size = _config()['BLOCK_SIZE']
+        result = {}
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), block_size):
+            block = product_ids[start:start + block_size]
+            scores, candidate_ids = self.similarity(block)
+            scores[candidate_ids[None, :] == np.array(block)[:, None]] = -np.inf  # 排除自身
+            scores[scores <= 0] = -np.inf
+            # 每行第 k 大的相似度；与它相同的候选可能多于名额，再按 id 决出
+            if scores.shape[1] > k:
+                threshold = np.partition(scores, scores.shape[1] - k, axis=1)[:, scores.shape[1] - k]
+            else:
+                threshold = np.full(len(block), -np.inf)
+            for row, product_id in enumerate(block):
+                picked = np.flatnonzero(np.isfinite(scores[row]) & (scores[row] >= threshold[row]))
+                # 相似度倒序，相同时较新的商品在前
+                order = np.lexsort((-candidate_ids[picked], -scores[row, picked]))[:k]
+                result[product_id] = [(int(candidate_ids[picked[i]]), float(scores[row, picked[i]])) for i in order]
+        return result
+
+
+def _rows(neighbors):
+    return [
+        ProductNeighbor(product_id=product_id, neighbor_id=neighbor_id, rank=rank, score=score)
+        for product_id, items in neighbors.items()
+        for rank, (neighbor_id, score) in enumerate(items, start=1)
+    ]
+
+
+def _states(product_ids, now):
+    return [ProductNeighborState(product_id=product_id, computed_at=now) for product_id in product_ids]
+
+
+def _save(neighbors, batch_size=1000):
+    """替换指定商品的近邻行，并记录这些商品已计算"""
+    with transaction.atomic():
+        ProductNeighbor.objects.filter(product_id__in=list(neighbors)).delete()
+        ProductNeighbor.objects.bulk_create(_rows(neighbors), batch_size=batch_size)
+        ProductNeighborState.objects.filter(product_id__in=list(neighbors)).delete()
+        ProductNeighborState.objects.bulk_create(_states(neighbors, timezone.now()), batch_size=batch_size)
+
+
+def rebuild(batch_size=1000):
+    """全量重算所有在售商品的近邻，返回写入的行数"""
+    k = _config()['TOP_K']
+    neighbors = {}
+    species_ids = Product.objects.filter(status='available').order_by().values_list('species_id', flat=True).distinct()
+    for species_id in list(species_ids):
+        group = Group(species_id)
+        neighbors.update(group.top_k(group.ids[group.available].tolist(), k))
+    rows = _rows(neighbors)
+    with transaction.atomic():
+        ProductNeighbor.objects.all().delete()
+        ProductNeighbor.objects.bulk_create(rows, batch_size=batch_size)
+        ProductNeighborState.objects.all().delete()
+        ProductNeighborState.objects.bulk_create(_states(neighbors, timezone.now()), batch_size=batch_size)
+    logger.info('neighbors.rebuilt products=%s rows=%s', len(neighbors), len(rows))
+    return len(rows)
+
+
+def refresh_products(product_ids):
+    """增量重算：product_ids 自身，以及近邻列表可能因它们变化而改变的商品"""
+    k = _config()['TOP_K']
+    product_ids = set(product_ids)
+    current = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'species_id'))
+    # 原来把这些商品列为近邻的商品（下架、删除或更换物种后需要重算）
+    referencing = set(ProductNeighbor.objects.filter(neighbor_id__in=product_ids)
+                      .values_list('product_id', flat=True)) - product_ids
+    groups = defaultdict(set)
+    for product_id, species_id in current.items():
+        groups[species_id].add(product_id)
+    for product_id, species_id in Product.objects.filter(id__in=referencing).values_list('id', 'species_id'):
+        groups[species_id].add(product_id)
+
+    neighbors = {}
+    for species_id, sources in groups.items():
+        group = Group(species_id, sources)
+        changed = [product_id for product_id in product_ids & sources if group.available[group.position[product_id]]]
+        if changed:
+            # 与变化商品的相似度达到原第 k 名，或原近邻不足 k 个的商品
+            scores, candidate_ids = group.similarity(changed)
+            best = dict(zip(candidate_ids.tolist(), scores.max(axis=0).tolist()))
+            kept = {
+                product_id: (count, lowest) for product_id, count, lowest in
+                ProductNeighbor.objects.filter(product_id__in=candidate_ids.tolist())
+                .values_list('product_id').annotate(count=Count('id'), lowest=Min('score')).order_by()
+            }
+            for candidate_id, score in best.items():
+                count, lowest = kept.get(candidate_id, (0, None))
+                if score > 0 and (count < k or score >= lowest - 1e-9):
+                    sources.add(candidate_id)
+        neighbors.update(group.top_k(sources, k))
+
+    # 已删除的商品不在任何分组中，近邻行已随商品级联删除
+    _save(neighbors)
+    return len(neighbors)
+
+
+def similar_ids(product_id, limit=None):
+    """商品的相似在售商品 id（按相似度排序，最多 TOP_K 个），尚未计算时按需计算"""
+    top_k = _config()['TOP_K']
+    limit = min(limit, top_k) if limit else top_k
+    queryset = ProductNeighbor.objects.filter(product_id=product_id).order_by('rank')
+    neighbor_ids = list(queryset.values_list('neighbor_id', flat=True)[:limit])
+    if not neighbor_ids and not ProductNeighborState.objects.filter(product_id=product_id).exists():
+        species_id = Product.objects.filter(pk=product_id).values_list('species_id', flat=True).first()
+        group = Group(species_id, [product_id])
+        if product_id in group.position:
+            _save(group.top_k([product_id], top_k))
+            neighbor_ids = list(queryset.values_list('neighbor_id', flat=True)[:limit])
+    return neighbor_ids
+
+
+class NeighborRefresher:
+    """收集变化的商品，在后台线程中批量增量重算"""
+
+    def __init__(self, delay):
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._task = PeriodicTask('neighbor-refresh', delay, self.flush)
+
+    def mark(self, product_ids):
+        with self._lock:
+            self._pending.update(product_ids)
+        self._task.start()
+
+    def flush(self):
+        with self._lock:
+            product_ids, self._pending = self._pending, set()
+        if not product_ids:
+            return
+        try:
+            refresh_products(product_ids)
+        except Exception:
+            with self._lock:
+                self._pending.update(product_ids)  # 下次重试
+            raise
+
+
+@lru_cache(maxsize=None)
+def get_refresher():
+    return NeighborRefresher(_config()['REFRESH_DELAY'])
+
+
+def mark_changed(product_ids):
+    """商品变化后登记增量重算，失败只记录日志，不影响业务写入"""
+    try:
+        get_refresher().mark(product_ids)
+    except Exception:
+        logger.exception('登记相似商品重算失败 product_ids=%s', list(product_ids))
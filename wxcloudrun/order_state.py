@@ -0,0 +1,91 @@
+"""订单状态机
+
+每个状态转换在一个短事务内完成：先 SELECT ... FOR UPDATE 锁定订单行并校验当前状态，
+再用条件 UPDATE（WHERE status=...）迁移商品状态，最后 save(update_fields=...) 只写变更字段。
+加锁顺序固定为"订单 -> 商品"，并发请求只会排队而不会死锁。
+
+商品状态随订单变化：
+- 支付：available -> reserved，商品已被其他订单预订时支付失败
+- 确认收货：reserved -> sold
+- 取消已支付订单：reserved -> available（未支付订单没有占用商品，不改动商品状态）
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, Product
+from .signals import product_status_changed
+
+
+class OrderStateError(Exception):
+    """状态不允许当前操作，视图返回 400"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def _transition(order, from_states, to_state, changes=None, product_states=None,
+                product_required=False, error='订单状态不正确'):
+    """锁定订单行并执行状态转换
+
+    product_states 为 {订单当前状态: (商品原状态, 商品新状态)}，按订单当前状态条件更新
+    关联商品；product_required 为 True 时商品不处于原状态则整个转换回滚。
+    """
+    changes = dict(changes or {}, status=to_state)
+    with transaction.atomic():
+        current = Order.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+        if current not in from_states:
+            order.status = current
+            raise OrderStateError(error)
+
+        if order.product_id and current in (product_states or {}):
+            product_from, product_to = product_states[current]
+            updated = Product.objects.filter(pk=order.product_id, status=product_from).update(
+                status=product_to, updated_at=timezone.now()
+            )
+            if not updated and product_required:
+                raise OrderStateError('商品已被其他买家预订')
+            if updated:
+                # 条件 UPDATE 不触发 post_save，手动维护分面索引
+                product_status_changed([order.product_id])
+                if Order.product.is_cached(order):
+                    order.product.status = product_to
+
+        for field, value in changes.items():
+            setattr(order, field, value)
+        order.save(update_fields=[*changes, 'updated_at'])
+    return order
+
+
+def pay(order, payment_method='wechat_pay'):
+    """支付：待支付 -> 待发货，同时预订商品"""
+    return _transition(
+        order, ['pending_payment'], 'pending_shipment',
+        {'paid_at': timezone.now(), 'payment_method': payment_method},
+        product_states={'pending_payment': ('available', 'reserved')}, product_required=True,
+    )
+
+
+def ship(order, shipping_company, shipping_no):
+    """发货：待发货 -> 待收货"""
+    return _transition(
+        order, ['pending_shipment'], 'pending_receipt',
+        {'shipping_company': shipping_company, 'shipping_no': shipping_no, 'shipped_at': timezone.now()},
+    )
+
+
+def confirm_receipt(order):
+    """确认收货：待收货 -> 已完成，商品标记为已售"""
+    return _transition(
+        order, ['pending_receipt'], 'completed', {'completed_at': timezone.now()},
+        product_states={'pending_receipt': ('reserved', 'sold')},
+    )
+
+
+def cancel(order):
+    """取消：待支付 / 待发货 -> 已取消，已支付的订单释放商品"""
+    return _transition(
+        order, ['pending_payment', 'pending_shipment'], 'cancelled',
+        product_states={'pending_shipment': ('reserved', 'available')},
+        error='订单状态不允许取消',
+    )
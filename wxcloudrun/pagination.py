@@ -0,0 +1,165 @@
+"""分页
+
+HybridPagination 是默认分页类，支持两种模式：
+
+- page（默认）：PageNumberPagination，返回 count / next / previous / results
+- cursor：基于排序键的游标分页（keyset），例如 (created_at, id)。不执行 COUNT(*)，
+  不使用 OFFSET，翻页期间插入新数据不会造成重复或遗漏。返回 next / next_cursor / results
+
+请求 `?pagination=cursor` 或携带 `cursor` 参数时使用游标模式；视图也可以通过
+`pagination_mode = 'cursor'` 指定默认模式。游标模式要求视图提供 `keyset_ordering`，
+最后一个排序键必须唯一且非空（通常为 id）。可为空的模型字段按 NULLS LAST 排序（升序、降序都排在最后），
+游标中的空值按 `__isnull` 条件翻页，SQLite 和 MySQL 结果一致。
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """游标分页：WHERE (k1, k2) < (v1, v2) ORDER BY k1 DESC, k2 DESC LIMIT n"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def __init__(self, ordering, page_size):
+        self.ordering = list(ordering)
+        self.page_size = page_size
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def _split(term):
+        return (term[1:], True) if term.startswith('-') else (term, False)
+
+    @staticmethod
+    def _item_value(item, name):
+        return item[name] if isinstance(item, dict) else getattr(item, name)
+
+    def encode_cursor(self, item):
+        values = []
+        for term in self.ordering:
+            value = self._item_value(item, self._split(term)[0])
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, model, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            decoded = []
+            for term, value in zip(self.ordering, values):
+                try:
+                    value = model._meta.get_field(self._split(term)[0]).to_python(value)
+                except FieldDoesNotExist:
+                    pass  # 注解字段（如排序分数）保持 JSON 原值
+                decoded.append(value)
+            return decoded
+        except Exception:
+            raise NotFound('无效的游标')
+
+    @staticmethod
+    def _nullable(model, name):
+        try:
+            return model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            return False  # 注解字段（如排序分数）由视图保证非空
+
+    def _order_by(self, model):
+        """可为空的字段显式 NULLS LAST；非空字段保持原样，不影响索引排序"""
+        terms = []
+        for term in self.ordering:
+            name, descending = self._split(term)
+            if not self._nullable(model, name):
+                terms.append(term)
+            elif descending:
+                terms.append(F(name).desc(nulls_last=True))
+            else:
+                terms.append(F(name).asc(nulls_last=True))
+        return terms
+
+    def _after(self, model, values):
+        """构造"排在游标之后"的条件：(k1 > v1) OR (k1 = v1 AND k2 > v2) ...
+
+        空值排在最后：游标值为空时只有同为空的行可能排在之后；游标值非空时空值行都排在之后。
+        """
+        condition = Q()
+        equal = Q()
+        for term, value in zip(self.ordering, values):
+            name, descending = self._split(term)
+            if value is None:
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+            after = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+            if self._nullable(model, name):
+                after |= Q(**{f'{name}__isnull': True})
+            condition |= equal & after
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self._order_by(queryset.model))
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._after(queryset.model, self.decode_cursor(queryset.model, cursor)))
+        rows = list(queryset[:page_size + 1])
+        self.page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(self.page[-1]) if len(rows) > page_size else None
+        return self.page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+
+class HybridPagination(PageNumberPagination):
+    """按请求或视图选择页码分页 / 游标分页"""
+    mode_query_param = 'pagination'
+
+    def get_mode(self, request, view):
+        if getattr(view, 'keyset_ordering', None) is None:
+            return 'page'
+        if KeysetPagination.cursor_query_param in request.query_params:
+            return 'cursor'
+        return request.query_params.get(self.mode_query_param) or getattr(view, 'pagination_mode', 'page')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.get_mode(request, view) == 'cursor':
+            self.keyset = KeysetPagination(view.keyset_ordering, self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
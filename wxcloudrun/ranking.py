@@ -0,0 +1,153 @@
+"""商品热度排名（商品列表 ?sort=hot）
+
+得分由后台批量任务计算后写入 product_rankings 表，综合得分同步写入 products.hot_score，
+请求路径按 (status, hot_score, id) 索引顺序扫描，不关联排名表也不做文件排序：
+
+    score = w_views * 浏览 + w_recency * 新鲜度 + w_chat * 咨询热度 + w_seller * 卖家成交率
+
+- 浏览：log(1 + view_count)，按在售商品中的最大值归一化
+- 新鲜度：按发布时长指数衰减，每 HALF_LIFE_HOURS 小时减半
+- 咨询热度：最近 CHAT_WINDOW_DAYS 天该商品订单下的聊天消息数，log 后归一化
+- 卖家成交率：已完成订单 / 已支付订单，按 SELLER_PRIOR_RATE、SELLER_PRIOR_WEIGHT 平滑，
+  没有成交记录的新卖家取先验值
+
+聚合由数据库 GROUP BY 完成（每类一次查询），得分由 numpy 按列向量化计算，
+整表（及 hot_score）在一个事务内替换。任务通过 `python manage.py refresh_rankings` 执行（可配置为定时任务）；
+RANKING['AUTO_REFRESH'] 开启时，进程收到第一个 sort=hot 请求后立即在后台检查一次，之后定期检查，
+排名超过 INTERVAL 秒（或尚未计算）才重算，多个 worker 之间用数据库锁保证只有一个在重算。
+排名表只包含上次计算时在售的商品，之后新发布的商品在下次计算前排在已排名商品之后（新发布的在前）。
+"""
+import logging
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import ChatMessage, Order, Product, ProductRanking
+from .tasks import PeriodicTask, advisory_lock
+
+logger = logging.getLogger('log')
+
+DEFAULTS = {
+    'INTERVAL': 600,
+    'AUTO_REFRESH': True,
+    'HALF_LIFE_HOURS': 72,
+    'CHAT_WINDOW_DAYS': 7,
+    'SELLER_PRIOR_RATE': 0.8,
+    'SELLER_PRIOR_WEIGHT': 5,
+    'WEIGHTS': {'views': 0.3, 'recency': 0.35, 'chat': 0.2, 'seller': 0.15},
+}
+
+
+def _config():
+    return dict(DEFAULTS, **getattr(settings, 'RANKING', {}))
+
+
+def _gather(keys, pairs):
+    """按 keys 取出 GROUP BY 结果 [(key, value), ...] 中的值，缺失为 0"""
+    result = np.zeros(len(keys))
+    if not pairs:
+        return result
+    group_keys, values = (np.array(column) for column in zip(*pairs))
+    order = np.argsort(group_keys)
+    group_keys, values = group_keys[order], values[order].astype(np.float64)
+    positions = np.minimum(np.searchsorted(group_keys, keys), len(group_keys) - 1)
+    hit = group_keys[positions] == keys
+    result[hit] = values[positions[hit]]
+    return result
+
+
+def _normalize(values):
+    peak = values.max() if len(values) else 0
+    return values / peak if peak > 0 else values
+
+
+def compute_scores(now=None):
+    """计算全部在售商品的得分，返回 {'product_id': 数组, 'score': 数组, 各分项: 数组}"""
+    config = _config()
+    now = now or timezone.now()
+    rows = list(Product.objects.filter(status='available').values_list('id', 'seller_id', 'view_count', 'created_at'))
+    if not rows:
+        return None
+    product_ids, seller_ids, view_counts, created_at = zip(*rows)
+    product_ids = np.array(product_ids, dtype=np.int64)
+    seller_ids = np.array(seller_ids, dtype=np.int64)
+
+    chat_counts = list(
+        ChatMessage.objects.filter(created_at__gte=now - timedelta(days=config['CHAT_WINDOW_DAYS']),
+                                   order__product__status='available')
+        .values_list('order__product_id').annotate(n=Count('id')).order_by()
+    )
+    seller_orders = list(
+        Order.objects.filter(seller_id__in=set(seller_ids.tolist()), paid_at__isnull=False)
+        .values_list('seller_id')
+        .annotate(paid=Count('id'), completed=Count('id', filter=Q(status='completed'))).order_by()
+    )
+
+    views = _normalize(np.log1p(np.array(view_counts, dtype=np.float64)))
+    age_hours = np.maximum(now.timestamp() - np.array([t.timestamp() for t in created_at]), 0) / 3600
+    recency = np.exp2(-age_hours / config['HALF_LIFE_HOURS'])
+    chat = _normalize(np.log1p(_gather(product_ids, chat_counts)))
+    paid = _gather(seller_ids, [(seller_id, paid) for seller_id, paid, _ in seller_orders])
+    completed = _gather(seller_ids, [(seller_id, completed) for seller_id, _, completed in seller_orders])
+    prior_weight = config['SELLER_PRIOR_WEIGHT']
+    seller = (completed + config['SELLER_PRIOR_RATE'] * prior_weight) / (paid + prior_weight)
+
+    weights = config['WEIGHTS']
+    components = {'view_score': views, 'recency_score': recency, 'chat_score': chat, 'seller_score': seller}
+    score = (weights['views'] * views + weights['recency'] * recency
+             + weights['chat'] * chat + weights['seller'] * seller)
+    return dict(components, product_id=product_ids, score=score)
+
+
+def refresh_rankings(batch_size=1000):
+    """重算并整表替换排名，返回写入的商品数"""
+    now = timezone.now()
+    scores = compute_scores(now)
+    rankings = []
+    if scores is not None:
+        columns = ('product_id', 'score', 'view_score', 'recency_score', 'chat_score', 'seller_score')
+        rankings = [
+            ProductRanking(computed_at=now, **dict(zip(columns, values)))
+            for values in zip(*(scores[name].tolist() for name in columns))
+        ]
+    with transaction.atomic():
+        ProductRanking.objects.all().delete()
+        ProductRanking.objects.bulk_create(rankings, batch_size=batch_size)
+        # 同步排序列：下架、售出等不再排名的商品恢复为 -1
+        Product.objects.filter(hot_score__gte=0).update(hot_score=-1)
+        Product.objects.bulk_update(
+            [Product(pk=ranking.product_id, hot_score=ranking.score) for ranking in rankings],
+            ['hot_score'], batch_size=batch_size,
+        )
+    logger.info('ranking.refreshed products=%s', len(rankings))
+    return len(rankings)
+
+
+def refresh_if_stale():
+    """排名超过 INTERVAL 秒（或尚未计算）时重算；持锁检查，多个进程同时到期时只有一个执行"""
+    with advisory_lock('petbao:ranking-refresh') as acquired:
+        if not acquired:
+            return  # 其他进程正在重算
+        latest = ProductRanking.objects.aggregate(latest=Max('computed_at'))['latest']
+        if latest is None or timezone.now() - latest >= timedelta(seconds=_config()['INTERVAL']):
+            refresh_rankings()
+
+
+@lru_cache(maxsize=None)
+def _refresher():
+    return PeriodicTask('ranking-refresh', min(60, _config()['INTERVAL']), refresh_if_stale, initial_delay=0)
+
+
+def hot_products(queryset):
+    """按热度得分排序（products.hot_score，游标分页按 (-hot_score, -id)）
+
+    尚未计算排名的商品得分为 -1（得分均不小于 0），排在已排名商品之后，按发布先后倒序。
+    """
+    if _config()['AUTO_REFRESH']:
+        _refresher().start()
+    return queryset.order_by('-hot_score', '-id')
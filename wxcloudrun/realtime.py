@@ -0,0 +1,278 @@
+"""订单聊天实时推送（WebSocket）
+
+客户端连接 `/ws/orders/<order_id>/chat/`（需以 SERVER_MODE=asgi 运行），服务端推送：
+
+- {"type": "message", "message": {...}}：新消息，字段与 ChatMessageSerializer 相同
+- {"type": "read", "order": 1, "reader": 2, "message_ids": [...]}：已读回执
+
+客户端可发送 {"type": "ping"}（服务端回 pong）和 {"type": "read", "message_ids": [...]}
+（等同 POST /api/messages/mark_as_read/）。身份取自云托管注入的 X-WX-OPENID 请求头，
+只有订单的买家或卖家可以加入房间。发送消息仍使用 POST /api/messages/。
+
+消息分发后端可插拔（settings.REALTIME['BROKER']）：
+
+- InMemoryBroker：进程内发布/订阅，只适用于单进程单副本部署（非 asgi 模式的默认值）
+- DatabaseBroker：事件写入 realtime_events 表，各进程轮询后转发给本进程的连接，
+  适用于多 worker / 多副本部署（asgi 模式的默认值）
+"""
+import asyncio
+import json
+import logging
+import re
+import threading
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Order, RealtimeEvent
+from .tasks import PeriodicTask
+from .user_cache import resolve_user
+
+logger = logging.getLogger('log')
+
+
+def order_room(order_id):
+    return f'order:{order_id}'
+
+
+class Subscription:
+    """一个 WebSocket 连接对某个房间的订阅，事件可从任意线程投递到连接所在的事件循环"""
+    max_pending = 100
+
+    def __init__(self, broker, room):
+        self.broker = broker
+        self.room = room
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # 事件循环已关闭，连接随之结束
+
+    def _put(self, event):
+        if self.queue.qsize() >= self.max_pending:
+            # 客户端读取过慢，丢弃最旧的事件，客户端可通过 HTTP 接口补齐
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """进程内发布/订阅"""
+
+    def __init__(self):
+        self._rooms = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, room):
+        subscription = Subscription(self, room)
+        with self._lock:
+            self._rooms[room].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._rooms.get(subscription.room)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._rooms[subscription.room]
+
+    def rooms(self):
+        with self._lock:
+            return list(self._rooms)
+
+    def publish(self, room, event):
+        self._deliver(room, event)
+
+    def _deliver(self, room, event):
+        with self._lock:
+            subscribers = list(self._rooms.get(room, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+
+class DatabaseBroker(InMemoryBroker):
+    """经由 realtime_events 表在进程/副本之间转发事件
+
+    发布时写一行事件并直接投递给本进程的订阅者；后台线程每 poll_interval 秒查询
+    本进程有订阅者的房间中其他进程发布的事件。查询窗口向前多看 lookback 秒，
+    容忍不同副本之间的提交延迟和时钟偏差；超过 retention 秒的事件由轮询线程定期清理，
+    没有订阅者的进程每发布 cleanup_every 个事件清理一次。
+    """
+    cleanup_every = 1000
+
+    def __init__(self, poll_interval=0.5, lookback=5, retention=300):
+        super().__init__()
+        self.origin = uuid.uuid4().hex
+        self.lookback = timedelta(seconds=lookback)
+        self.retention = timedelta(seconds=retention)
+        self._last_poll = None
+        self._seen = {}
+        self._polls = 0
+        self._published = 0
+        self._poller = PeriodicTask('realtime-poll', poll_interval, self.poll)
+
+    def subscribe(self, room):
+        self._poller.start()
+        return super().subscribe(room)
+
+    def publish(self, room, event):
+        RealtimeEvent.objects.create(room=room, origin=self.origin, payload=event)
+        self._deliver(room, event)
+        self._published += 1
+        if self._published % self.cleanup_every == 0:
+            self.cleanup(timezone.now())
+
+    def poll(self):
+        now = timezone.now()
+        since = self._last_poll - self.lookback if self._last_poll else now
+        self._last_poll = now
+        rooms = self.rooms()
+        if rooms:
+            rows = (RealtimeEvent.objects.filter(created_at__gte=since, room__in=rooms)
+                    .exclude(origin=self.origin).order_by('id').values_list('id', 'room', 'payload'))
+            for event_id, room, payload in rows:
+                if event_id not in self._seen:
+                    self._seen[event_id] = now
+                    self._deliver(room, payload)
+        self._seen = {event_id: seen_at for event_id, seen_at in self._seen.items()
+                      if seen_at >= now - 2 * self.lookback}
+
+        self._polls += 1
+        if self._polls % 600 == 1:
+            self.cleanup(now)
+
+    def cleanup(self, now):
+        RealtimeEvent.objects.filter(created_at__lt=now - self.retention).delete()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    config = getattr(settings, 'REALTIME', {})
+    broker_class = import_string(config.get('BROKER', 'wxcloudrun.realtime.InMemoryBroker'))
+    return broker_class(**config.get('OPTIONS', {}))
+
+
+def publish(room, event):
+    """发布事件；推送失败只记录日志，不影响调用方的业务写入"""
+    try:
+        get_broker().publish(room, event)
+    except Exception:
+        logger.exception('realtime.publish_failed room=%s', room)
+
+
+def publish_message(message):
+    from .serializers import ChatMessageSerializer
+    publish(order_room(message.order_id), {'type': 'message', 'message': ChatMessageSerializer(message).data})
+
+
+# WebSocket 处理
+ROUTE = re.compile(r'^/ws/orders/(?P<order_id>\d+)/chat/$')
+
+# 关闭码：4401 未登录，4403 不是订单参与者，4404 路径不存在
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+
+
+def _db(func):
+    """在线程中执行数据库操作，前后回收失效连接"""
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+@_db
+def _authenticate(openid, unionid, order_id):
+    """返回 (user, 关闭码)，允许加入房间时关闭码为 None"""
+    if not openid:
+        return None, CLOSE_UNAUTHORIZED
+    user = resolve_user(openid, unionid or None)
+    if not Order.objects.filter(Q(buyer=user) | Q(seller=user), pk=order_id).exists():
+        return None, CLOSE_FORBIDDEN
+    return user, None
+
+
+@_db
+def _mark_read(user, message_ids):
+    from .chat import mark_messages_read
+    return mark_messages_read(user, message_ids)
+
+
+async def _send_json(send, data):
+    await send({'type': 'websocket.send', 'text': json.dumps(data, ensure_ascii=False, cls=DjangoJSONEncoder)})
+
+
+async def _handle_client_message(text, user, send):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(data, dict):
+        return
+    if data.get('type') == 'ping':
+        await _send_json(send, {'type': 'pong'})
+    elif data.get('type') == 'read' and isinstance(data.get('message_ids'), list):
+        await _mark_read(user, data['message_ids'])
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI websocket 入口，由 asgi.py 按 scope['type'] 分发"""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    match = ROUTE.match(scope['path'])
+    if not match:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    order_id = int(match.group('order_id'))
+    headers = {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope.get('headers', [])}
+    user, close_code = await _authenticate(headers.get('x-wx-openid'), headers.get('x-wx-unionid'), order_id)
+    if close_code:
+        await send({'type': 'websocket.close', 'code': close_code})
+        return
+
+    await send({'type': 'websocket.accept'})
+    subscription = get_broker().subscribe(order_room(order_id))
+    logger.debug('realtime.connect order=%s user=%s', order_id, user.pk)
+    receiving = asyncio.ensure_future(receive())
+    pushing = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receiving, pushing}, return_when=asyncio.FIRST_COMPLETED)
+            if pushing in done:
+                await _send_json(send, pushing.result())
+                pushing = asyncio.ensure_future(subscription.get())
+            if receiving in done:
+                message = receiving.result()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message.get('text'):
+                    await _handle_client_message(message['text'], user, send)
+                receiving = asyncio.ensure_future(receive())
+    finally:
+        receiving.cancel()
+        pushing.cancel()
+        subscription.close()
+        logger.debug('realtime.disconnect order=%s user=%s', order_id, user.pk)
@@ -0,0 +1,23 @@
+"""JSON 渲染"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """使用 orjson 渲染（未安装时退回 DRF JSONRenderer），输出与 JSONRenderer 的紧凑格式相同
+
+    datetime、Decimal 等非基本类型仍交给 DRF 的 JSONEncoder 处理，保持格式一致。
+    """
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=self.encoder_class().default, option=self.options)
@@ -0,0 +1,103 @@
+"""只读接口的响应缓存
+
+缓存渲染后的 JSON 字节（按视图、动作、URL 参数和查询参数区分），并支持
+ETag / If-None-Match 返回 304。相关模型保存或删除时通过信号递增分组版本号，
+旧缓存随之失效。进程内命中率可通过 cache_stats() 查看，响应头 X-Cache 标明 HIT/MISS。
+
+使用进程内缓存（默认的 LocMemCache）时失效只作用于当前进程，其他进程依赖
+RESPONSE_CACHE['TIMEOUT'] 过期；配置共享缓存后失效对所有进程生效。
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+
+from .renderers import FastJSONRenderer
+
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+_stats_lock = threading.Lock()
+
+
+def _config():
+    return getattr(settings, 'RESPONSE_CACHE', {})
+
+
+def _cache():
+    return caches[_config().get('ALIAS', 'default')]
+
+
+def _record(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def cache_stats():
+    """进程内命中统计"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+
+def _version_key(group):
+    return f'resp_version:{group}'
+
+
+def get_version(group):
+    return _cache().get_or_set(_version_key(group), 1, None)
+
+
+def invalidate(group):
+    """递增分组版本号，使该分组下的所有缓存失效"""
+    cache = _cache()
+    try:
+        cache.incr(_version_key(group))
+    except ValueError:
+        cache.set(_version_key(group), 2, None)
+
+
+class CachedResponseMixin:
+    """为 ReadOnlyModelViewSet 的 list / retrieve 增加响应缓存"""
+    cache_group = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        query = '&'.join(f'{k}={v}' for k, v in sorted(request.query_params.lists()))
+        raw = f'{self.basename}|{self.action}|{sorted(self.kwargs.items())}|{request.get_host()}|{query}'
+        digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+        return f'resp:{self.cache_group}:{get_version(self.cache_group)}:{digest}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = _cache()
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            _record('misses')
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = FastJSONRenderer().render(response.data)
+            entry = (body, '"%s"' % hashlib.md5(body).hexdigest())
+            cache.set(key, entry, _config().get('TIMEOUT', 300))
+            cache_status = 'MISS'
+        else:
+            _record('hits')
+            cache_status = 'HIT'
+
+        body, etag = entry
+        if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            _record('not_modified')
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['X-Cache'] = cache_status
+        return response
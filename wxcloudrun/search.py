@@ -0,0 +1,341 @@
+"""商品全文搜索
+
+搜索覆盖标题、描述、物种名、学名、品系和基因标签名，ProductViewSet 的 `search` 参数
+通过 search_products() 调用当前后端：
+
+- MySQLFullTextBackend：生产环境，product_search_documents.content 上的
+  FULLTEXT 索引（ngram 解析器，支持中文）
+- InMemorySearchBackend：开发环境（SQLite），进程内倒排索引 + BM25 排序
+
+两个后端的匹配规则一致：查询按空白拆分为词，所有词都必须命中（AND），每个词须在文档中
+连续出现（不区分大小写的子串匹配，如 `trem` 命中 Tremper、`纹守` 命中 豹纹守宫）。
+结果按相关度倒序、同分按发布时间倒序，两者的相关度算法不同（MySQL 内置评分 / BM25），
+具体分值不可比较。
+
+列表的其他筛选条件（状态、分类等）在截取结果之前生效：MySQL 后端在同一条 SQL 中过滤和排序，
+进程内后端按相关度分批过滤，最多返回 SEARCH_MAX_RESULTS 个满足条件的商品。
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Product, ProductSearchDocument
+from .tasks import PeriodicTask
+
+logger = logging.getLogger('log')
+
+CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+TOKEN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+')
+
+# 各字段的权重，标题命中最重要
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'species': 2.0,
+    'scientific_name': 2.0,
+    'morph': 2.0,
+    'gene_tags': 2.0,
+    'description': 1.0,
+}
+
+
+def tokenize(text):
+    """分词：中文切成二元组（与 MySQL ngram_token_size=2 一致），英文数字按单词小写"""
+    tokens = []
+    for chunk in TOKEN_RE.findall((text or '').lower()):
+        if CJK_RE.match(chunk) and len(chunk) > 1:
+            tokens.extend(chunk[i:i + 2] for i in range(len(chunk) - 1))
+        else:
+            tokens.append(chunk)
+    return tokens
+
+
+def build_document(product):
+    """提取商品的可搜索字段，需要 select_related('species')"""
+    species = product.species
+    return {
+        'title': product.title,
+        'species': species.name if species else '',
+        'scientific_name': (species.scientific_name or '') if species else '',
+        'morph': product.morph or '',
+        'gene_tags': ' '.join(tag['name'] for tag in product.tag_summary or []),
+        'description': product.description or '',
+    }
+
+
+def document_content(document):
+    """MySQL 全文索引的文档内容（各字段按行拼接）"""
+    return '\n'.join(document.values())
+
+
+class BaseSearchBackend:
+    """搜索后端基类"""
+
+    def search(self, query, limit=None):
+        """返回按相关度倒序的 [(product_id, score), ...]，limit 为空时返回全部命中"""
+        raise NotImplementedError
+
+    def filter_queryset(self, queryset, query, limit):
+        """在 queryset 上应用搜索并按相关度排序
+
+        默认实现按相关度分批取出命中的商品 id，用 queryset 的条件过滤，
+        凑满 limit 个为止，因此其他筛选条件在截取之前生效。
+        """
+        ranked = [product_id for product_id, _ in self.search(query)]
+        ids = []
+        for start in range(0, len(ranked), limit):
+            batch = ranked[start:start + limit]
+            allowed = set(queryset.filter(id__in=batch).order_by().values_list('id', flat=True))
+            ids.extend(product_id for product_id in batch if product_id in allowed)
+            if len(ids) >= limit:
+                break
+        if not ids:
+            return queryset.none()
+        ids = ids[:limit]
+        rank = Case(*[When(id=product_id, then=pos) for pos, product_id in enumerate(ids)], output_field=IntegerField())
+        return queryset.filter(id__in=ids).annotate(search_rank=rank).order_by('search_rank', '-created_at')
+
+    def index_products(self, product_ids):
+        """增量更新指定商品的索引（商品不存在时视为删除）"""
+        raise NotImplementedError
+
+    def remove_products(self, product_ids):
+        raise NotImplementedError
+
+    def rebuild(self):
+        """全量重建索引，返回索引的商品数"""
+        raise NotImplementedError
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """MySQL FULLTEXT（WITH PARSER ngram）后端"""
+
+    @staticmethod
+    def _against(query):
+        # BOOLEAN MODE 下 "+"短语"" 在 ngram 解析器中即要求连续匹配，等价于子串搜索
+        words = [w for w in query.split() if w]
+        return ' '.join('+"{}"'.format(w.replace('"', ' ')) for w in words)
+
+    def search(self, query, limit=None):
+        against = self._against(query)
+        if not against:
+            return []
+        table = ProductSearchDocument._meta.db_table
+        sql = (f'SELECT product_id, MATCH(content) AGAINST (%s IN BOOLEAN MODE) AS score '
+               f'FROM {table} WHERE MATCH(content) AGAINST (%s IN BOOLEAN MODE) ORDER BY score DESC')
+        params = [against, against]
+        if limit:
+            sql += ' LIMIT %s'
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return list(cursor.fetchall())
+
+    def filter_queryset(self, queryset, query, limit):
+        """全文匹配与列表的其他条件在同一条 SQL 中执行，由分页截取，不受 limit 限制"""
+        against = self._against(query)
+        if not against:
+            return queryset.none()
+        table = ProductSearchDocument._meta.db_table
+        matched = RawSQL(f'SELECT product_id FROM {table} WHERE MATCH(content) AGAINST (%s IN BOOLEAN MODE)', [against])
+        score = RawSQL(
+            f'SELECT MATCH(content) AGAINST (%s IN BOOLEAN MODE) FROM {table} '
+            f'WHERE {table}.product_id = {Product._meta.db_table}.id',
+            [against], output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matched).annotate(search_score=score).order_by('-search_score', '-created_at')
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        products = Product.objects.filter(id__in=product_ids).select_related('species')
+        found = set()
+        for product in products:
+            found.add(product.id)
+            content = document_content(build_document(product))
+            ProductSearchDocument.objects.update_or_create(product_id=product.id, defaults={'content': content})
+        self.remove_products(set(product_ids) - found)
+
+    def remove_products(self, product_ids):
+        if product_ids:
+            ProductSearchDocument.objects.filter(product_id__in=list(product_ids)).delete()
+
+    def rebuild(self, batch_size=500):
+        ProductSearchDocument.objects.all().delete()
+        total = 0
+        queryset = Product.objects.select_related('species').order_by('id')
+        batch = []
+        for product in queryset.iterator(chunk_size=batch_size):
+            batch.append(ProductSearchDocument(product_id=product.id, content=document_content(build_document(product))))
+            if len(batch) >= batch_size:
+                total += len(ProductSearchDocument.objects.bulk_create(batch))
+                batch = []
+        total += len(ProductSearchDocument.objects.bulk_create(batch))
+        return total
+
+
+class _InvertedIndex:
+    """进程内倒排索引的数据，全量重建时整体替换"""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)  # term -> {product_id: 加权词频}
+        self.doc_terms = {}  # product_id -> 该文档包含的 term 集合
+        self.doc_len = {}  # product_id -> 加权文档长度
+        self.texts = {}  # product_id -> 小写全文，用于子串校验
+        self.total_len = 0.0
+        self.vocabulary = None  # 排序后的词表，用于英文子串匹配
+
+    def add(self, product):
+        document = build_document(product)
+        term_weights = defaultdict(float)
+        for field, text in document.items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                term_weights[token] += weight
+        for term, weight in term_weights.items():
+            self.postings[term][product.id] = weight
+        self.doc_terms[product.id] = set(term_weights)
+        self.texts[product.id] = document_content(document).lower()
+        length = sum(term_weights.values())
+        self.doc_len[product.id] = length
+        self.total_len += length
+        self.vocabulary = None
+
+    def remove(self, product_id):
+        for term in self.doc_terms.pop(product_id, ()):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.texts.pop(product_id, None)
+        self.total_len -= self.doc_len.pop(product_id, 0.0)
+        self.vocabulary = None
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """进程内倒排索引后端（开发环境）
+
+    首次搜索时从商品表全量加载，之后由信号增量维护。多进程部署时其他进程的写入
+    不可见，因此由后台线程每隔 SEARCH_INDEX_MAX_AGE 秒全量重建（不占用请求）。
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age if max_age is not None else getattr(settings, 'SEARCH_INDEX_MAX_AGE', 300)
+        self._lock = threading.RLock()
+        self._index = _InvertedIndex()
+        self._built_at = None
+        self._changed_during_rebuild = None  # 全量重建期间收到的增量更新，重建完成后补上
+        self._refresher = PeriodicTask('search-index-rebuild', self.max_age, self.rebuild)
+
+    def _ensure_built(self):
+        if self._built_at is None:
+            with self._lock:
+                if self._built_at is None:
+                    self.rebuild()
+        self._refresher.start()
+
+    def rebuild(self):
+        with self._lock:
+            self._changed_during_rebuild = set()
+        index = _InvertedIndex()
+        try:
+            for product in Product.objects.select_related('species').order_by('id').iterator():
+                index.add(product)
+        finally:
+            with self._lock:
+                changed, self._changed_during_rebuild = self._changed_during_rebuild, None
+        with self._lock:
+            self._index = index
+            self._built_at = time.monotonic()
+        if changed:
+            self.index_products(changed)
+        return len(index.doc_len)
+
+    def index_products(self, product_ids):
+        product_ids = set(product_ids)
+        with self._lock:
+            if self._changed_during_rebuild is not None:
+                self._changed_during_rebuild.update(product_ids)
+            if self._built_at is None:
+                return  # 尚未加载，首次搜索时会全量构建
+        products = list(Product.objects.filter(id__in=product_ids).select_related('species'))
+        with self._lock:
+            for product_id in product_ids:
+                self._index.remove(product_id)
+            for product in products:
+                self._index.add(product)
+
+    def remove_products(self, product_ids):
+        with self._lock:
+            if self._changed_during_rebuild is not None:
+                self._changed_during_rebuild.update(product_ids)
+            for product_id in product_ids:
+                self._index.remove(product_id)
+
+    def _expand(self, index, token):
+        """匹配 token 的索引词：英文/数字按子串匹配词表，单个汉字匹配包含它的二元组"""
+        if index.vocabulary is None:
+            index.vocabulary = sorted(index.postings)
+        if CJK_RE.match(token) and len(token) > 1:
+            return [token] if token in index.postings else []
+        return [term for term in index.vocabulary if token in term]
+
+    def search(self, query, limit=None):
+        self._ensure_built()
+        words = query.lower().split()
+        with self._lock:
+            index = self._index
+            doc_count = len(index.doc_len)
+            if not doc_count:
+                return []
+            avg_len = index.total_len / doc_count
+            scores = None
+            for token in set(tokenize(query)):
+                token_scores = defaultdict(float)
+                for term in self._expand(index, token):
+                    postings = index.postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for product_id, tf in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * index.doc_len[product_id] / avg_len)
+                        token_scores[product_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    # 所有词都必须命中
+                    scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+                if not scores:
+                    return []
+            # 与 MySQL 短语匹配一致：每个词须在文档中连续出现（二元组各自命中不代表整词出现）
+            scores = {pid: score for pid, score in (scores or {}).items()
+                      if all(word in index.texts[pid] for word in words)}
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit] if limit else ranked
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+def search_products(queryset, query):
+    """在 queryset 上应用全文搜索并按相关度排序（queryset 的筛选条件在截取结果之前生效）"""
+    return get_backend().filter_queryset(queryset, query, getattr(settings, 'SEARCH_MAX_RESULTS', 1000))
+
+
+def index_products(product_ids):
+    """商品变化后更新搜索索引，失败只记录日志，不影响业务写入"""
+    try:
+        get_backend().index_products(product_ids)
+    except Exception:
+        logger.exception('更新搜索索引失败 product_ids=%s', list(product_ids))
@@ -1,8 +1,17 @@
+import logging
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import (
     User, ProductCategory, Product, ProductImage, ProductVideo,
-    Order, ChatMessage, GeneTag, ProductGeneTag, Species
+    Order, ChatMessage, GeneTag, ProductGeneTag, Species, ConversationState
 )
+from .order_no import next_order_no
+from .signals import batch_product_sync
+
+logger = logging.getLogger('log')
 
 
 class SpeciesSerializer(serializers.ModelSerializer):
@@ -21,6 +30,69 @@ class GeneTagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'species', 'species_name', 'description', 'color', 'sort_order']
 
 
+class SparseFieldsetMixin:
+    """可按请求裁剪输出字段的序列化器（?fields= / ?expand=）
+
+    Meta.expandable_fields 中的字段默认不输出，需通过 expand（或 fields）显式请求；
+    Meta.field_columns 声明输出字段读取的模型列（默认与字段同名，嵌套序列化器写类本身），
+    project() 据此把字段选择下推为 select_related + only()。
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = set(self.select_fields() if fields is None else fields)
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+
+    @classmethod
+    def select_fields(cls, fields=None, expand=None):
+        """按 fields / expand 参数计算输出字段（保持声明顺序），含未知字段时抛出 ValidationError"""
+        expandable = getattr(cls.Meta, 'expandable_fields', ())
+        errors = {}
+        unknown = [name for name in fields or () if name not in cls.Meta.fields]
+        if unknown:
+            errors['fields'] = f'未知字段: {unknown}'
+        unknown = [name for name in expand or () if name not in expandable]
+        if unknown:
+            errors['expand'] = f'不可展开的字段: {unknown}'
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        requested = set(fields or ()) | set(expand or ())
+        return [name for name in cls.Meta.fields
+                if name in requested or (fields is None and name not in expandable)]
+
+    @classmethod
+    def columns(cls, selected, prefix=''):
+        """输出字段所读取的模型列（only() 的参数）"""
+        mapping = getattr(cls.Meta, 'field_columns', {})
+        columns = [f'{prefix}id']
+        for name in selected:
+            source = mapping.get(name, name)
+            if isinstance(source, type):
+                columns.append(f'{prefix}{name}')
+                columns.extend(source.columns(source.select_fields(), prefix=f'{prefix}{name}__'))
+            else:
+                columns.append(f'{prefix}{source}')
+        return list(dict.fromkeys(columns))
+
+    @classmethod
+    def project(cls, queryset, selected, extra=()):
+        """只查询输出字段需要的关联和列；extra 为序列化之外还要读取的列（如游标分页的排序键）"""
+        extra = [column for column in extra if column not in queryset.query.annotations]
+        columns = cls.columns(selected) + [column for column in extra if column not in selected]
+        relations = [column.rsplit('__', 1)[0] for column in columns if '__' in column]
+        return queryset.select_related(None).select_related(*dict.fromkeys(relations)).only(*columns)
+
+
+class UserBriefSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """用户简要信息（列表中展开卖家/买家时使用）"""
+    class Meta:
+        model = User
+        fields = ['id', 'nickname', 'avatar']
+
+
 class UserSerializer(serializers.ModelSerializer):
     """用户序列化器"""
     class Meta:
@@ -51,31 +123,60 @@ class ProductVideoSerializer(serializers.ModelSerializer):
         fields = ['id', 'video_url', 'thumbnail_url', 'sort_order']
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+def product_prefetches(prefix=''):
+    """商品图片与基因标签的 Prefetch 对象（按展示顺序排序）"""
+    return [
+        Prefetch(f'{prefix}images', queryset=ProductImage.objects.order_by('sort_order', 'id')),
+        Prefetch(f'{prefix}gene_tags',
+                 queryset=ProductGeneTag.objects.select_related('gene_tag__species').order_by('id')),
+    ]
+
+
+class ProductListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """产品列表序列化器（简略信息）"""
     seller_name = serializers.CharField(source='seller.nickname', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     species_name = serializers.CharField(source='species.name', read_only=True)
     first_image = serializers.SerializerMethodField()
     gene_tags = serializers.SerializerMethodField()
+    seller = UserBriefSerializer(read_only=True)
     
     class Meta:
         model = Product
         fields = ['id', 'title', 'species', 'species_name', 'morph', 'age', 'sex', 'price', 'status', 
                   'seller_name', 'category_name', 'first_image', 'gene_tags', 'view_count',
-                  'created_at']
+                  'created_at', 'description', 'seller']
+        # 描述是大文本列，列表默认不查询
+        expandable_fields = ['description', 'seller']
+        field_columns = {
+            'species_name': 'species__name',
+            'seller_name': 'seller__nickname',
+            'category_name': 'category__name',
+            'first_image': 'cover_image',
+            'gene_tags': 'tag_summary',
+            'seller': UserBriefSerializer,
+        }
     
+    @staticmethod
+    def setup_eager_loading(queryset, prefix=''):
+        """预加载列表所需的关联数据，使查询次数与分页大小无关
+
+        封面和标签读取商品表上的冗余字段，只需 JOIN 卖家、分类和物种；
+        prefix 用于从其他模型（如订单）经外键加载商品，例如 'product__'
+        """
+        return queryset.select_related(
+            f'{prefix}seller', f'{prefix}category', f'{prefix}species'
+        )
+
     def get_first_image(self, obj):
-        first_image = obj.images.first()
-        return first_image.image_url if first_image else None
+        return obj.cover_image or None
     
     def get_gene_tags(self, obj):
-        """获取商品的基因标签"""
-        product_gene_tags = obj.gene_tags.select_related('gene_tag').all()
-        return GeneTagSerializer([pgt.gene_tag for pgt in product_gene_tags], many=True).data
+        """获取商品的基因标签（冗余摘要）"""
+        return obj.tag_summary
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """产品详情序列化器（完整信息）"""
     seller = UserSerializer(read_only=True)
     category = ProductCategorySerializer(read_only=True)
@@ -91,10 +192,22 @@ class ProductDetailSerializer(serializers.ModelSerializer):
                   'images', 'videos', 'gene_tags', 'view_count', 'created_at', 'updated_at']
         read_only_fields = ['id', 'seller', 'view_count', 'created_at', 'updated_at']
     
+    @classmethod
+    def setup_eager_loading(cls, queryset, selected=None):
+        """预加载详情所需的关联数据；selected 为输出字段时只加载这些字段用到的部分"""
+        selected = set(cls.Meta.fields if selected is None else selected)
+        relations = {'seller': 'seller', 'category': 'category', 'species_info': 'species'}
+        queryset = queryset.select_related(*(relation for name, relation in relations.items() if name in selected))
+        prefetches = [prefetch for prefetch in product_prefetches() if prefetch.prefetch_through in selected]
+        if 'videos' in selected:
+            prefetches.append('videos')
+        if 'description' not in selected:
+            queryset = queryset.defer('description')
+        return queryset.prefetch_related(*prefetches)
+
     def get_gene_tags(self, obj):
         """获取商品的基因标签"""
-        product_gene_tags = obj.gene_tags.select_related('gene_tag').all()
-        return GeneTagSerializer([pgt.gene_tag for pgt in product_gene_tags], many=True).data
+        return GeneTagSerializer([pgt.gene_tag for pgt in obj.gene_tags.all()], many=True).data
 
 
 class ProductCreateSerializer(serializers.ModelSerializer):
@@ -121,6 +234,22 @@ class ProductCreateSerializer(serializers.ModelSerializer):
         fields = ['title', 'description', 'species', 'morph', 'age', 'sex', 
                   'price', 'category', 'images', 'videos', 'gene_tag_ids']
     
+    def validate(self, attrs):
+        """一次查询校验基因标签：必须存在、已启用且属于商品的物种"""
+        gene_tag_ids = attrs.get('gene_tag_ids')
+        if gene_tag_ids:
+            gene_tag_ids = list(dict.fromkeys(gene_tag_ids))  # 去重并保持顺序
+            species = attrs['species'] if 'species' in attrs else getattr(self.instance, 'species', None)
+            valid_ids = set(GeneTag.objects.filter(
+                id__in=gene_tag_ids, is_active=True, species=species
+            ).values_list('id', flat=True))
+            invalid_ids = [tag_id for tag_id in gene_tag_ids if tag_id not in valid_ids]
+            if invalid_ids:
+                raise serializers.ValidationError({'gene_tag_ids': f'基因标签不存在或不适用于该物种: {invalid_ids}'})
+            attrs['gene_tag_ids'] = gene_tag_ids
+        return attrs
+    
+    @transaction.atomic
     def create(self, validated_data):
         images_data = validated_data.pop('images', [])
         videos_data = validated_data.pop('videos', [])
@@ -129,101 +258,126 @@ class ProductCreateSerializer(serializers.ModelSerializer):
         # Create product
         product = Product.objects.create(**validated_data)
         
-        # Create images
-        for idx, image_url in enumerate(images_data):
-            ProductImage.objects.create(
-                product=product,
-                image_url=image_url,
-                sort_order=idx
-            )
-        
-        # Create videos
-        for idx, video_url in enumerate(videos_data):
-            ProductVideo.objects.create(
-                product=product,
-                video_url=video_url,
-                sort_order=idx
-            )
-        
-        # Create gene tag associations
-        for tag_id in gene_tag_ids:
-            try:
-                gene_tag = GeneTag.objects.get(id=tag_id, is_active=True)
-                ProductGeneTag.objects.create(product=product, gene_tag=gene_tag)
-            except GeneTag.DoesNotExist:
-                pass  # 忽略不存在的标签
+        with batch_product_sync():
+            # 每张子表一次 bulk_create
+            ProductImage.objects.bulk_create([
+                ProductImage(product=product, image_url=url, sort_order=idx)
+                for idx, url in enumerate(images_data)
+            ])
+            ProductVideo.objects.bulk_create([
+                ProductVideo(product=product, video_url=url, sort_order=idx)
+                for idx, url in enumerate(videos_data)
+            ])
+            ProductGeneTag.objects.bulk_create([
+                ProductGeneTag(product=product, gene_tag_id=tag_id) for tag_id in gene_tag_ids
+            ])
         
+        # 搜索索引由 Product 的 post_save 信号在事务提交后更新，此时子表已全部写入
+        product.refresh_listing_card()
         return product
     
+    @transaction.atomic
     def update(self, instance, validated_data):
         images_data = validated_data.pop('images', None)
         videos_data = validated_data.pop('videos', None)
         gene_tag_ids = validated_data.pop('gene_tag_ids', None)
+        if gene_tag_ids is None and 'species' in validated_data and validated_data['species'] != instance.species:
+            # 只更换物种时，去掉不属于新物种的基因标签
+            gene_tag_ids = list(instance.gene_tags.filter(
+                gene_tag__species=validated_data['species']
+            ).values_list('gene_tag_id', flat=True))
         
         # Update basic fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
         
-        # Update images if provided
-        if images_data is not None:
-            # Delete old images
-            instance.images.all().delete()
-            # Create new images
-            for idx, image_url in enumerate(images_data):
-                ProductImage.objects.create(
-                    product=instance,
-                    image_url=image_url,
-                    sort_order=idx
-                )
-        
-        # Update videos if provided
-        if videos_data is not None:
-            # Delete old videos
-            instance.videos.all().delete()
-            # Create new videos
-            for idx, video_url in enumerate(videos_data):
-                ProductVideo.objects.create(
-                    product=instance,
-                    video_url=video_url,
-                    sort_order=idx
-                )
-        
-        # Update gene tags if provided
-        if gene_tag_ids is not None:
-            # Delete old associations
-            instance.gene_tags.all().delete()
-            # Create new associations
-            for tag_id in gene_tag_ids:
-                try:
-                    gene_tag = GeneTag.objects.get(id=tag_id, is_active=True)
-                    ProductGeneTag.objects.create(product=instance, gene_tag=gene_tag)
-                except GeneTag.DoesNotExist:
-                    pass  # 忽略不存在的标签
+        with batch_product_sync():
+            if images_data is not None:
+                self._sync_ordered_media(instance.images.all(), ProductImage, 'image_url', instance, images_data)
+            if videos_data is not None:
+                self._sync_ordered_media(instance.videos.all(), ProductVideo, 'video_url', instance, videos_data)
+            if gene_tag_ids is not None:
+                self._sync_gene_tags(instance, gene_tag_ids)
         
+        if images_data is not None or gene_tag_ids is not None:
+            instance.refresh_listing_card()
         return instance
+    
+    @staticmethod
+    def _sync_ordered_media(existing, model, url_field, product, urls):
+        """按 URL 对比新旧列表，只删除移除的、新增缺少的、调整顺序变化的行"""
+        by_url = defaultdict(list)
+        for row in existing:
+            by_url[getattr(row, url_field)].append(row)
+        to_create, to_update = [], []
+        for idx, url in enumerate(urls):
+            if by_url.get(url):
+                row = by_url[url].pop(0)
+                if row.sort_order != idx:
+                    row.sort_order = idx
+                    to_update.append(row)
+            else:
+                to_create.append(model(product=product, sort_order=idx, **{url_field: url}))
+        removed_ids = [row.id for rows in by_url.values() for row in rows]
+        if removed_ids:
+            model.objects.filter(id__in=removed_ids).delete()
+        if to_update:
+            model.objects.bulk_update(to_update, ['sort_order'])
+        if to_create:
+            model.objects.bulk_create(to_create)
+    
+    @staticmethod
+    def _sync_gene_tags(product, gene_tag_ids):
+        """基因标签关联按集合差异增删"""
+        existing_ids = set(product.gene_tags.values_list('gene_tag_id', flat=True))
+        removed_ids = existing_ids - set(gene_tag_ids)
+        if removed_ids:
+            product.gene_tags.filter(gene_tag_id__in=removed_ids).delete()
+        ProductGeneTag.objects.bulk_create([
+            ProductGeneTag(product=product, gene_tag_id=tag_id)
+            for tag_id in gene_tag_ids if tag_id not in existing_ids
+        ])
 
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """订单列表序列化器"""
     buyer_name = serializers.CharField(source='buyer.nickname', read_only=True)
     seller_name = serializers.CharField(source='seller.nickname', read_only=True)
     product_title = serializers.CharField(source='product.title', read_only=True)
     product_image = serializers.SerializerMethodField()
+    buyer = UserBriefSerializer(read_only=True)
+    seller = UserBriefSerializer(read_only=True)
+    product = ProductListSerializer(read_only=True)
     
     class Meta:
         model = Order
         fields = ['id', 'order_no', 'buyer_name', 'seller_name', 'product_title',
-                  'product_image', 'total_amount', 'status', 'created_at']
+                  'product_image', 'total_amount', 'status', 'created_at',
+                  'buyer', 'seller', 'product']
+        expandable_fields = ['buyer', 'seller', 'product']
+        field_columns = {
+            'buyer_name': 'buyer__nickname',
+            'seller_name': 'seller__nickname',
+            'product_title': 'product__title',
+            'product_image': 'product__cover_image',
+            'buyer': UserBriefSerializer,
+            'seller': UserBriefSerializer,
+            'product': ProductListSerializer,
+        }
     
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """预加载订单列表所需的买卖双方和商品"""
+        return queryset.select_related('buyer', 'seller', 'product')
+
     def get_product_image(self, obj):
         if obj.product:
-            first_image = obj.product.images.first()
-            return first_image.image_url if first_image else None
+            return obj.product.cover_image or None
         return None
 
 
-class OrderDetailSerializer(serializers.ModelSerializer):
+class OrderDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """订单详情序列化器"""
     buyer = UserSerializer(read_only=True)
     seller = UserSerializer(read_only=True)
@@ -237,6 +391,16 @@ class OrderDetailSerializer(serializers.ModelSerializer):
                   'paid_at', 'completed_at', 'buyer_note', 'seller_note',
                   'created_at', 'updated_at']
 
+    @classmethod
+    def setup_eager_loading(cls, queryset, selected=None):
+        """预加载详情所需的买卖双方和商品；selected 为输出字段时只加载这些字段用到的关联"""
+        selected = set(cls.Meta.fields if selected is None else selected)
+        queryset = queryset.select_related(*(name for name in ('buyer', 'seller') if name in selected))
+        if 'product' in selected:
+            # 内嵌商品列表序列化器，需要同样的商品预加载
+            queryset = ProductListSerializer.setup_eager_loading(queryset, prefix='product__')
+        return queryset
+
 
 class OrderCreateSerializer(serializers.ModelSerializer):
     """订单创建序列化器"""
@@ -244,22 +408,32 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['product', 'receiver_name', 'receiver_phone', 'receiver_address', 'buyer_note']
     
+    def validate_product(self, value):
+        # 已预订、已售或下架的商品不能再下单；并发下单由支付时的条件更新兜底
+        if value.status != 'available':
+            raise serializers.ValidationError('商品已售出或已被预订')
+        return value
+    
+    # 订单号唯一约束冲突（多副本 worker id 碰撞）时的重试次数
+    order_no_attempts = 3
+    
     def create(self, validated_data):
         product = validated_data['product']
         
-        # Generate order number
-        import time
-        order_no = f"PB{int(time.time() * 1000)}"
-        
-        # Create order
-        order = Order.objects.create(
-            order_no=order_no,
-            seller=product.seller,
-            total_amount=product.price,
-            **validated_data
-        )
-        
-        return order
+        for attempt in range(self.order_no_attempts):
+            try:
+                # 保存点内插入，冲突时只回滚本次插入
+                with transaction.atomic():
+                    return Order.objects.create(
+                        order_no=next_order_no(),
+                        seller=product.seller,
+                        total_amount=product.price,
+                        **validated_data
+                    )
+            except IntegrityError:
+                if attempt == self.order_no_attempts - 1:
+                    raise
+                logger.warning('order.order_no_conflict attempt=%s', attempt + 1)
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
@@ -272,3 +446,41 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'sender', 'sender_name', 'sender_avatar',
                   'receiver', 'message_type', 'content', 'is_read', 'created_at']
         read_only_fields = ['id', 'sender', 'created_at']
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    """会话摘要序列化器（消息页会话列表）"""
+    order_no = serializers.CharField(source='order.order_no', read_only=True)
+    order_status = serializers.CharField(source='order.status', read_only=True)
+    product_title = serializers.CharField(source='order.product.title', read_only=True, default=None)
+    product_image = serializers.SerializerMethodField()
+    peer_name = serializers.CharField(source='peer.nickname', read_only=True)
+    peer_avatar = serializers.CharField(source='peer.avatar', read_only=True)
+    last_message = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ConversationState
+        fields = ['order', 'order_no', 'order_status', 'product_title', 'product_image',
+                  'peer', 'peer_name', 'peer_avatar', 'last_message', 'unread_count', 'updated_at']
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """预加载订单、商品、对方用户和最后一条消息"""
+        return queryset.select_related('order__product', 'peer', 'last_message')
+    
+    def get_product_image(self, obj):
+        if obj.order.product:
+            return obj.order.product.cover_image or None
+        return None
+    
+    def get_last_message(self, obj):
+        message = obj.last_message
+        if message is None:
+            return None
+        return {
+            'id': message.id,
+            'sender': message.sender_id,
+            'message_type': message.message_type,
+            'content': message.content,
+            'created_at': serializers.DateTimeField().to_representation(message.created_at),
+        }
@@ -76,15 +76,29 @@ if MYSQL_ADDRESS:
     # 生产环境使用 MySQL
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.mysql',
+            # 在 Django MySQL 后端基础上增加连接健康检查和可选连接池
+            'ENGINE': 'wxcloudrun.db.mysql',
             'NAME': os.environ.get("MYSQL_DATABASE", 'petbaodb'),
             'USER': os.environ.get("MYSQL_USERNAME", 'root'),
             'HOST': MYSQL_ADDRESS.split(':')[0],
             'PORT': MYSQL_ADDRESS.split(':')[1],
             'PASSWORD': os.environ.get("MYSQL_PASSWORD"),
             'OPTIONS': {'charset': 'utf8mb4'},
+            # 持久连接：同一线程在 CONN_MAX_AGE 秒内复用连接，复用前先 ping
+            'CONN_MAX_AGE': int(os.environ.get('MYSQL_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
         }
     }
+    # 连接池：MYSQL_POOL_SIZE > 0 时进程内所有线程共享有界连接池，请求结束时归还连接
+    MYSQL_POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE', '0'))
+    if MYSQL_POOL_SIZE > 0:
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['POOL'] = {
+            'MAX_SIZE': MYSQL_POOL_SIZE,
+            'TIMEOUT': int(os.environ.get('MYSQL_POOL_TIMEOUT', '30')),
+            'RECYCLE': int(os.environ.get('MYSQL_POOL_RECYCLE', '3600')),
+            'PRE_PING': True,
+        }
 else:
     # 开发环境使用 SQLite
     DATABASES = {
@@ -94,6 +108,43 @@ else:
         }
     }
 
+# 商品搜索后端：生产环境使用 MySQL FULLTEXT(ngram)，开发环境使用进程内倒排索引
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or (
+    'wxcloudrun.search.MySQLFullTextBackend' if MYSQL_ADDRESS else 'wxcloudrun.search.InMemorySearchBackend'
+)
+SEARCH_MAX_RESULTS = 1000  # 进程内后端单次搜索最多返回的商品数（MySQL 后端由分页截取，不受限制）
+SEARCH_INDEX_MAX_AGE = 300  # 进程内索引在后台每隔该秒数全量重建，用于同步其他进程的写入
+
+# 商品浏览页分面计数（进程内位图索引，见 wxcloudrun/facets.py）
+FACETS = {
+    'MAX_AGE': 300,  # 索引的最长使用时间（秒），超时后全量重建，用于同步其他进程的写入
+    'PRICE_BUCKETS': [100, 300, 500, 1000, 3000],  # 价格区间分界（元）
+}
+
+# 商品热度排名（?sort=hot，见 wxcloudrun/ranking.py）
+RANKING = {
+    'INTERVAL': 600,  # 排名重算间隔（秒）
+    'AUTO_REFRESH': True,  # 收到 sort=hot 请求后在进程内定期检查并重算；使用定时任务执行 refresh_rankings 时可关闭
+    'HALF_LIFE_HOURS': 72,  # 新鲜度半衰期（小时）
+    'CHAT_WINDOW_DAYS': 7,  # 咨询热度统计的聊天消息时间窗口（天）
+    'SELLER_PRIOR_RATE': 0.8,  # 卖家成交率先验值
+    'SELLER_PRIOR_WEIGHT': 5,  # 先验值相当于的订单数
+    'WEIGHTS': {'views': 0.3, 'recency': 0.35, 'chat': 0.2, 'seller': 0.15},
+}
+
+# 基因标签 -> 商品倒排索引（gene_tags / any_tags 过滤，见 wxcloudrun/tag_index.py）
+GENE_TAG_INDEX = {
+    'MAX_AGE': 300,  # 索引的最长使用时间（秒），超时后全量重建
+}
+
+# 相似商品（/api/products/<id>/similar/，见 wxcloudrun/neighbors.py）
+NEIGHBORS = {
+    'TOP_K': 10,  # 每个商品保存的近邻数，也是 ?limit= 的上限
+    'BLOCK_SIZE': 512,  # 批量计算时每次矩阵乘法的行数
+    'REFRESH_DELAY': 5,  # 商品变化后增量重算的批处理间隔（秒）
+    'WEIGHTS': {'gene_tags': 1.0, 'sex': 0.5, 'price': 0.8},  # 各部分特征的权重
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -126,6 +177,12 @@ LOGGING = {
     },
     # 过滤
     'filters': {
+        # 低级别日志采样，LOG_SAMPLE_RATE=0.1 表示只保留 10% 的 INFO/DEBUG 日志
+        'sample': {
+            '()': 'wxcloudrun.logging_utils.SamplingFilter',
+            'rate': float(os.environ.get('LOG_SAMPLE_RATE', '1.0')),
+            'max_level': 'INFO',
+        },
     },
     # 定义具体处理日志的方式
     'handlers': {
@@ -165,19 +222,30 @@ LOGGING = {
             'formatter': 'standard',
             'encoding': 'utf-8',  # 设置默认编码
         },
+        # 队列转发：请求线程只入队，由后台线程写文件和控制台（名称需排在被引用的 handler 之后）
+        'queue_django': {
+            '()': 'wxcloudrun.logging_utils.QueueListenerHandler',
+            'handlers': ['cfg://handlers.default', 'cfg://handlers.console'],
+        },
+        'queue_log': {
+            '()': 'wxcloudrun.logging_utils.QueueListenerHandler',
+            'handlers': ['cfg://handlers.error', 'cfg://handlers.info', 'cfg://handlers.console',
+                         'cfg://handlers.default'],
+            'filters': ['sample'],
+        },
     },
     # 配置用哪几种 handlers 来处理日志
     'loggers': {
         # 类型 为 django 处理所有类型的日志， 默认调用
         'django': {
-            'handlers': ['default', 'console'],
+            'handlers': ['queue_django'],
             'level': 'INFO',
             'propagate': False
         },
-        # log 调用时需要当作参数传入
+        # log 调用时需要当作参数传入，LOG_LEVEL=DEBUG 可打开逐请求的认证调试日志
         'log': {
-            'handlers': ['error', 'info', 'console', 'default'],
-            'level': 'INFO',
+            'handlers': ['queue_log'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
             'propagate': True
         },
     }
@@ -225,10 +293,12 @@ REST_FRAMEWORK = {
         # 默认允许所有访问，在各个 ViewSet 中单独控制权限
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # 默认页码分页，?pagination=cursor 切换为游标分页（见 wxcloudrun/pagination.py）
+    'DEFAULT_PAGINATION_CLASS': 'wxcloudrun.pagination.HybridPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # 与 JSONRenderer 输出相同，安装 orjson 时渲染更快
+        'wxcloudrun.renderers.FastJSONRenderer',
     ],
 }
 
@@ -241,6 +311,81 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# 云托管认证用户缓存（openid -> User）
+# 进程内缓存每 CHECK_INTERVAL 秒按 users.updated_at 检查其他 worker / 副本的资料更新；
+# 配置了共享缓存时可将 BACKEND 改为 'wxcloudrun.user_cache.DjangoCacheBackend'，OPTIONS 为 {'alias': 'default'}，
+# CHECK_INTERVAL 设为 0
+AUTH_USER_CACHE = {
+    'BACKEND': 'wxcloudrun.user_cache.LocMemLRUBackend',
+    'TIMEOUT': 300,
+    'CHECK_INTERVAL': 2,
+    'OPTIONS': {'max_entries': 10000},
+}
+
+# 商品浏览次数缓冲计数，每 FLUSH_INTERVAL 秒批量写入数据库
+# 多进程共享时可将 STORE 改为 'wxcloudrun.view_counter.CacheCounterStore'，OPTIONS 为 {'alias': 'default'}
+VIEW_COUNTER = {
+    'STORE': 'wxcloudrun.view_counter.LocalCounterStore',
+    'FLUSH_INTERVAL': 10,
+    'OPTIONS': {},
+}
+
+# 分类/物种/基因标签等只读接口的响应缓存，ALIAS 指向 CACHES 中的缓存
+RESPONSE_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# 聊天实时推送（WebSocket，需 SERVER_MODE=asgi）
+# asgi 模式默认使用 DatabaseBroker（gunicorn 默认多个 worker，云托管也可能多副本），只有单个 worker
+# 且单副本时才可改用 'wxcloudrun.realtime.InMemoryBroker'；其他模式不接受 WebSocket 连接，使用进程内分发。
+# OPTIONS 可设置 poll_interval（秒）、lookback（秒）、retention（秒）
+REALTIME = {
+    'BROKER': os.environ.get('REALTIME_BROKER') or (
+        'wxcloudrun.realtime.DatabaseBroker' if os.environ.get('SERVER_MODE') == 'asgi'
+        else 'wxcloudrun.realtime.InMemoryBroker'
+    ),
+    'OPTIONS': {},
+}
+
+# 聊天长轮询（WSGI 模式 GET /api/messages/?order=&since_id=&wait=，ASGI 模式 GET /api/async/messages/?...）
+# MAX_WAIT 单次最长等待秒数；MAX_WAITERS 每个进程同时等待的同步请求数上限（每个等待占用一个 worker 线程）；
+# MAX_ASYNC_WAITERS 每个进程同时等待的异步请求数上限（在事件循环中等待，不占线程）；
+# RECHECK_INTERVAL 等待期间重新查询数据库的间隔，用于发现其他进程写入的消息
+CHAT_LONG_POLL = {
+    'MAX_WAIT': 25,
+    'MAX_WAITERS': 2,
+    'MAX_ASYNC_WAITERS': 1000,
+    'RECHECK_INTERVAL': 2,
+}
+
+# /readyz/ 是否返回数据库连接池和响应缓存统计（接口无需认证，仅在内网排查时开启）
+READYZ_EXPOSE_STATS = os.environ.get('READYZ_EXPOSE_STATS', '') == '1'
+
+# 商品列表、订单列表、基因标签列表使用 values() + 预编译取值函数序列化（见 fast_serializers.py），
+# 关闭后退回 DRF 序列化器
+FAST_SERIALIZERS = True
+
+# 云存储文件 ID（cloud://）批量换取临时下载地址（见 wxcloudrun/media.py）
+# 云托管环境（注入了 CBR_ENV_ID）默认使用开放接口，其他环境不解析，原样返回文件 ID；
+# 开发时可将 BACKEND 设为 'wxcloudrun.media.LocalBackend'，OPTIONS 可设置 base_url
+MEDIA_RESOLVER = {
+    'BACKEND': os.environ.get('MEDIA_RESOLVER_BACKEND') or (
+        'wxcloudrun.media.WeChatCloudBackend' if os.environ.get('CBR_ENV_ID') else ''
+    ),
+    'OPTIONS': {},
+    'CACHE_ALIAS': 'default',  # 缓存解析结果的 CACHES 别名，多副本共享时指向共享缓存
+    'MAX_AGE': 7200,  # 临时地址有效期（秒）
+    'REFRESH_MARGIN': 300,  # 距过期不足该秒数的地址不再使用，重新解析
+    'TIME_BUDGET': 2,  # 每个响应解析的总耗时上限（秒），超时后剩余的文件 ID 原样返回
+    'NEGATIVE_TTL': 60,  # 解析失败的文件 ID 在该秒数内不再请求
+    'FAILURE_THRESHOLD': 3,  # 连续失败该次数后熔断
+    'COOLDOWN': 30,  # 熔断时长（秒），期间只使用缓存
+    # 需要解析的响应字段
+    'FIELDS': ['first_image', 'image_url', 'video_url', 'thumbnail_url', 'avatar',
+               'product_image', 'sender_avatar', 'peer_avatar'],
+}
+
 # WeChat Mini Program Settings
 WECHAT_APPID = os.environ.get('WECHAT_APPID', '')
 WECHAT_SECRET = os.environ.get('WECHAT_SECRET', '')
@@ -0,0 +1,151 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import facets, neighbors, realtime, response_cache, search, tag_index
+from .models import (
+    Product, ProductCategory, ProductImage, ProductGeneTag, ProductNeighbor, GeneTag, Species, ChatMessage,
+    ConversationState
+)
+
+# 参与搜索索引的商品字段，仅更新其他字段（如 view_count）时不重建索引
+SEARCH_FIELDS = {'title', 'description', 'species', 'morph'}
+# 参与分面统计的商品字段
+FACET_FIELDS = {'status', 'category', 'species', 'sex', 'price', 'morph'}
+
+
+_local = threading.local()
+
+
+@contextmanager
+def batch_product_sync():
+    """批量写入商品图片/标签期间跳过逐行信号，由调用方结束后统一刷新卡片和索引"""
+    _local.suspended = getattr(_local, 'suspended', 0) + 1
+    try:
+        yield
+    finally:
+        _local.suspended -= 1
+
+
+def _sync_suspended():
+    return getattr(_local, 'suspended', 0) > 0
+
+
+def product_changed(product_ids):
+    """商品内容变化后的派生数据维护（搜索索引、分面索引、基因标签索引、相似商品），在事务提交后执行"""
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: search.index_products(product_ids))
+        transaction.on_commit(lambda: facets.update_products(product_ids))
+        transaction.on_commit(lambda: tag_index.update_products(product_ids))
+        transaction.on_commit(lambda: neighbors.mark_changed(product_ids))
+
+
+def product_status_changed(product_ids):
+    """只有状态等分面字段变化（含 queryset.update()，不触发 post_save）时只维护分面索引和相似商品"""
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: facets.update_products(product_ids))
+        transaction.on_commit(lambda: neighbors.mark_changed(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def sync_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS.intersection(update_fields):
+        product_changed([instance.pk])
+    elif FACET_FIELDS.intersection(update_fields):
+        product_status_changed([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def refresh_neighbors_of_deleted(sender, instance, **kwargs):
+    """近邻行随商品级联删除，删除前记下把它列为近邻的商品，提交后为它们补足近邻"""
+    product_ids = set(ProductNeighbor.objects.filter(neighbor_id=instance.pk).values_list('product_id', flat=True))
+    product_ids.discard(instance.pk)
+    if product_ids:
+        transaction.on_commit(lambda: neighbors.mark_changed(product_ids))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: search.get_backend().remove_products([product_id]))
+    transaction.on_commit(lambda: facets.remove_products([product_id]))
+    transaction.on_commit(lambda: tag_index.remove_products([product_id]))
+
+
+# 商品卡片冗余字段同步
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def sync_listing_card(sender, instance, **kwargs):
+    """图片变化时刷新所属商品的封面"""
+    if _sync_suspended():
+        return
+    Product.refresh_listing_cards([instance.product_id])
+
+
+@receiver(post_save, sender=ProductGeneTag)
+@receiver(post_delete, sender=ProductGeneTag)
+def sync_product_gene_tag(sender, instance, **kwargs):
+    """基因标签关联变化时刷新标签摘要和搜索索引"""
+    if _sync_suspended():
+        return
+    Product.refresh_listing_cards([instance.product_id])
+    product_changed([instance.product_id])
+
+
+@receiver(post_save, sender=GeneTag)
+def sync_listing_cards_for_gene_tag(sender, instance, created, **kwargs):
+    """标签名称、颜色等变化时刷新引用该标签的商品"""
+    if created:
+        return
+    product_ids = list(ProductGeneTag.objects.filter(gene_tag=instance).values_list('product_id', flat=True))
+    Product.refresh_listing_cards(product_ids)
+    product_changed(product_ids)
+
+
+@receiver(post_save, sender=Species)
+def sync_listing_cards_for_species(sender, instance, created, **kwargs):
+    """物种改名时刷新标签摘要中的 species_name 和搜索索引"""
+    if created:
+        return
+    Product.refresh_listing_cards(
+        ProductGeneTag.objects.filter(gene_tag__species=instance).values_list('product_id', flat=True).distinct()
+    )
+    product_changed(Product.objects.filter(species=instance).values_list('id', flat=True))
+
+
+# 分类、物种、基因标签接口的响应缓存失效
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=Species)
+@receiver(post_delete, sender=Species)
+@receiver(post_save, sender=GeneTag)
+@receiver(post_delete, sender=GeneTag)
+def invalidate_catalog_cache(sender, **kwargs):
+    response_cache.invalidate('catalog')
+
+
+# 聊天消息：会话状态与实时推送
+@receiver(post_save, sender=ChatMessage)
+def sync_conversation_state(sender, instance, created, **kwargs):
+    """与消息写入在同一事务内更新会话的最后一条消息和未读数"""
+    if created:
+        ConversationState.record_message(instance)
+
+
+@receiver(post_delete, sender=ChatMessage)
+def sync_conversation_state_on_delete(sender, instance, **kwargs):
+    """删除消息后会话的 last_message 被置空，提交后重新指向剩余的最后一条消息，保持会话列表的排序键非空"""
+    order_id, receiver_id = instance.order_id, instance.receiver_id
+    unread = not instance.is_read and instance.receiver_id != instance.sender_id
+    transaction.on_commit(lambda: ConversationState.record_delete(order_id, receiver_id, unread))
+
+
+@receiver(post_save, sender=ChatMessage)
+def push_chat_message(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: realtime.publish_message(instance))
@@ -0,0 +1,207 @@
+"""基因标签 -> 商品的倒排索引（商品列表的 gene_tags / any_tags 过滤）
+
+按标签组合筛选（如 Tremper + Eclipse + het Raptor）在 SQL 中每个标签需要一次 JOIN。
+这里在进程内为每个标签保存有序的商品 id 列表，列表以差值 + varint 压缩存储
+（自增 id 相邻差值小，通常每个 id 只占 1~2 字节），查询时在内存中求交集（gene_tags，
+全部具备）或并集（any_tags，任一具备），再以一次 `id__in` 过滤商品列表。
+
+索引覆盖所有状态的商品（状态等条件仍由列表查询处理），由基因标签关联的信号增量维护；
+与搜索索引一样，多进程部署时超过 GENE_TAG_INDEX['MAX_AGE'] 秒后在下一次查询时全量重建。
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from .models import ProductGeneTag
+
+logger = logging.getLogger('log')
+
+
+def encode(ids):
+    """升序 id 列表 -> 差值 varint 字节串"""
+    out = bytearray()
+    previous = 0
+    for product_id in ids:
+        delta = product_id - previous
+        previous = product_id
+        while delta >= 0x80:
+            out.append(delta & 0x7f | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def iter_decode(data):
+    """按升序逐个解出 id"""
+    value = shift = previous = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            previous += value
+            yield previous
+            value = shift = 0
+
+
+def decode(data):
+    return list(iter_decode(data))
+
+
+class GeneTagIndex:
+    """标签 -> 压缩商品 id 列表"""
+
+    def __init__(self, max_age=None):
+        config = getattr(settings, 'GENE_TAG_INDEX', {})
+        self.max_age = max_age if max_age is not None else config.get('MAX_AGE', 300)
+        self._lock = threading.RLock()
+        self._postings = {}  # gene_tag_id -> (商品数, 压缩的 id 列表)
+        self._product_tags = {}  # product_id -> 标签 id 元组，增量更新时用于移除旧关联
+        self._built_at = None
+
+    def _ensure_built(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.rebuild()
+
+    def rebuild(self):
+        """全量重建，返回建立索引的标签数"""
+        members = defaultdict(list)
+        product_tags = defaultdict(list)
+        rows = ProductGeneTag.objects.order_by('product_id').values_list('gene_tag_id', 'product_id')
+        for gene_tag_id, product_id in rows.iterator():
+            members[gene_tag_id].append(product_id)
+            product_tags[product_id].append(gene_tag_id)
+        postings = {}
+        for gene_tag_id, ids in members.items():
+            ids = sorted(set(ids))
+            postings[gene_tag_id] = (len(ids), encode(ids))
+        with self._lock:
+            self._postings = postings
+            self._product_tags = {product_id: tuple(sorted(set(tags))) for product_id, tags in product_tags.items()}
+            self._built_at = time.monotonic()
+            return len(postings)
+
+    def _update_posting(self, gene_tag_id, add=(), remove=()):
+        ids = decode(self._postings[gene_tag_id][1]) if gene_tag_id in self._postings else []
+        for product_id in remove:
+            position = bisect_left(ids, product_id)
+            if position < len(ids) and ids[position] == product_id:
+                del ids[position]
+        for product_id in add:
+            position = bisect_left(ids, product_id)
+            if position == len(ids) or ids[position] != product_id:
+                ids.insert(position, product_id)
+        if ids:
+            self._postings[gene_tag_id] = (len(ids), encode(ids))
+        else:
+            self._postings.pop(gene_tag_id, None)
+
+    def update_products(self, product_ids):
+        """按数据库中的当前关联更新指定商品（商品已删除时移出索引）"""
+        if self._built_at is None:
+            return  # 尚未加载，首次查询时会全量构建
+        product_ids = set(product_ids)
+        current = defaultdict(set)
+        for product_id, gene_tag_id in ProductGeneTag.objects.filter(
+                product_id__in=product_ids).values_list('product_id', 'gene_tag_id'):
+            current[product_id].add(gene_tag_id)
+        with self._lock:
+            added, removed = defaultdict(list), defaultdict(list)
+            for product_id in product_ids:
+                old, new = set(self._product_tags.get(product_id, ())), current.get(product_id, set())
+                for gene_tag_id in new - old:
+                    added[gene_tag_id].append(product_id)
+                for gene_tag_id in old - new:
+                    removed[gene_tag_id].append(product_id)
+                if new:
+                    self._product_tags[product_id] = tuple(sorted(new))
+                else:
+                    self._product_tags.pop(product_id, None)
+            for gene_tag_id in set(added) | set(removed):
+                self._update_posting(gene_tag_id, added.get(gene_tag_id, ()), removed.get(gene_tag_id, ()))
+
+    def remove_products(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                for gene_tag_id in self._product_tags.pop(product_id, ()):
+                    self._update_posting(gene_tag_id, remove=[product_id])
+
+    def match(self, all_of=(), any_of=()):
+        """返回同时具备 all_of 全部标签、且具备 any_of 中任一标签的商品 id（升序）"""
+        self._ensure_built()
+        with self._lock:
+            postings = self._postings
+            result = None
+            if all_of:
+                required = [postings.get(gene_tag_id) for gene_tag_id in set(all_of)]
+                if not all(required):
+                    return []
+                # 从最短的列表开始求交，较长的列表解码到当前结果的最大 id 即可停止
+                required.sort(key=lambda posting: posting[0])
+                result = set(iter_decode(required[0][1]))
+                for _, data in required[1:]:
+                    upper = max(result)
+                    matched = set()
+                    for product_id in iter_decode(data):
+                        if product_id > upper:
+                            break
+                        if product_id in result:
+                            matched.add(product_id)
+                    result = matched
+                    if not result:
+                        return []
+            if any_of:
+                union = set()
+                for gene_tag_id in set(any_of):
+                    if gene_tag_id in postings:
+                        union.update(iter_decode(postings[gene_tag_id][1]))
+                result = union if result is None else result & union
+            return sorted(result or ())
+
+    def stats(self):
+        """标签数、关联数和压缩后的字节数"""
+        with self._lock:
+            return {
+                'tags': len(self._postings),
+                'entries': sum(count for count, _ in self._postings.values()),
+                'bytes': sum(len(data) for _, data in self._postings.values()),
+            }
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    return GeneTagIndex()
+
+
+def update_products(product_ids):
+    """基因标签关联变化后更新倒排索引，失败只记录日志，不影响业务写入"""
+    try:
+        get_index().update_products(product_ids)
+    except Exception:
+        logger.exception('更新基因标签索引失败 product_ids=%s', list(product_ids))
+
+
+def remove_products(product_ids):
+    get_index().remove_products(product_ids)
+
+
+def parse_tag_ids(params, name):
+    """逗号分隔的标签 id 参数"""
+    values = [value.strip() for value in (params.get(name) or '').split(',') if value.strip()]
+    if not all(value.isdigit() for value in values):
+        raise ValidationError({name: '应为逗号分隔的基因标签 ID'})
+    return [int(value) for value in values]
+
+
+def filter_by_gene_tags(queryset, params):
+    """按 gene_tags（全部具备）/ any_tags（任一具备）参数过滤商品查询"""
+    all_of, any_of = parse_tag_ids(params, 'gene_tags'), parse_tag_ids(params, 'any_tags')
+    if not all_of and not any_of:
+        return queryset
+    return queryset.filter(id__in=get_index().match(all_of, any_of))
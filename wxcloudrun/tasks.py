@@ -0,0 +1,81 @@
+"""进程内后台周期任务"""
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger('log')
+
+
+class PeriodicTask:
+    """在守护线程中每隔 interval 秒执行一次 func
+
+    首次调用 start() 时才创建线程，确保在 gunicorn fork 出的 worker 进程内启动。
+    首次执行默认在 interval 秒后，initial_delay 可另行指定（如 0 表示启动后立即执行一次）。
+    """
+
+    def __init__(self, name, interval, func, initial_delay=None):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.initial_delay = interval if initial_delay is None else initial_delay
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        delay = self.initial_delay
+        while not self._stopped.wait(delay):
+            delay = self.interval
+            close_old_connections()
+            try:
+                self.func()
+            except Exception:
+                logger.exception('task.failed name=%s', self.name)
+            finally:
+                close_old_connections()
+
+
+_local_locks = defaultdict(threading.Lock)
+_local_locks_guard = threading.Lock()
+
+
+@contextmanager
+def advisory_lock(name):
+    """跨进程互斥锁（不等待），返回是否取得锁，用于多个 worker 只需一个执行的后台任务
+
+    MySQL 使用 GET_LOCK（会话级，连接断开时自动释放）；其他数据库（开发环境的 SQLite）只在进程内互斥。
+    """
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT GET_LOCK(%s, 0)', [name])
+            acquired = cursor.fetchone()[0] == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT RELEASE_LOCK(%s)', [name])
+        return
+    with _local_locks_guard:
+        lock = _local_locks[name]
+    acquired = lock.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
@@ -0,0 +1,40 @@
+"""测试数据构造"""
+from decimal import Decimal
+
+from wxcloudrun.models import (
+    GeneTag, Order, Product, ProductCategory, ProductGeneTag, ProductImage, Species, User
+)
+
+
+def make_user(name, **fields):
+    fields.setdefault('nickname', name)
+    return User.objects.create(username=name, wechat_openid=f'openid-{name}', **fields)
+
+
+def make_catalog(n, seller=None):
+    """一个分类、一个物种、三个基因标签，以及 n 个在售商品（每个两张图片、1~3 个标签）"""
+    category, _ = ProductCategory.objects.get_or_create(name='守宫')
+    species, _ = Species.objects.get_or_create(name='豹纹守宫', defaults={'category': category})
+    tags = [GeneTag.objects.get_or_create(name=name, species=species)[0] for name in ('Tremper', 'Eclipse', 'Raptor')]
+    seller = seller or make_user('seller')
+    products = []
+    for i in range(n):
+        product = Product.objects.create(
+            seller=seller, category=category, species=species, title=f'豹纹守宫 {i}', description='测试商品',
+            morph='Tremper', sex='male', price=Decimal('100.00') + i,
+        )
+        ProductImage.objects.create(product=product, image_url=f'cloud://env.bucket/img{i}-1.jpg', sort_order=1)
+        ProductImage.objects.create(product=product, image_url=f'cloud://env.bucket/img{i}-0.jpg', sort_order=0)
+        for tag in tags[:i % 3 + 1]:
+            ProductGeneTag.objects.create(product=product, gene_tag=tag)
+        products.append(product)
+    return {'category': category, 'species': species, 'tags': tags, 'seller': seller, 'products': products}
+
+
+def make_order(product, buyer, **fields):
+    fields.setdefault('order_no', f'T{Order.objects.count() + 1:06d}')
+    fields.setdefault('total_amount', product.price)
+    return Order.objects.create(
+        buyer=buyer, seller=product.seller, product=product,
+        receiver_name='张三', receiver_phone='13800000000', receiver_address='测试地址', **fields
+    )
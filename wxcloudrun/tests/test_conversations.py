@@ -0,0 +1,61 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from wxcloudrun.models import ChatMessage, ConversationState, Order
+
+from .factories import make_catalog, make_order, make_user
+
+
+class DeletedLastMessageTests(TestCase):
+    """删除会话的最后一条消息后，会话指向剩余的最后一条消息，游标翻页不受影响"""
+
+    def setUp(self):
+        catalog = make_catalog(4)
+        self.seller = catalog['seller']
+        self.buyer = make_user('buyer')
+        self.messages = {}
+        for product in catalog['products']:
+            order = make_order(product, self.buyer)
+            self.messages[order.pk] = [
+                ChatMessage.objects.create(order=order, sender=self.buyer, receiver=self.seller, content=content)
+                for content in ('在吗', '还在卖吗')
+            ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def pages(self):
+        items, url = [], '/api/messages/conversations/?pagination=cursor&page_size=1'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            items += response.json()['results']
+            url = response.json()['next']
+        return items
+
+    def test_delete_last_message_then_page(self):
+        order_ids = sorted(self.messages)
+        deleted_in = order_ids[-1]  # 原本排在第一页
+        with self.captureOnCommitCallbacks(execute=True):
+            self.messages[deleted_in][1].delete()
+        state = ConversationState.objects.get(order_id=deleted_in, user=self.seller)
+        self.assertEqual(state.last_message_id, self.messages[deleted_in][0].pk)
+        self.assertEqual(state.unread_count, 1)
+
+        items = self.pages()
+        self.assertEqual(len(items), len(order_ids))
+        expected = sorted(order_ids, key=lambda order_id: -ConversationState.objects.get(
+            order_id=order_id, user=self.seller).last_message_id)
+        self.assertEqual([item['order'] for item in items], expected)
+
+    def test_delete_all_messages_removes_conversation(self):
+        order_id = sorted(self.messages)[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            ChatMessage.objects.filter(order_id=order_id).delete()
+        self.assertFalse(ConversationState.objects.filter(order_id=order_id).exists())
+        self.assertEqual(len(self.pages()), len(self.messages) - 1)
+
+    def test_delete_order(self):
+        order_id = sorted(self.messages)[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(pk=order_id).delete()
+        self.assertEqual(len(self.pages()), len(self.messages) - 1)
@@ -0,0 +1,81 @@
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from wxcloudrun import fast_serializers
+from wxcloudrun.models import GeneTag, Order, Product
+from wxcloudrun.renderers import FastJSONRenderer
+from wxcloudrun.serializers import GeneTagSerializer, OrderListSerializer, ProductListSerializer
+
+from .factories import make_catalog, make_order, make_user
+
+
+class FastSerializerParityTests(TestCase):
+    """values() + 预编译取值函数的输出与 DRF 序列化器逐字节一致"""
+
+    def setUp(self):
+        cache.clear()
+        self.catalog = make_catalog(5)
+        self.buyer = make_user('buyer')
+        products = self.catalog['products']
+        # 未填分类/物种、整数价格
+        Product.objects.filter(pk=products[0].pk).update(category=None, species=None, price=Decimal('5'), age='3月')
+        # 没有图片
+        products[1].images.all().delete()
+        products[1].refresh_listing_card()
+        Product.objects.filter(pk=products[1].pk).update(morph=None)
+        # 没有基因标签、两位小数价格
+        products[2].gene_tags.all().delete()
+        products[2].refresh_listing_card()
+        Product.objects.filter(pk=products[2].pk).update(price=Decimal('1999.90'))
+        self.catalog['seller'].nickname = None
+        self.catalog['seller'].save()
+        GeneTag.objects.filter(pk=self.catalog['tags'][0].pk).update(color='#fff', description='说明')
+        for product in products:
+            make_order(product, self.buyer, total_amount=Decimal('12.50'))
+        Order.objects.filter(product=products[4]).update(product=None)
+
+    def check(self, fast, serializer_class, queryset):
+        data = fast.serialize(fast.values(queryset))
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        expected = serializer_class(queryset, many=True).data
+        self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(expected))
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(expected))
+        return data
+
+    def test_products(self):
+        data = {item['id']: item for item in self.check(
+            fast_serializers.product_list, ProductListSerializer, Product.objects.all())}
+        products = self.catalog['products']
+        self.assertNotIn('category_name', data[products[0].pk])
+        self.assertEqual(data[products[0].pk]['price'], '5.00')
+        self.assertIsNone(data[products[1].pk]['first_image'])
+        self.assertEqual(data[products[2].pk]['gene_tags'], [])
+        self.assertEqual(data[products[2].pk]['price'], '1999.90')
+
+    def test_orders(self):
+        self.check(fast_serializers.order_list, OrderListSerializer, Order.objects.all())
+
+    def test_gene_tags(self):
+        self.check(fast_serializers.gene_tag_list, GeneTagSerializer, GeneTag.objects.all())
+
+    def test_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        urls = [
+            '/api/products/', '/api/products/?search=豹纹', '/api/products/?pagination=cursor&page_size=2',
+            '/api/orders/', '/api/orders/my_purchases/', '/api/orders/my_purchases/?pagination=cursor&page_size=2',
+            f'/api/gene-tags/?species={self.catalog["species"].pk}', '/api/gene-tags/',
+        ]
+        fast = [client.get(url).content for url in urls]
+        cache.clear()
+        with override_settings(FAST_SERIALIZERS=False):
+            drf = [client.get(url).content for url in urls]
+        for url, fast_content, drf_content in zip(urls, fast, drf):
+            self.assertEqual(json.loads(fast_content), json.loads(drf_content), url)
+            self.assertEqual(fast_content, drf_content, url)
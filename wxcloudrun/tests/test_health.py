@@ -0,0 +1,26 @@
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+
+
+class ReadyzTests(TestCase):
+
+    def test_ok_without_stats(self):
+        response = self.client.get('/readyz/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    @override_settings(READYZ_EXPOSE_STATS=True)
+    def test_stats_when_enabled(self):
+        data = self.client.get('/readyz/').json()
+        self.assertIn('db_pools', data)
+        self.assertIn('response_cache', data)
+
+    def test_database_error_not_exposed(self):
+        with mock.patch('wxcloudrun.views.connection.ensure_connection',
+                        side_effect=OperationalError('Access denied for user root@10.0.0.1')), \
+                self.assertLogs('log', level='WARNING'):
+            response = self.client.get('/readyz/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'status': 'unavailable'})
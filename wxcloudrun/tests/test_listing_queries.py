@@ -0,0 +1,71 @@
+"""商品列表、我的商品和订单列表的查询次数不随分页大小增长"""
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from wxcloudrun.models import Order
+from wxcloudrun.serializers import OrderListSerializer
+
+from .factories import make_catalog, make_order, make_user
+
+
+class ListingQueryCountTests(TestCase):
+    URLS = [
+        ('/api/products/', None),
+        ('/api/products/?expand=seller,description', None),
+        ('/api/products/?pagination=cursor&page_size=50', None),
+        ('/api/products/my_products/', 'seller'),
+        ('/api/orders/', 'buyer'),
+        ('/api/orders/my_purchases/', 'buyer'),
+        ('/api/orders/my_sales/?expand=product', 'seller'),
+    ]
+
+    def setUp(self):
+        self.catalog = make_catalog(2)
+        self.users = {'seller': self.catalog['seller'], 'buyer': make_user('buyer')}
+        for product in self.catalog['products']:
+            make_order(product, self.users['buyer'])
+
+    def grow(self, n):
+        """同一卖家再发布 n 个商品并各下一单"""
+        for product in make_catalog(n, seller=self.users['seller'])['products']:
+            make_order(product, self.users['buyer'])
+
+    def measure(self, url, user):
+        client = APIClient()
+        if user:
+            client.force_authenticate(self.users[user])
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries), len(response.data['results'])
+
+    def assertConstantQueries(self):
+        """2 行时的查询次数作为基准，12 行时必须相同"""
+        baseline = {url: self.measure(url, user) for url, user in self.URLS}
+        self.grow(10)
+        for url, user in self.URLS:
+            queries, rows = self.measure(url, user)
+            self.assertEqual(baseline[url][1], 2, url)
+            self.assertEqual(rows, 12, url)
+            self.assertEqual(queries, baseline[url][0], url)
+
+    def test_fast_serializers(self):
+        with override_settings(FAST_SERIALIZERS=True):
+            self.assertConstantQueries()
+
+    def test_drf_serializers(self):
+        with override_settings(FAST_SERIALIZERS=False):
+            self.assertConstantQueries()
+
+    def test_order_product_image(self):
+        """OrderListSerializer.get_product_image 只读取已加载的商品行，不再逐行查询"""
+        self.grow(10)
+        queryset = OrderListSerializer.project(Order.objects.order_by('id'), OrderListSerializer.select_fields())
+        for limit in (2, 12):
+            orders = list(queryset[:limit])
+            with self.assertNumQueries(0):
+                data = OrderListSerializer(orders, many=True).data
+            self.assertEqual(len(data), limit)
+        self.assertEqual(data[0]['product_image'], 'cloud://env.bucket/img0-0.jpg')
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.db import close_old_connections
+from django.test import AsyncClient, SimpleTestCase, TransactionTestCase, override_settings
+
+from wxcloudrun.chat import MessageNotifier, notifier
+from wxcloudrun.models import ChatMessage
+
+from .factories import make_catalog, make_order, make_user
+
+
+class MessageNotifierAsyncTests(SimpleTestCase):
+
+    def test_wait_async(self):
+        messages = MessageNotifier()
+
+        async def wait_then_notify():
+            version = messages.version(1)
+            asyncio.get_running_loop().call_later(0.1, threading.Thread(target=messages.notify, args=(1,)).start)
+            woke = await messages.wait_async(1, version, 5)
+            return woke, await messages.wait_async(1, messages.version(1), 0.1)
+
+        self.assertEqual(async_to_sync(wait_then_notify)(), (True, False))
+        self.assertEqual(dict(messages._async_waiters), {})
+
+
+@override_settings(CHAT_LONG_POLL={'MAX_WAIT': 5, 'MAX_WAITERS': 2, 'RECHECK_INTERVAL': 10})
+class AsgiLongPollTests(TransactionTestCase):
+    """ASGI 模式下同步接口不挂起，长轮询由 /api/async/messages/ 在事件循环中等待"""
+
+    def setUp(self):
+        catalog = make_catalog(1)
+        self.seller = catalog['seller']
+        self.buyer = make_user('buyer')
+        self.order = make_order(catalog['products'][0], self.buyer)
+        self.first = ChatMessage.objects.create(order=self.order, sender=self.buyer, receiver=self.seller, content='在吗')
+        self.client = AsyncClient()
+        self.url = f'?order={self.order.pk}&since_id={self.first.pk}&wait=5'
+
+    def send_later(self, delay):
+        def send():
+            time.sleep(delay)
+            ChatMessage.objects.create(order=self.order, sender=self.buyer, receiver=self.seller, content='还在卖吗')
+            notifier.notify(self.order.pk)
+            close_old_connections()
+        thread = threading.Thread(target=send)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def get(self, path):
+        started = time.monotonic()
+        response = async_to_sync(self.client.get)(path + self.url, **{'X-WX-OPENID': self.seller.wechat_openid})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [item['content'] for item in response.json()['results']], time.monotonic() - started
+
+    def test_sync_view_ignores_wait(self):
+        contents, elapsed = self.get('/api/messages/')
+        self.assertEqual(contents, [])
+        self.assertLess(elapsed, 1)
+
+    def test_async_view_wakes_on_new_message(self):
+        self.send_later(0.5)
+        contents, elapsed = self.get('/api/async/messages/')
+        self.assertEqual(contents, ['还在卖吗'])
+        self.assertLess(elapsed, 2)
@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from wxcloudrun.media import MediaResolver, WeChatCloudBackend
+
+FILE_IDS = [f'cloud://env.bucket/img{i}.jpg' for i in range(3)]
+
+
+class FakeBackend:
+    """按 results 依次返回结果或抛出异常，记录每次请求的文件 ID"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.requests = []
+
+    def resolve(self, file_ids, max_age, deadline=None):
+        self.requests.append(list(file_ids))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return {file_id: result.get(file_id) for file_id in file_ids}
+
+
+class MediaResolverTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_failed_ids_cached_briefly(self):
+        backend = FakeBackend({FILE_IDS[0]: 'https://tmp/0'}, {FILE_IDS[1]: 'https://tmp/1'})
+        resolver = MediaResolver(backend)
+        self.assertEqual(resolver.resolve(FILE_IDS), {FILE_IDS[0]: 'https://tmp/0'})
+        self.assertEqual(resolver.resolve(FILE_IDS), {FILE_IDS[0]: 'https://tmp/0'})
+        self.assertEqual(len(backend.requests), 1)
+        cache.clear()  # 失败记录过期
+        self.assertEqual(resolver.resolve(FILE_IDS[1:2]), {FILE_IDS[1]: 'https://tmp/1'})
+
+    def test_unknown_file_ids_ignored(self):
+        """后端返回未请求的 fileid 时忽略该项，请求过的 ID 照常缓存"""
+        backend = mock.Mock()
+        backend.resolve.return_value = {FILE_IDS[0]: 'https://tmp/0', 'cloud://env.bucket/other.jpg': 'https://tmp/x'}
+        resolver = MediaResolver(backend)
+        self.assertEqual(resolver.resolve(FILE_IDS[:1]), {FILE_IDS[0]: 'https://tmp/0'})
+        self.assertEqual(resolver.resolve(FILE_IDS[:1]), {FILE_IDS[0]: 'https://tmp/0'})
+        backend.resolve.assert_called_once()
+
+    def test_circuit_breaker(self):
+        backend = FakeBackend(OSError('down'), OSError('down'), {FILE_IDS[2]: 'https://tmp/2'})
+        resolver = MediaResolver(backend, failure_threshold=2, cooldown=30, negative_ttl=0)
+        self.assertEqual(resolver.resolve(FILE_IDS[:1]), {})
+        self.assertEqual(resolver.resolve(FILE_IDS[1:2]), {})
+        # 熔断期间不再调用后端
+        self.assertEqual(resolver.resolve(FILE_IDS[2:]), {})
+        self.assertEqual(len(backend.requests), 2)
+        # 熔断到期后放行一次试探，成功后恢复
+        resolver._open_until = 0
+        self.assertEqual(resolver.resolve(FILE_IDS[2:]), {FILE_IDS[2]: 'https://tmp/2'})
+        self.assertEqual(resolver._failures, 0)
+
+    def test_time_budget(self):
+        """WeChatCloudBackend 每批的超时不超过剩余预算，预算用尽后不再发起请求"""
+        timeouts = []
+
+        def post(url, json, timeout):
+            timeouts.append(timeout)
+            response = mock.Mock()
+            response.json.return_value = {'errcode': 0, 'file_list': [
+                {'fileid': item['fileid'], 'status': 0, 'download_url': 'https://tmp/x'} for item in json['file_list']
+            ]}
+            return response
+
+        backend = WeChatCloudBackend(env='env', batch_size=1, timeout=3)
+        with mock.patch('wxcloudrun.media.requests.post', post), \
+                mock.patch('wxcloudrun.media.time.monotonic', side_effect=[100, 101.5, 102.5]):
+            urls = backend.resolve(FILE_IDS, 7200, deadline=102)
+        self.assertEqual(timeouts, [2, 0.5])
+        self.assertEqual(list(urls), FILE_IDS[:2])
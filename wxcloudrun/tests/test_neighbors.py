@@ -0,0 +1,47 @@
+from django.test import TestCase, override_settings
+
+from wxcloudrun import neighbors
+from wxcloudrun.models import ProductNeighbor, ProductNeighborState, Species
+
+from .factories import make_catalog
+
+
+@override_settings(NEIGHBORS={'TOP_K': 3, 'REFRESH_DELAY': 3600})
+class SimilarIdsTests(TestCase):
+
+    def setUp(self):
+        neighbors.get_refresher.cache_clear()
+        self.catalog = make_catalog(3)
+
+    def test_computed_on_demand_once(self):
+        product = self.catalog['products'][0]
+        self.assertEqual(len(neighbors.similar_ids(product.pk)), 2)
+        self.assertTrue(ProductNeighborState.objects.filter(product=product).exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(len(neighbors.similar_ids(product.pk)), 2)
+
+    def test_empty_result_not_recomputed(self):
+        """物种内只有它一个在售商品时近邻为空，之后的请求不再重新计算"""
+        species = Species.objects.create(name='肥尾守宫', category=self.catalog['category'])
+        product = self.catalog['products'][0]
+        product.species = species
+        product.save()
+        self.assertEqual(neighbors.similar_ids(product.pk), [])
+        self.assertFalse(ProductNeighbor.objects.filter(product=product).exists())
+        with self.assertNumQueries(2):
+            self.assertEqual(neighbors.similar_ids(product.pk), [])
+
+    def test_empty_result_refreshed_when_group_changes(self):
+        species = Species.objects.create(name='肥尾守宫', category=self.catalog['category'])
+        first, second = self.catalog['products'][:2]
+        first.species = species
+        first.save()
+        self.assertEqual(neighbors.similar_ids(first.pk), [])
+        second.species = species
+        second.save()
+        neighbors.refresh_products([second.pk])
+        self.assertEqual(neighbors.similar_ids(first.pk), [second.pk])
+
+    def test_rebuild_records_states(self):
+        neighbors.rebuild()
+        self.assertEqual(ProductNeighborState.objects.count(), 3)
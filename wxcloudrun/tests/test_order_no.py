@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import threading
+from unittest import mock
+
+from django.db import OperationalError, close_old_connections
+from django.test import SimpleTestCase, TransactionTestCase
+
+from wxcloudrun import order_no
+from wxcloudrun.models import Order
+from wxcloudrun.serializers import OrderCreateSerializer
+
+from .factories import make_catalog, make_user
+
+
+def _generate(slot, threads, per_thread, queue):
+    """子进程：模拟一个 gunicorn worker，多个线程并发取号"""
+    os.environ['ORDER_WORKER_SLOT'] = str(slot)
+    numbers = []
+
+    def run():
+        local = [order_no.next_order_no() for _ in range(per_thread)]
+        numbers.extend(local)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    queue.put(numbers)
+
+
+class OrderNoTests(SimpleTestCase):
+
+    def test_unique_across_processes_and_threads(self):
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        processes = [context.Process(target=_generate, args=(slot, 8, 2000, queue)) for slot in range(4)]
+        with mock.patch.dict(os.environ, {'ORDER_NODE_ID': '7'}):
+            for process in processes:
+                process.start()
+            numbers = [number for _ in processes for number in queue.get(timeout=60)]
+        for process in processes:
+            process.join()
+        self.assertEqual(len(numbers), 4 * 8 * 2000)
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+    def test_monotonic_within_process(self):
+        generator = order_no.SnowflakeGenerator(1)
+        ids = [generator.next_id() for _ in range(5000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual({order_no.SnowflakeGenerator.parse(value)[1] for value in ids}, {1})
+
+    def test_node_from_address(self):
+        """未配置 ORDER_NODE_ID 时，同一网段内不同地址的副本节点号不同"""
+        with mock.patch.dict(os.environ, {'ORDER_WORKER_SLOT': '3'}), \
+                mock.patch('socket.gethostbyname', side_effect=['10.0.1.5', '10.0.2.5']):
+            os.environ.pop('ORDER_WORKER_ID', None)
+            os.environ.pop('ORDER_NODE_ID', None)
+            first, second = order_no.default_worker_id(), order_no.default_worker_id()
+        self.assertEqual(first, (0x105 << order_no.SLOT_BITS) | 3)
+        self.assertEqual(second, (0x205 << order_no.SLOT_BITS) | 3)
+
+    def test_node_fallback_warns(self):
+        with mock.patch('socket.gethostbyname', side_effect=OSError), \
+                self.assertLogs('log', level='WARNING'):
+            node = order_no.default_node_id()
+        self.assertLessEqual(node, order_no.MAX_NODE_ID)
+
+
+class ConcurrentOrderCreateTests(TransactionTestCase):
+
+    def test_concurrent_create(self):
+        product = make_catalog(1)['products'][0]
+        buyer = make_user('buyer')
+        errors = []
+
+        def run():
+            try:
+                created = 0
+                while created < 250:
+                    serializer = OrderCreateSerializer(data={
+                        'product': product.pk, 'receiver_name': '张三',
+                        'receiver_phone': '13800000000', 'receiver_address': '测试地址',
+                    })
+                    serializer.is_valid(raise_exception=True)
+                    try:
+                        serializer.save(buyer=buyer)
+                        created += 1
+                    except OperationalError:  # SQLite 写锁冲突，与订单号无关
+                        pass
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(Order.objects.count(), 2000)
+        self.assertEqual(Order.objects.values('order_no').distinct().count(), 2000)
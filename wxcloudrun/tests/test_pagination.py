@@ -0,0 +1,39 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from wxcloudrun.models import ChatMessage, ConversationState
+
+from .factories import make_catalog, make_order, make_user
+
+
+class NullableKeysetTests(TestCase):
+    """游标分页的排序键为空（会话的最后一条消息为空）时按 NULLS LAST 继续翻页"""
+
+    def setUp(self):
+        catalog = make_catalog(5)
+        self.buyer = make_user('buyer')
+        for product in catalog['products']:
+            order = make_order(product, self.buyer)
+            ChatMessage.objects.create(order=order, sender=self.buyer, receiver=product.seller, content='在吗')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def pages(self, page_size):
+        ids, url = [], f'/api/messages/conversations/?pagination=cursor&page_size={page_size}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            ids += [item['order'] for item in data['results']]
+            url = data['next']
+        return ids
+
+    def test_null_keys_last(self):
+        states = ConversationState.objects.filter(user=self.buyer).order_by('-last_message_id')
+        expected = [state.order_id for state in states]
+        nulls = expected[1:3]
+        ConversationState.objects.filter(user=self.buyer, order_id__in=nulls).update(last_message=None)
+        expected = [order_id for order_id in expected if order_id not in nulls] + sorted(
+            nulls, key=lambda order_id: -ConversationState.objects.get(user=self.buyer, order_id=order_id).pk)
+        for page_size in (1, 2, 3):
+            self.assertEqual(self.pages(page_size), expected)
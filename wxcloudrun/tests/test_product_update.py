@@ -0,0 +1,46 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from wxcloudrun.models import GeneTag, Product, Species
+
+from .factories import make_catalog
+
+
+class ProductSpeciesChangeTests(TestCase):
+    """修改商品物种时，基因标签必须属于新物种"""
+
+    def setUp(self):
+        self.catalog = make_catalog(3)
+        self.product = self.catalog['products'][2]  # 三个标签
+        self.species = Species.objects.create(name='肥尾守宫', category=self.catalog['category'])
+        self.tag = GeneTag.objects.create(name='Oreo', species=self.species)
+        self.client = APIClient()
+        self.client.force_authenticate(self.catalog['seller'])
+
+    def patch(self, data):
+        return self.client.patch(f'/api/products/{self.product.pk}/', data, format='json')
+
+    def test_species_only_drops_old_tags(self):
+        response = self.patch({'species': self.species.pk})
+        self.assertEqual(response.status_code, 200, response.content)
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.species_id, self.species.pk)
+        self.assertFalse(product.gene_tags.exists())
+        self.assertEqual(product.tag_summary, [])
+
+    def test_species_with_new_tags(self):
+        response = self.patch({'species': self.species.pk, 'gene_tag_ids': [self.tag.pk]})
+        self.assertEqual(response.status_code, 200, response.content)
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(list(product.gene_tags.values_list('gene_tag_id', flat=True)), [self.tag.pk])
+        self.assertEqual([tag['name'] for tag in product.tag_summary], ['Oreo'])
+
+    def test_species_with_old_tags_rejected(self):
+        response = self.patch({'species': self.species.pk, 'gene_tag_ids': [self.catalog['tags'][0].pk]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).species_id, self.catalog['species'].pk)
+
+    def test_same_species_keeps_tags(self):
+        response = self.patch({'species': self.catalog['species'].pk, 'title': '改名'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).gene_tags.count(), 3)
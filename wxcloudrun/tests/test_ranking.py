@@ -0,0 +1,82 @@
+import threading
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from wxcloudrun import ranking
+from wxcloudrun.models import Product, ProductRanking
+from wxcloudrun.tasks import PeriodicTask, advisory_lock
+
+from .factories import make_catalog
+
+
+@override_settings(RANKING={'AUTO_REFRESH': False})
+class HotProductsTests(TestCase):
+
+    def setUp(self):
+        self.catalog = make_catalog(4)
+        self.client = APIClient()
+
+    def ids(self, url):
+        return [item['id'] for item in self.client.get(url).json()['results']]
+
+    def test_unranked_products_listed_after_ranked(self):
+        ranking.refresh_rankings()
+        ranked = list(ProductRanking.objects.order_by('-score', '-product_id').values_list('product_id', flat=True))
+        newer = [make_catalog(1, seller=self.catalog['seller'])['products'][0].pk for _ in range(2)]
+        expected = ranked + newer[::-1]
+        self.assertEqual(self.ids('/api/products/?sort=hot'), expected)
+
+        ids, url = [], '/api/products/?sort=hot&pagination=cursor&page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            ids += [item['id'] for item in data['results']]
+            url = data['next']
+        self.assertEqual(ids, expected)
+
+    def test_before_first_refresh(self):
+        products = self.catalog['products']
+        self.assertEqual(self.ids('/api/products/?sort=hot'), [product.pk for product in reversed(products)])
+
+    def test_sold_products_excluded(self):
+        ranking.refresh_rankings()
+        Product.objects.filter(pk=self.catalog['products'][0].pk).update(status='sold')
+        self.assertNotIn(self.catalog['products'][0].pk, self.ids('/api/products/?sort=hot'))
+
+    def test_hot_score_synced_with_rankings(self):
+        """排序列与排名表一致，不再排名的商品恢复为 -1；请求路径不关联排名表"""
+        ranking.refresh_rankings()
+        scores = dict(ProductRanking.objects.values_list('product_id', 'score'))
+        self.assertEqual(dict(Product.objects.values_list('id', 'hot_score')), scores)
+        sold = self.catalog['products'][0].pk
+        Product.objects.filter(pk=sold).update(status='sold')
+        ranking.refresh_rankings()
+        self.assertEqual(Product.objects.get(pk=sold).hot_score, -1)
+        with CaptureQueriesContext(connection) as queries:
+            self.ids('/api/products/?sort=hot&pagination=cursor')
+        self.assertFalse([query for query in queries if 'product_rankings' in query['sql']])
+
+
+class RankingRefreshTests(TestCase):
+
+    def test_refresh_if_stale_skips_while_locked(self):
+        make_catalog(2)
+        with mock.patch.object(ranking, 'refresh_rankings') as refresh:
+            with advisory_lock('petbao:ranking-refresh'):
+                # 其他线程（模拟另一个 worker）检查时锁已被占用
+                thread = threading.Thread(target=ranking.refresh_if_stale)
+                thread.start()
+                thread.join()
+            refresh.assert_not_called()
+            ranking.refresh_if_stale()
+            refresh.assert_called_once()
+
+    def test_periodic_task_initial_delay(self):
+        ran = threading.Event()
+        task = PeriodicTask('test-initial-delay', 3600, ran.set, initial_delay=0)
+        task.start()
+        self.addCleanup(task.stop)
+        self.assertTrue(ran.wait(5))
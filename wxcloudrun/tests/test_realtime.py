@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from wxcloudrun.models import RealtimeEvent
+from wxcloudrun.realtime import DatabaseBroker
+
+
+class DatabaseBrokerCleanupTests(TestCase):
+
+    def test_publish_without_subscribers_cleans_up(self):
+        """没有订阅者（轮询线程未启动）的进程发布事件时也会清理过期事件"""
+        broker = DatabaseBroker(retention=60)
+        broker.cleanup_every = 3
+        RealtimeEvent.objects.create(room='order:1', origin='other', payload={})
+        RealtimeEvent.objects.update(created_at=timezone.now() - timedelta(seconds=120))
+        for _ in range(2):
+            broker.publish('order:1', {'type': 'message'})
+        self.assertEqual(RealtimeEvent.objects.count(), 3)
+        broker.publish('order:1', {'type': 'message'})
+        self.assertEqual(RealtimeEvent.objects.count(), 3)
+        self.assertFalse(RealtimeEvent.objects.filter(origin='other').exists())
@@ -0,0 +1,54 @@
+from django.test import TestCase, override_settings
+
+from wxcloudrun.models import User
+from wxcloudrun.user_cache import get_user_cache, resolve_user
+
+from .factories import make_user
+
+
+@override_settings(AUTH_USER_CACHE={
+    'BACKEND': 'wxcloudrun.user_cache.LocMemLRUBackend',
+    'TIMEOUT': 300,
+    'CHECK_INTERVAL': 2,
+    'OPTIONS': {'max_entries': 100},
+})
+class UserCacheSyncTests(TestCase):
+    """其他 worker 修改用户资料后（本进程未调用 invalidate），缓存按 updated_at 失效"""
+
+    def setUp(self):
+        get_user_cache.cache_clear()
+        self.addCleanup(get_user_cache.cache_clear)
+        self.user = make_user('alice', nickname='old')
+        self.other = make_user('bob', nickname='bob')
+
+    def expire_check(self):
+        get_user_cache()._next_check = 0
+
+    def test_cached_until_check(self):
+        resolve_user(self.user.wechat_openid)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_user(self.user.wechat_openid).nickname, 'old')
+
+    def test_update_from_other_worker(self):
+        resolve_user(self.user.wechat_openid)
+        resolve_user(self.other.wechat_openid)
+        user = User.objects.get(pk=self.user.pk)  # 模拟其他进程写入
+        user.nickname = 'new'
+        user.save()
+        self.expire_check()
+        # 一次检查查询 + 一次重新加载被修改的用户；未修改的用户仍命中缓存
+        with self.assertNumQueries(2):
+            self.assertEqual(resolve_user(self.user.wechat_openid).nickname, 'new')
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_user(self.other.wechat_openid).nickname, 'bob')
+
+    def test_check_disabled(self):
+        with override_settings(AUTH_USER_CACHE={'CHECK_INTERVAL': 0}):
+            get_user_cache.cache_clear()
+            resolve_user(self.user.wechat_openid)
+            user = User.objects.get(pk=self.user.pk)
+            user.nickname = 'new'
+            user.save()
+            self.expire_check()
+            with self.assertNumQueries(0):
+                self.assertEqual(resolve_user(self.user.wechat_openid).nickname, 'old')
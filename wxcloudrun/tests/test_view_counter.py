@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import Counter
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from wxcloudrun.view_counter import CacheCounterStore
+
+
+class CacheCounterStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_reregister_after_drain(self):
+        store = CacheCounterStore()
+        store.incr(1, 3)
+        self.assertEqual(store.drain(), {1: 3})
+        store.incr(1)
+        store.incr(2)
+        self.assertEqual(store.drain(), {1: 1, 2: 1})
+        self.assertEqual(store.drain(), {})
+
+    def test_missing_slot(self):
+        store = CacheCounterStore()
+        store.incr(1)
+        # 登记者递增了序号但还没写入槽位
+        store._incr(store.seq_key, 1)
+        store.incr(2)
+        self.assertEqual(store.drain(), {1: 1})
+        self.assertEqual(store.drain(), {})
+        store.missing_timeout = 0
+        self.assertEqual(store.drain(), {2: 1})
+
+    def test_lost_slot_product_reregisters(self):
+        """登记者抢到标记、递增序号后退出：槽位被跳过后，该商品新的浏览仍能刷盘"""
+        store = CacheCounterStore()
+        store.missing_timeout = 1
+        with mock.patch.object(store.cache, 'set', side_effect=RuntimeError('worker killed')), \
+                self.assertRaises(RuntimeError):
+            store.incr(7, 2)
+        store.incr(7)  # 标记仍在，不会重新登记
+        self.assertEqual(store.drain(), {})
+        time.sleep(1.1)
+        self.assertEqual(store.drain(), {})  # 跳过缺失的槽位
+        store.incr(7)
+        self.assertEqual(store.drain(), {7: 4})
+
+    def test_concurrent_no_lost_increments(self):
+        """多个线程并发计数，同时有多个线程反复刷盘，刷出的总数与计数一致"""
+        products, writers, per_writer = 20, 8, 1500
+        drained = Counter()
+        drained_lock = threading.Lock()
+        writing = threading.Event()
+        writing.set()
+
+        def write(offset):
+            store = CacheCounterStore()
+            for i in range(per_writer):
+                store.incr((offset + i) % products + 1)
+
+        def drain():
+            store = CacheCounterStore()
+            while writing.is_set():
+                counts = store.drain()
+                with drained_lock:
+                    drained.update(counts)
+
+        drainers = [threading.Thread(target=drain) for _ in range(3)]
+        threads = [threading.Thread(target=write, args=(offset,)) for offset in range(writers)]
+        for thread in drainers + threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writing.clear()
+        for thread in drainers:
+            thread.join()
+        drained.update(CacheCounterStore().drain())
+
+        self.assertEqual(sum(drained.values()), writers * per_writer)
+        self.assertEqual(drained, Counter({product_id: writers * per_writer // products
+                                           for product_id in range(1, products + 1)}))
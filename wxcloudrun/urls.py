@@ -18,7 +18,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from wxcloudrun import views
+from wxcloudrun import async_views, views
 from wxcloudrun.api_views import (
     wechat_login, UserViewSet, ProductCategoryViewSet, SpeciesViewSet,
     GeneTagViewSet, ProductViewSet, OrderViewSet, ChatMessageViewSet
@@ -39,6 +39,21 @@ urlpatterns = [
     path('api/auth/wechat-login/', wechat_login, name='wechat-login'),
     path('api/', include(router.urls)),
     
+    # 只读接口的异步版本（ASGI 模式下使用）
+    path('api/async/products/', async_views.product_list, name='async-product-list'),
+    path('api/async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('api/async/categories/', async_views.category_list, name='async-category-list'),
+    path('api/async/categories/<int:pk>/', async_views.category_detail, name='async-category-detail'),
+    path('api/async/species/', async_views.species_list, name='async-species-list'),
+    path('api/async/species/<int:pk>/', async_views.species_detail, name='async-species-detail'),
+    path('api/async/gene-tags/', async_views.gene_tag_list, name='async-gene-tag-list'),
+    path('api/async/gene-tags/<int:pk>/', async_views.gene_tag_detail, name='async-gene-tag-detail'),
+    path('api/async/messages/', async_views.message_list, name='async-message-list'),
+    
+    # Health checks
+    path('healthz/', views.healthz, name='healthz'),
+    path('readyz/', views.readyz, name='readyz'),
+    
     # Legacy routes
     path('', views.index, name='index'),
 ]
@@ -0,0 +1,160 @@
+"""openid -> User 缓存
+
+CloudbaseAuthMiddleware 每个请求都要根据 X-WX-OPENID 解析用户，这里用带 TTL 的缓存
+避免每次查询 users 表。后端可插拔（settings.AUTH_USER_CACHE）：
+
+- LocMemLRUBackend：进程内 LRU（默认）
+- DjangoCacheBackend：使用 Django cache（如 Redis/Memcached），多副本共享
+
+用户资料变化时（update_profile / wechat_login）需要调用 invalidate() 使缓存失效，但这只作用于
+当前进程的进程内缓存。其他 worker / 副本的缓存以 users.updated_at 为版本：每隔 CHECK_INTERVAL 秒
+查询一次这段时间内更新过的用户，updated_at 与缓存副本不同的条目即失效，多进程下资料最多滞后
+CHECK_INTERVAL 秒。使用共享缓存时可将 CHECK_INTERVAL 设为 0 关闭检查。
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import User
+
+
+class LocMemLRUBackend:
+    """进程内 LRU 缓存"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DjangoCacheBackend:
+    """基于 Django cache 的共享缓存"""
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout):
+        self.cache.set(key, value, timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+
+class UserCache:
+    """按 openid 缓存用户实例，读取时返回副本，避免请求间共享可变对象"""
+    key_prefix = 'auth_user:'
+    # 各副本时钟偏差的容忍范围：检查时多回看这么多秒的更新
+    clock_skew = timedelta(seconds=5)
+
+    def __init__(self, backend, timeout, check_interval=0):
+        self.backend = backend
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._checked_at = timezone.now()
+        self._next_check = time.monotonic() + check_interval
+        self._check_lock = threading.Lock()
+
+    def get(self, openid):
+        if self.check_interval and time.monotonic() >= self._next_check:
+            self.sync()
+        user = self.backend.get(self.key_prefix + openid)
+        return copy.copy(user) if user is not None else None
+
+    def sync(self):
+        """使上次检查以来在库中更新过（updated_at 与缓存副本不同）的用户失效"""
+        if not self._check_lock.acquire(blocking=False):
+            return  # 其他线程正在检查
+        try:
+            since, self._checked_at = self._checked_at - self.clock_skew, timezone.now()
+            self._next_check = time.monotonic() + self.check_interval
+            changed = User.objects.filter(updated_at__gte=since, wechat_openid__isnull=False) \
+                .values_list('wechat_openid', 'updated_at')
+            for openid, updated_at in changed:
+                user = self.backend.get(self.key_prefix + openid)
+                if user is not None and user.updated_at != updated_at:
+                    self.invalidate(openid)
+        finally:
+            self._check_lock.release()
+
+    def set(self, user):
+        if user.wechat_openid:
+            self.backend.set(self.key_prefix + user.wechat_openid, copy.copy(user), self.timeout)
+
+    def invalidate(self, openid):
+        if openid:
+            self.backend.delete(self.key_prefix + openid)
+
+
+@lru_cache(maxsize=None)
+def get_user_cache():
+    config = getattr(settings, 'AUTH_USER_CACHE', {})
+    backend_class = import_string(config.get('BACKEND', 'wxcloudrun.user_cache.LocMemLRUBackend'))
+    return UserCache(backend_class(**config.get('OPTIONS', {})), config.get('TIMEOUT', 300),
+                     config.get('CHECK_INTERVAL', 0))
+
+
+def get_or_create_wechat_user(openid, defaults):
+    """并发安全地获取或创建微信用户
+
+    get_or_create 在并发创建时会捕获 openid 唯一约束冲突并重新查询；
+    如果冲突来自 openid 前缀相同导致的用户名重复，则改用完整 openid 作为用户名重试。
+    """
+    try:
+        return User.objects.get_or_create(wechat_openid=openid, defaults=defaults)
+    except IntegrityError:
+        defaults = dict(defaults, username=f'wx_{openid}')
+        return User.objects.get_or_create(wechat_openid=openid, defaults=defaults)
+
+
+def resolve_user(openid, unionid=None):
+    """根据 openid 解析用户：先查缓存，未命中则查库（不存在时自动创建）并写入缓存"""
+    user_cache = get_user_cache()
+    user = user_cache.get(openid)
+    if user is None:
+        user, _ = get_or_create_wechat_user(openid, defaults={
+            'username': f'wx_{openid[:10]}',  # 使用 openid 前10位作为用户名
+            'wechat_unionid': unionid,
+            'nickname': f'用户{openid[:6]}',  # 默认昵称
+        })
+        user_cache.set(user)
+    return user
+
+
+def invalidate_user(user):
+    """用户资料变化后使缓存失效"""
+    get_user_cache().invalidate(user.wechat_openid)
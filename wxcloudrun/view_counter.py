@@ -0,0 +1,195 @@
+"""商品浏览次数缓冲计数
+
+ProductViewSet.retrieve 不再每次 UPDATE products，而是把增量记在计数存储中，
+由后台线程每隔 FLUSH_INTERVAL 秒按增量分组批量执行
+`UPDATE products SET view_count = view_count + n WHERE id IN (...)`。
+
+计数存储可插拔（settings.VIEW_COUNTER['STORE']）：
+
+- LocalCounterStore：进程内字典（默认），进程退出时通过 atexit / gunicorn worker_exit 刷盘
+- CacheCounterStore：Django cache（如 Redis/Memcached），多进程/多副本共享，
+  可由 flush_view_counts 管理命令统一刷盘
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import Product
+from .tasks import PeriodicTask
+
+logger = logging.getLogger('log')
+
+
+class LocalCounterStore:
+    """进程内计数存储"""
+
+    def __init__(self):
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def incr(self, product_id, n=1):
+        with self._lock:
+            self._counts[product_id] += n
+            return self._counts[product_id]
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(int)
+        return dict(counts)
+
+    def restore(self, counts):
+        with self._lock:
+            for product_id, n in counts.items():
+                self._counts[product_id] += n
+
+
+class CacheCounterStore:
+    """基于 Django cache 的共享计数存储（需要原子 incr/add 的缓存，如 Redis/Memcached/LocMem）
+
+    每个商品一个计数键（原子 incr）。有待刷盘的商品登记在一个追加日志中：用 cache.add 抢占
+    商品的登记标记，抢到的一方原子递增日志序号，把商品 ID 写入对应序号的槽位，再延长标记的
+    有效期（抢占时只给 missing_timeout 秒，登记者中途退出时标记随跳过的槽位一起失效）。drain 持锁
+    从上次的位置读到当前序号，先删除标记再读取、扣减计数，期间新增的浏览会重新登记。
+    只使用单键原子操作，并发登记和刷盘不会丢失增量。
+    """
+    key_prefix = 'product_views:'
+    # 已写入槽位的登记标记的有效期（过期后商品会重复登记，drain 时计数为 0 的槽位被忽略）
+    marker_timeout = 3600
+    lock_timeout = 60
+    # 槽位缺失超过这么多秒，视为登记者已在递增序号和写入槽位之间退出，跳过该槽位；
+    # 抢占标记时也只给这么长的有效期，槽位被跳过时商品已可重新登记
+    missing_timeout = 60
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+        self.seq_key = self.key_prefix + 'seq'
+        self.cursor_key = self.key_prefix + 'cursor'
+        self.lock_key = self.key_prefix + 'lock'
+
+    def _key(self, product_id):
+        return f'{self.key_prefix}{product_id}'
+
+    def _marker(self, product_id):
+        return f'{self.key_prefix}pending:{product_id}'
+
+    def _slot(self, seq):
+        return f'{self.key_prefix}slot:{seq}'
+
+    def _incr(self, key, n):
+        try:
+            return self.cache.incr(key, n)
+        except ValueError:
+            return n if self.cache.add(key, n, None) else self.cache.incr(key, n)
+
+    def _register(self, product_id):
+        marker = self._marker(product_id)
+        if self.cache.add(marker, 1, self.missing_timeout):
+            self.cache.set(self._slot(self._incr(self.seq_key, 1)), product_id, None)
+            # 标记已被 drain 删除时 touch 不会重新创建
+            self.cache.touch(marker, self.marker_timeout)
+
+    def incr(self, product_id, n=1):
+        value = self._incr(self._key(product_id), n)
+        self._register(product_id)
+        return value
+
+    def drain(self):
+        if not self.cache.add(self.lock_key, 1, self.lock_timeout):
+            return {}  # 其他进程正在刷盘
+        try:
+            return self._drain()
+        finally:
+            self.cache.delete(self.lock_key)
+
+    def _drain(self):
+        end = self.cache.get(self.seq_key) or 0
+        # missing：(序号, 首次发现时间)，尚未写入的槽位（登记者在递增序号和写入槽位之间）
+        cursor, missing = self.cache.get(self.cursor_key) or (0, None)
+        first = cursor + 1
+        slots = self.cache.get_many([self._slot(seq) for seq in range(cursor + 1, end + 1)])
+        product_ids = []
+        for seq in range(cursor + 1, end + 1):
+            product_id = slots.get(self._slot(seq))
+            if product_id is None:
+                if missing is None or missing[0] != seq:
+                    missing = (seq, time.time())
+                if time.time() - missing[1] < self.missing_timeout:
+                    break  # 等待下次刷盘
+            else:
+                product_ids.append(product_id)
+            cursor = seq
+
+        counts = {}
+        for product_id in dict.fromkeys(product_ids):
+            self.cache.delete(self._marker(product_id))
+            key = self._key(product_id)
+            n = self.cache.get(key) or 0
+            if n:
+                # 用 decr 扣减已读取的数量（保留计数键），期间新增的浏览会保留下来
+                self.cache.decr(key, n)
+                counts[product_id] = n
+        self.cache.delete_many([self._slot(seq) for seq in range(first, cursor + 1)])
+        self.cache.set(self.cursor_key, (cursor, missing), None)
+        return counts
+
+    def restore(self, counts):
+        for product_id, n in counts.items():
+            self.incr(product_id, n)
+
+
+class ViewCounter:
+    """浏览次数缓冲与批量刷盘"""
+
+    def __init__(self, store, flush_interval=10):
+        self.store = store
+        self._flusher = PeriodicTask('view-counter-flush', flush_interval, self.flush)
+
+    def record(self, product_id):
+        """记录一次浏览，返回该商品尚未刷盘的浏览数"""
+        self._flusher.start()
+        return self.store.incr(product_id)
+
+    def flush(self):
+        """把缓冲的增量写入数据库，相同增量的商品合并为一条 UPDATE"""
+        counts = self.store.drain()
+        if not counts:
+            return 0
+        by_increment = defaultdict(list)
+        for product_id, n in counts.items():
+            by_increment[n].append(product_id)
+        try:
+            for n, product_ids in by_increment.items():
+                Product.objects.filter(pk__in=product_ids).update(view_count=F('view_count') + n)
+        except Exception:
+            self.store.restore(counts)
+            raise
+        total = sum(counts.values())
+        logger.debug('view_counter.flush products=%s views=%s', len(counts), total)
+        return total
+
+
+@lru_cache(maxsize=None)
+def get_view_counter():
+    config = getattr(settings, 'VIEW_COUNTER', {})
+    store = import_string(config.get('STORE', 'wxcloudrun.view_counter.LocalCounterStore'))(**config.get('OPTIONS', {}))
+    counter = ViewCounter(store, flush_interval=config.get('FLUSH_INTERVAL', 10))
+    atexit.register(flush_on_shutdown)
+    return counter
+
+
+def flush_on_shutdown():
+    """进程退出时刷盘（atexit 和 gunicorn worker_exit 钩子调用）"""
+    if get_view_counter.cache_info().currsize == 0:
+        return
+    try:
+        get_view_counter().flush()
+    except Exception:
+        logger.exception('view_counter.flush_on_shutdown failed')
@@ -1,9 +1,14 @@
 import json
 import logging
 
+from django.conf import settings
+from django.db import connection
 from django.http import JsonResponse
 from django.shortcuts import render
 
+from wxcloudrun.db.pool import pool_stats
+from wxcloudrun.response_cache import cache_stats
+
 
 logger = logging.getLogger('log')
 
@@ -16,3 +21,32 @@ def index(request):
     """
 
     return render(request, 'index.html')
+
+
+def healthz(request):
+    """
+    存活检查：进程能响应即可，不访问数据库
+    """
+
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    """
+    就绪检查：建立（或复用）当前线程的数据库连接并执行 SELECT 1，
+    同时起到预热连接的作用；数据库不可用时返回 503
+
+    接口无需认证，错误详情只写日志；连接池和响应缓存统计仅在 settings.READYZ_EXPOSE_STATS 开启时返回
+    """
+
+    try:
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Exception:
+        logger.warning('readyz.db_unavailable', exc_info=True)
+        return JsonResponse({'status': 'unavailable'}, status=503)
+    data = {'status': 'ok'}
+    if settings.READYZ_EXPOSE_STATS:
+        data.update(db_pools=pool_stats(), response_cache=cache_stats())
+    return JsonResponse(data)